@@ -17,7 +17,9 @@ except Exception as e:
 load_dotenv()
 
 class AngelOneManager:
-    def __init__(self):
+    def __init__(self, connect_cls=None):
+        # connect_cls: SmartConnect stand-in (e.g. smartapi_sim) called as connect_cls(api_key=...)
+        self.connect_cls = connect_cls
 
         # 1. Try OS Environ (Local / Docker)
         self.api_key = os.getenv("ANGEL_API_KEY")
@@ -25,18 +27,19 @@ class AngelOneManager:
         self.password = os.getenv("ANGEL_PIN")
         self.totp_key = os.getenv("ANGEL_TOTP_KEY")
         
-        # 2. Try Streamlit Secrets (Cloud Fallback)
+        # 2. Try Secrets (st.secrets in the app, secrets.toml when headless)
         try:
-            import streamlit as st
-            if not self.api_key and "ANGEL_API_KEY" in st.secrets:
-                 self.api_key = st.secrets["ANGEL_API_KEY"]
-                 self.client_id = st.secrets["ANGEL_CLIENT_ID"]
-                 self.password = st.secrets["ANGEL_PIN"]
-                 self.totp_key = st.secrets["ANGEL_TOTP_KEY"]
+            import data_context
+            secrets = data_context.get_context().secrets
+            if not self.api_key and "ANGEL_API_KEY" in secrets:
+                 self.api_key = secrets["ANGEL_API_KEY"]
+                 self.client_id = secrets["ANGEL_CLIENT_ID"]
+                 self.password = secrets["ANGEL_PIN"]
+                 self.totp_key = secrets["ANGEL_TOTP_KEY"]
             
             # 3. Handle User's specific nesting (Under [passwords])
-            if not self.api_key and "passwords" in st.secrets and "ANGEL_API_KEY" in st.secrets["passwords"]:
-                 sec = st.secrets["passwords"]
+            if not self.api_key and "passwords" in secrets and "ANGEL_API_KEY" in secrets["passwords"]:
+                 sec = secrets["passwords"]
                  self.api_key = sec["ANGEL_API_KEY"]
                  self.client_id = sec["ANGEL_CLIENT_ID"]
                  self.password = sec["ANGEL_PIN"]
@@ -52,10 +55,13 @@ class AngelOneManager:
                 log.write(f"Connecting to Angel One (Client: {self.client_id})...\n")
             
             # Lazy Import
-            try:
-                from SmartApi import SmartConnect
-            except Exception as ie:
-                return False, f"SmartApi Library Missing: {ie}"
+            if self.connect_cls is not None:
+                SmartConnect = self.connect_cls
+            else:
+                try:
+                    from SmartApi import SmartConnect
+                except Exception as ie:
+                    return False, f"SmartApi Library Missing: {ie}"
 
             # 1. Initialize Object
             self.smart_api = SmartConnect(api_key=self.api_key)
@@ -67,7 +73,8 @@ class AngelOneManager:
                 return False, f"TOTP Generation Failed: {e}"
             
             # 3. Authenticate
-            data = self.smart_api.generateSession(self.client_id, self.password, totp)
+            import api_ledger
+            data = api_ledger.call("generateSession", self.smart_api.generateSession, self.client_id, self.password, totp)
             
             if data['status'] and data['message'] == 'SUCCESS':
                 self.auth_token = data['data']['jwtToken']
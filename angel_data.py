@@ -1,9 +1,10 @@
 import os
 import json
-import requests
 import pandas as pd
 from datetime import datetime, timedelta
-from angel_connect import AngelOneManager
+import data_context
+import metrics
+import api_ledger
 
 INSTRUMENT_URL = "https://margincalculator.angelbroking.com/OpenAPI_File/files/OpenAPIScripMaster.json"
 INSTRUMENT_FILE = "angel_instruments.json"
@@ -11,17 +12,22 @@ INSTRUMENT_FILE = "angel_instruments.json"
 import time
 
 class AngelDataManager:
-    def __init__(self):
-        # 1. Try to Reuse Existing Session from Streamlit (if available)
+    def __init__(self, manager=None, instruments=None):
+        """
+        manager: logged-in AngelOneManager to use (default: app session or fresh login).
+        instruments: instrument master rows to load instead of INSTRUMENT_FILE.
+        """
+        # 1. Try to Reuse Existing Session from the App (if one was injected)
         try:
-             import streamlit as st
-             if hasattr(st, 'session_state') and 'angel_client' in st.session_state:
-                 self.manager = st.session_state['angel_client']
+             client = manager if manager is not None else data_context.get_context().get("angel_client")
+             if client is not None:
+                 self.manager = client
                  print("✅ AngelDataManager: Reusing Active Session from App.")
              else:
                  raise Exception("No Session Found")
         except:
              # 2. Fresh Login (For Bot / First Run)
+             from angel_connect import AngelOneManager
              print("🔄 AngelDataManager: Initiating Fresh Login...")
              self.manager = AngelOneManager()
              success, msg = self.manager.login()
@@ -32,10 +38,14 @@ class AngelDataManager:
 
         self.symbol_map = {} # {"SBIN-EQ": "3045"}
         self.token_map = {}  # {"3045": "SBIN-EQ"}
-        self._load_instruments()
+        self._load_instruments(instruments)
 
-    def _load_instruments(self):
-        """Download and cache instrument master."""
+    def _load_instruments(self, data=None):
+        """Download and cache instrument master (or index the given rows)."""
+        if data is not None:
+            self._index_instruments(data)
+            return
+        import requests
         refresh_needed = False
         if not os.path.exists(INSTRUMENT_FILE):
             refresh_needed = True
@@ -68,30 +78,32 @@ class AngelDataManager:
             with open(INSTRUMENT_FILE, "r") as f:
                 data = json.load(f)
                 
-            count = 0
-            for item in data:
-                # Optimized: Only store NSE Equity
-                if item.get('exch_seg') == 'NSE' and '-EQ' in item.get('symbol'):
-                    sym = item['symbol']
-                    tok = item['token']
-                    self.symbol_map[sym] = tok
-                    self.token_map[tok] = sym
-                    
-                    # Clean map
-                    clean_sym = sym.replace('-EQ', '')
-                    self.symbol_map[clean_sym] = tok
-                    count += 1
+            self._index_instruments(data)
             
             # Explicit Memory Cleanup
             del data
             import gc
             gc.collect()
-                    
-            print(f"✅ Loaded {count} NSE Equity Symbols")
             
         except Exception as e:
             print(f"❌ Error parsing instruments: {e}")
 
+    def _index_instruments(self, data):
+        count = 0
+        for item in data:
+            # Optimized: Only store NSE Equity
+            if item.get('exch_seg') == 'NSE' and '-EQ' in item.get('symbol'):
+                sym = item['symbol']
+                tok = item['token']
+                self.symbol_map[sym] = tok
+                self.token_map[tok] = sym
+                
+                # Clean map
+                clean_sym = sym.replace('-EQ', '')
+                self.symbol_map[clean_sym] = tok
+                count += 1
+        print(f"✅ Loaded {count} NSE Equity Symbols")
+
     def get_token(self, symbol):
         """Standardize symbol (RELIANCE or RELIANCE-EQ) -> Token"""
         symbol = symbol.replace('.NS', '').upper()
@@ -135,7 +147,8 @@ class AngelDataManager:
             # RETRY LOOP (Rate Limit & Token Handling)
             max_retries = 3
             for attempt in range(max_retries):
-                res = self.manager.smart_api.getCandleData(params)
+                res = api_ledger.call("getCandleData", self.manager.smart_api.getCandleData, params,
+                                      symbol=symbol, interval=interval, retries=attempt)
                 
                 # Check Success
                 if res['status'] and res['data']:
@@ -144,6 +157,7 @@ class AngelDataManager:
                 # Handle Token Error
                 if not res['status'] and (res['errorcode'] == 'AG8001' or 'Invalid Token' in res['message']):
                     print(f"⚠️ Token Expired for {symbol}. Re-authenticating...")
+                    metrics.inc("angel_api_retries_total", endpoint="getCandleData", reason="AG8001")
                     success, msg = self.manager.login()
                     if success: continue # Retry loop
                     else: return pd.DataFrame()
@@ -152,6 +166,7 @@ class AngelDataManager:
                 if not res['status'] and res['errorcode'] == 'AB1004':
                     wait_time = (attempt + 1) * 2 # 2s, 4s, 6s
                     print(f"⚠️ Rate Limit (AB1004) for {symbol}. Retrying in {wait_time}s...")
+                    metrics.inc("angel_api_retries_total", endpoint="getCandleData", reason="AB1004")
                     time.sleep(wait_time)
                     continue
                 
@@ -173,6 +188,7 @@ class AngelDataManager:
                 df = df.astype(float)
                 return df
             else:
+                if not res['status']: metrics.inc("angel_api_errors_total", endpoint="getCandleData", code=res.get('errorcode') or "unknown")
                 print(f"⚠️ No Data for {symbol}: {res['message']}")
                 return pd.DataFrame()
                 
@@ -204,7 +220,8 @@ class AngelDataManager:
             
             try:
                 # Mode "FULL" gives LTP, Open, High, Low, Close, Volume, LastTradeQty, etc.
-                res = self.manager.smart_api.getMarketData(mode, exchangeTokens={"NSE": batch})
+                res = api_ledger.call("getMarketData", self.manager.smart_api.getMarketData, mode,
+                                      exchangeTokens={"NSE": batch}, interval=mode)
                 
                 # RETRY LOGIC (Auto-Heal)
                 if not res['status'] and (res['errorcode'] == 'AG8001' or 'Invalid Token' in res['message']):
@@ -212,12 +229,18 @@ class AngelDataManager:
                     success, msg = self.manager.login()
                     if success:
                         # Retry
-                        res = self.manager.smart_api.getMarketData(mode, exchangeTokens={"NSE": batch})
+                        metrics.inc("angel_api_retries_total", endpoint="getMarketData", reason="AG8001")
+                        res = api_ledger.call("getMarketData", self.manager.smart_api.getMarketData, mode,
+                                              exchangeTokens={"NSE": batch}, interval=mode, retries=1)
                     else:
                         print(f"❌ Re-login failed: {msg}")
                 
                 if res['status'] and res['data']:
-                    all_results.extend(res['data']) # List of dicts
+                    data = res['data']
+                    # Quote API nests rows under 'fetched' (tokens it could not price go to 'unfetched')
+                    all_results.extend(data.get('fetched', []) if isinstance(data, dict) else data)
+                elif not res['status']:
+                    metrics.inc("angel_api_errors_total", endpoint="getMarketData", code=res.get('errorcode') or "unknown")
                     
                 time.sleep(0.25) # Throttle (4 req/sec max)
                     
@@ -240,6 +263,7 @@ class AngelDataManager:
             if 'percentChange' in item: row['Change'] = float(item['percentChange'])
             if 'netChange' in item: row['PtsChange'] = float(item['netChange'])
             if 'volume' in item: row['Volume'] = int(item['volume'])
+            elif 'tradeVolume' in item: row['Volume'] = int(item['tradeVolume'])
             # Full OHLCa
             if 'open' in item: row['Open'] = float(item['open'])
             if 'high' in item: row['High'] = float(item['high'])
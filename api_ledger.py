@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+import metrics
+
+# Ledger of every broker (SmartAPI) request: one entry per HTTP attempt, so
+# retries count against the quota just like the broker sees them. Kept in a
+# process-wide ring buffer; run_engine_job saves it per run (cache/api_ledger.json)
+# and the app's debug panel turns it into per-minute rates vs the rate ceilings.
+#
+#   res = api_ledger.call("getCandleData", smart_api.getCandleData, params,
+#                         symbol="INFY.NS", interval="ONE_DAY", retries=attempt)
+
+RING_SIZE = int(os.getenv("API_LEDGER_SIZE", "20000"))
+CEILINGS = {"getCandleData": 3, "getMarketData": 10, "generateSession": 1} # Broker limits, requests/s
+RATE_LIMIT_CODE = "AB1004"
+
+_lock = threading.Lock()
+_ring = deque(maxlen=RING_SIZE)
+_total = 0 # Entries ever recorded (total - len(ring) were dropped)
+
+def _payload_bytes(res):
+    try: return len(json.dumps(res, separators=(",", ":"), default=str))
+    except: return 0
+
+def record(endpoint, duration, ok, code="", symbol=None, interval=None, retries=0, nbytes=0, ts=None):
+    global _total
+    entry = {"ts": round(ts if ts is not None else time.time(), 3), "endpoint": endpoint, "symbol": symbol,
+             "interval": interval, "ms": round(duration * 1000, 1), "ok": bool(ok), "code": code or "",
+             "retries": retries, "bytes": nbytes}
+    with _lock:
+        _ring.append(entry)
+        _total += 1
+    return entry
+
+def call(endpoint, fn, *args, symbol=None, interval=None, retries=0, **kwargs):
+    """
+    Runs one broker request and records it (retries: attempts made before this one).
+    Returns the response; an exception is recorded with its type as code and re-raised.
+    """
+    ts, start = time.time(), time.perf_counter()
+    try:
+        res = fn(*args, **kwargs)
+    except Exception as e:
+        duration = time.perf_counter() - start
+        metrics.observe("angel_api_seconds", duration, endpoint=endpoint)
+        record(endpoint, duration, False, type(e).__name__, symbol, interval, retries, ts=ts)
+        raise
+    duration = time.perf_counter() - start
+    metrics.observe("angel_api_seconds", duration, endpoint=endpoint)
+    ok = isinstance(res, dict) and bool(res.get("status"))
+    code = res.get("errorcode", "") if isinstance(res, dict) else "bad_response"
+    record(endpoint, duration, ok, code, symbol, interval, retries, _payload_bytes(res), ts=ts)
+    return res
+
+def entries():
+    with _lock: return list(_ring)
+
+def clear():
+    global _total
+    with _lock:
+        _ring.clear()
+        _total = 0
+
+def save(path, **meta):
+    """Ledger (plus `meta`, e.g. the job mode) as JSON, written atomically. Returns the path."""
+    with _lock:
+        data = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), **meta, "ring_size": _ring.maxlen,
+                "dropped": _total - len(_ring), "entries": list(_ring)}
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f: json.dump(data, f, default=str)
+    os.replace(tmp, path)
+    return path
+
+# --- SUMMARY ---
+def _peak_per_second(stamps):
+    """Most requests inside any 1 s window (stamps sorted)."""
+    peak, lo = 0, 0
+    for hi, t in enumerate(stamps):
+        while t - stamps[lo] >= 1.0: lo += 1
+        peak = max(peak, hi - lo + 1)
+    return peak
+
+def summarize(rows, ceilings=CEILINGS):
+    """
+    Quota view of ledger entries: totals, error codes, AB1004 share, effective
+    throughput, per-endpoint peak 1 s rate vs its ceiling, and per-minute buckets.
+    """
+    rows = sorted(rows or [], key=lambda r: r["ts"])
+    if not rows: return None
+    span = max(rows[-1]["ts"] - rows[0]["ts"], 1.0)
+    errors, minutes, endpoints = {}, {}, {}
+    for r in rows:
+        if not r["ok"]: errors[r["code"] or "unknown"] = errors.get(r["code"] or "unknown", 0) + 1
+        m = minutes.setdefault(int(r["ts"] // 60), {"requests": 0, "ok": 0, "ab1004": 0, "errors": 0})
+        m["requests"] += 1
+        m["ok"] += r["ok"]
+        m["ab1004"] += r["code"] == RATE_LIMIT_CODE
+        m["errors"] += not r["ok"]
+        endpoints.setdefault(r["endpoint"], []).append(r)
+
+    per_endpoint = {}
+    for name, rs in endpoints.items():
+        ms = sorted(r["ms"] for r in rs)
+        peak = _peak_per_second([r["ts"] for r in rs])
+        ceiling = ceilings.get(name)
+        ep_span = max(rs[-1]["ts"] - rs[0]["ts"], 1.0)
+        per_endpoint[name] = {"calls": len(rs), "ok": sum(r["ok"] for r in rs),
+                              "ab1004": sum(r["code"] == RATE_LIMIT_CODE for r in rs),
+                              "retries": sum(r["retries"] > 0 for r in rs), "bytes": sum(r["bytes"] for r in rs),
+                              "mean_ms": round(sum(ms) / len(ms), 1), "p95_ms": ms[min(len(ms) - 1, int(len(ms) * 0.95))],
+                              "avg_rps": round(len(rs) / ep_span, 2), "peak_rps": peak, "ceiling_rps": ceiling,
+                              "peak_pct_of_ceiling": round(peak / ceiling * 100) if ceiling else None}
+
+    ab1004 = errors.get(RATE_LIMIT_CODE, 0)
+    return {"calls": len(rows), "ok": sum(r["ok"] for r in rows), "errors": errors, "ab1004": ab1004,
+            "ab1004_pct": round(ab1004 / len(rows) * 100, 1), "retries": sum(r["retries"] > 0 for r in rows),
+            "bytes": sum(r["bytes"] for r in rows), "span_s": round(span, 1),
+            "avg_rps": round(len(rows) / span, 2), "throughput_rps": round(sum(r["ok"] for r in rows) / span, 2),
+            "endpoints": per_endpoint,
+            "per_minute": [{"minute": time.strftime("%H:%M", time.localtime(k * 60)), **v,
+                            "rps": round(v["requests"] / 60, 2)} for k, v in sorted(minutes.items())]}
@@ -1,12 +1,10 @@
 import streamlit as st
 import pandas as pd
 import time
-import engine_v2 as engine # Renamed to force cache invalidation
 import sheets_db
 import os
 import requests
 import logging
-import importlib
 try:
     import logzero
     from logzero import logger
@@ -24,7 +22,6 @@ try:
         logzero.logfile(LOG_FILE, maxBytes=1e6, backupCount=3)
 except: pass
 
-# Page Config (Must be first ST command)
 # Page Config (Must be first ST command)
 st.set_page_config(
     page_title="Swing Decision Engine (Cloud v2.0)",
@@ -33,6 +30,10 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Library modules keep session state / read secrets through this context
+import data_context
+data_context.use_streamlit(st)
+
 # Suppress Threading Warnings
 logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
 
@@ -40,55 +41,24 @@ SCAN_INTERVAL = 900 # 15 Minutes
 CACHE_DIR = "cache" 
 if not os.path.exists(CACHE_DIR): os.makedirs(CACHE_DIR)
 
-# Helper for auto-refresh
-try:
-    from streamlit_autorefresh import st_autorefresh
-except:
-    def st_autorefresh(interval, key): pass # Mock if missing
-
-# --- CACHE CONTROL (Force Reload Logic) ---
-ENGINE_VERSION = 2.0 # Increment to 2.0 to force reload
-
+STATUS_POLL_S = 5 # Banner refresh while the background job runs
 # --- ENGINE STATUS (Global Load) ---
+# One stat() per rerun; artifacts below are cached on its snapshot_version.
 import json
-status_file = os.path.join(CACHE_DIR, "engine_status.json")
-eng_status = {"state": "UNKNOWN", "last_updated": "Never"}
-
-if os.path.exists(status_file):
-    try:
-        with open(status_file, "r") as f:
-            eng_status = json.load(f)
-    except: pass
-
-if 'engine_version' not in st.session_state or st.session_state['engine_version'] != ENGINE_VERSION:
-    print(f"🔄 Detected New Engine Version ({ENGINE_VERSION}). Reloading Module...")
-    if 'engine' in st.session_state: del st.session_state['engine']
-    if 'scan_results' in st.session_state: del st.session_state['scan_results'] 
-    
-    # HARD RELOAD: Remove from sys.modules to force fresh import
-    import sys
-    if 'engine_v2' in sys.modules: del sys.modules['engine_v2']
-    if 'market_data' in sys.modules: del sys.modules['market_data'] 
-    
-    # Re-run will trigger fresh import at top of script
-    st.session_state['engine_version'] = ENGINE_VERSION
-    time.sleep(0.1) 
-    st.session_state['engine_version'] = ENGINE_VERSION
-    time.sleep(0.1) 
-    st.rerun()
-    
-try:
-    # Debug Engine Path
-    print(f"[DEBUG] Engine Loaded from: {engine.__file__}")
-except: pass
-
-# --- PAGE CONFIG ---
-st.set_page_config(
-    page_title="Swing Decision Engine", 
-    page_icon="⚡", 
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
+import ui_data
+eng_status = ui_data.load_status()
+snapshot_version = ui_data.snapshot_version(eng_status)
+
+# --- CODE VERSION ---
+# Content hash of the engine modules. A session started under older code drops
+# its engine and scan results; the cached engine is rebuilt once per change.
+CODE_VERSION = ui_data.code_version()
+if st.session_state.get('engine_version') != CODE_VERSION:
+    if 'engine_version' in st.session_state:
+        print(f"🔄 Engine code changed ({CODE_VERSION}). Dropping cached engine...")
+    for key in ('engine', 'scan_results', 'scan_version'):
+        st.session_state.pop(key, None)
+    st.session_state['engine_version'] = CODE_VERSION
 
 # --- STYLING (Premium Dark/Clean) ---
 # --- STYLING (Premium Dark/Clean) ---
@@ -138,17 +108,7 @@ st.markdown("""
 
 
 # --- SESSION STATE ---
-# --- SESSION STATE ---
-@st.cache_resource
-def get_engine():
-    # Use module reference to support reloading
-    import engine_v2 as engine
-    importlib.reload(engine)
-    return engine.SwingEngine()
-
-# Version Control for Session State
-ENGINE_VERSION = "1.2" # Increment this to force reload
-# Engine init moved to Post-Auth block
+# Engine init moved to Post-Auth block (ui_data.load_engine)
 
 # --- INITIALIZE CONNECTION ---
 @st.cache_resource
@@ -187,8 +147,10 @@ if 'angel_client' not in st.session_state:
 # --- INITIALIZE DATA ---
 import sheets_db
 pos_data = [] # Default
-if 'scan_results' not in st.session_state:
+# Reload when a new snapshot lands (not just once per session)
+if 'scan_results' not in st.session_state or st.session_state.get('scan_version') != snapshot_version:
     st.session_state['scan_results'] = []
+    st.session_state['scan_version'] = snapshot_version
     # Try Load from DB (Unless explicitly ignored via Purge)
     import sheets_db
     if st.session_state.get('ignore_db'):
@@ -196,7 +158,7 @@ if 'scan_results' not in st.session_state:
         # Reset flag so next refresh works
         # del st.session_state['ignore_db'] # Keep it until scan runs? No, reset now
     else:
-        cached_res, updated_at, err_msg = sheets_db.fetch_scan_results()
+        cached_res, updated_at, err_msg = ui_data.load_scan_results(snapshot_version)
     
     if cached_res:
         st.session_state['scan_results'] = cached_res
@@ -294,14 +256,74 @@ with st.sidebar:
             time.sleep(1)
             st.rerun()
 
+        st.markdown("### ⏱️ Timings")
+        import metrics
+        job_metrics = ui_data.load_metrics()
+        if job_metrics:
+            st.caption(f"Last job run: {job_metrics.get('created')} · {job_metrics.get('mode')} · {job_metrics.get('state')}")
+            st.dataframe(pd.DataFrame(metrics.timing_rows(job_metrics)), hide_index=True, width="stretch")
+            counters = [{"metric": c["name"], "labels": ", ".join(f"{k}={v}" for k, v in c["labels"].items()), "value": c["value"]}
+                        for c in job_metrics.get("counters", [])]
+            if counters: st.dataframe(pd.DataFrame(counters), hide_index=True, width="stretch")
+            prom_path = os.path.splitext(ui_data.METRICS_FILE)[0] + ".prom"
+            if os.path.exists(prom_path):
+                with open(prom_path, "r") as f:
+                    st.download_button("Download Prometheus metrics", f.read(), file_name="engine_metrics.prom")
+        else:
+            st.info("No job metrics yet (written at the end of each background scan).")
+        session_rows = metrics.timing_rows(metrics.snapshot())
+        if session_rows:
+            st.caption("This app process (in-app scans, watchlist updates, sheet I/O)")
+            st.dataframe(pd.DataFrame(session_rows), hide_index=True, width="stretch")
+
+        st.markdown("### 📶 API Quota")
+        import api_ledger
+        job_ledger = ui_data.load_api_ledger()
+        source = st.radio("Calls from", ["Last job run", "This app process"], horizontal=True, key="ledger_source")
+        if source == "Last job run":
+            quota = api_ledger.summarize(job_ledger["entries"]) if job_ledger else None
+            if job_ledger: st.caption(f"{job_ledger.get('created')} · {job_ledger.get('mode')} · {job_ledger.get('state')}"
+                                      + (f" · {job_ledger['dropped']} oldest calls dropped" if job_ledger.get("dropped") else ""))
+        else:
+            quota = api_ledger.summarize(api_ledger.entries())
+        if quota:
+            candles = quota["endpoints"].get("getCandleData", {})
+            q1, q2, q3, q4 = st.columns(4)
+            q1.metric("Calls", quota["calls"], f"{quota['retries']} retries", delta_color="off")
+            q2.metric("Avg req/s", quota["avg_rps"], f"{quota['throughput_rps']} ok/s", delta_color="off")
+            q3.metric("Peak candle req/s", candles.get("peak_rps", 0),
+                      f"{candles.get('peak_pct_of_ceiling') or 0}% of {api_ledger.CEILINGS['getCandleData']}/s", delta_color="off")
+            q4.metric("AB1004", quota["ab1004"], f"{quota['ab1004_pct']}%", delta_color="inverse")
+            per_min = pd.DataFrame(quota["per_minute"]).set_index("minute")
+            st.bar_chart(per_min[["ok", "ab1004"]])
+            st.dataframe(pd.DataFrame.from_dict(quota["endpoints"], orient="index"), width="stretch")
+            if quota["errors"]: st.caption("Errors: " + ", ".join(f"{k} × {v}" for k, v in quota["errors"].items()))
+        else:
+            st.info("No broker calls recorded yet.")
+
+        st.markdown("### 🔬 Profiles")
+        import profiling
+        profiles = profiling.list_profiles()
+        if profiles:
+            labels = [f"{p['name']} · {p['created']} · {p['wall_s']}s · peak {p['peak_mb']} MB" for p in profiles]
+            pick = st.selectbox("Run", range(len(profiles)), format_func=lambda i: labels[i], key="profile_pick")
+            prof = profiles[pick]
+            view = st.radio("Top", ["Cumulative time", "Self time", "Allocations"], horizontal=True, key="profile_view")
+            rows = {"Cumulative time": prof["top_cumulative"], "Self time": prof["top_self"], "Allocations": prof["top_alloc"]}[view]
+            st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+            if os.path.exists(prof["path"]):
+                with open(prof["path"], "rb") as f:
+                    st.download_button("Download .prof", f.read(), file_name=os.path.basename(prof["path"]))
+        else:
+            st.info("No profiles yet. Run `python run_engine_job.py --profile` or `python swing_bot.py --profile`.")
+
         st.markdown("### 🚑 Emergency");
         if st.button("Force Unstick (Reset Status)"):
             try:
-                # Reset Status File
-                with open(status_file, "w") as f:
-                    json.dump({"state": "IDLE", "last_updated": "Forced Reset"}, f)
+                # Reset Status File (keeps the last snapshot version)
+                ui_data.reset_status()
                 st.session_state['last_scan_time'] = 0
-                st.success("Status Reset! You can start a new scan.")
+                st.success("Status Reset! The next scan continues from the last checkpoint (if any).")
                 time.sleep(1)
                 st.rerun()
             except Exception as e:
@@ -315,7 +337,9 @@ with st.sidebar:
                 for f in files: os.remove(f)
                 
                 # Clear State
-                for key in ['market_cache', 'scan_results', 'engine']:
+                import market_data
+                market_data.clear_cache()
+                for key in ['scan_results', 'engine']:
                     if key in st.session_state: del st.session_state[key]
                 st.session_state['last_scan_time'] = 0
                 st.session_state['ignore_db'] = True # Prevent reloading bad data from cloud
@@ -397,6 +421,10 @@ with st.sidebar:
     else:
         is_scan_ready = can_scan or force_scan
         btn_label = "RUN BACKGROUND SCAN 🚀" if is_scan_ready else f"Wait {time_left//60}m {time_left%60}s ⏳"
+        if eng_status.get("resumable"):
+            cp = eng_status.get("checkpoint") or {}
+            st.caption(f"⏯️ Interrupted run can resume (daily {cp.get('daily', '?')}, deep {cp.get('deep', '?')}).")
+            if is_scan_ready: btn_label = "RESUME BACKGROUND SCAN ⏯️"
     
     if st.button(btn_label, type="primary", disabled=not (can_scan or force_scan) or eng_status.get("state") == "RUNNING"):
         import subprocess
@@ -406,7 +434,10 @@ with st.sidebar:
         
         # Launch Background Job
         try:
-            subprocess.Popen([sys.executable, "run_engine_job.py", "--mode", "full"])
+            cmd = [sys.executable, "run_engine_job.py", "--mode", "full"]
+            if eng_status.get("resumable") and eng_status.get("mode", "full") == "full":
+                cmd.append("--resume")
+            subprocess.Popen(cmd)
             st.toast("🚀 Background Scan Started! Check banner above.")
             time.sleep(1)
             st.rerun()
@@ -463,7 +494,7 @@ except Exception as e:
 try:
     # Engine Check
     if 'engine' not in st.session_state:
-        st.session_state['engine'] = get_engine()
+        st.session_state['engine'] = ui_data.load_engine(CODE_VERSION)
         # Verify Universe
         u_size = len(st.session_state['engine'].universe)
         print(f"[DEBUG] Engine Instantiated. Universe Size: {u_size}")
@@ -476,15 +507,28 @@ except Exception as e:
 st.title("Swing Decision Radar 📡")
 
 # --- ENGINE STATUS BANNER ---
-# Status already loaded globally at top
-if eng_status.get("state") == "RUNNING":
-    prog = eng_status.get("progress", "0%")
-    mode = eng_status.get("mode", "full")
-    st.warning(f"⚠️ Market Data Updating ({prog})... [Mode: {mode}] \n\n Showing last completed snapshot.")
-    st_autorefresh(interval=30000, key="data_refresh") # Auto-refresh every 30s
-elif eng_status.get("state") == "COMPLETED":
-    last = eng_status.get("last_updated", "Unknown")
-    st.success(f"🟢 Data Current (Updated: {last})")
+# While the job runs only this fragment reruns (every STATUS_POLL_S). Each poll
+# is one stat() of the status file, re-parsed only when the job rewrote it
+# (at most every couple of seconds). The full page reruns once the job leaves
+# RUNNING, to pick up the new snapshot.
+@st.fragment(run_every=STATUS_POLL_S if eng_status.get("state") == "RUNNING" else None)
+def engine_status_banner():
+    status = ui_data.load_status()
+    if status.get("state") != eng_status.get("state"):
+        st.rerun()
+    if status.get("state") == "RUNNING":
+        stats = status.get("stats") or {}
+        mode = status.get("mode", "full")
+        st.warning(f"⚠️ Market Data Updating ({status.get('progress', '0%')})... [Mode: {mode}] \n\n Showing last completed snapshot.")
+        if stats.get("pct") is not None:
+            st.progress(min(stats["pct"], 100) / 100, text=ui_data.format_progress(stats))
+        elif stats:
+            st.caption(ui_data.format_progress(stats))
+    elif status.get("state") == "COMPLETED":
+        last = status.get("last_updated", "Unknown")
+        st.success(f"🟢 Data Current (Updated: {last})")
+
+engine_status_banner()
 
 
 
@@ -577,25 +621,30 @@ with tab_watchlist:
 with tab_history:
     st.header("Trade History (Realized P&L)")
     import sheets_db
-    if st.button("Refresh History"):
-        st.session_state['history'] = sheets_db.fetch_history()
-        
-    if 'history' not in st.session_state:
-        st.session_state['history'] = sheets_db.fetch_history()
+    HISTORY_ROWS = 200 # Table shows the latest N; metrics cover all trades
+    
+    # Aggregates are folded in on every archive_trade, so this is O(1)
+    h_stats = sheets_db.fetch_history_stats()
+    if h_stats.get('count', 0) > 0:
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Total Realized P&L", f"{h_stats['total_pnl']:.2f}%")
+        m2.metric("Win Rate", f"{h_stats['win_rate']:.0f}%")
+        m3.metric("Closed Trades", h_stats['count'])
         
-    hist = st.session_state['history']
-    if hist:
-        df_hist = pd.DataFrame(hist)
-        # Show Metrics
-        if not df_hist.empty:
-            total_pnl = df_hist['PnL'].sum() if 'PnL' in df_hist.columns else 0
-            win_rate = len(df_hist[df_hist['PnL'] > 0]) / len(df_hist) * 100 if len(df_hist) > 0 else 0
-            
-            m1, m2 = st.columns(2)
-            m1.metric("Total Realized P&L", f"{total_pnl:.2f}%")
-            m2.metric("Win Rate", f"{win_rate:.0f}%")
+        with st.expander("📊 Breakdown (Symbol / Exit Reason)"):
+            def bucket_df(buckets, label):
+                df_b = pd.DataFrame([
+                    {label: k, 'Trades': v['count'], 'Win %': v['wins'] / v['count'] * 100, 'P&L': v['pnl']}
+                    for k, v in buckets.items() if v['count']
+                ])
+                return df_b.sort_values('P&L', ascending=False) if not df_b.empty else df_b
             
-            st.dataframe(df_hist, width="stretch")
+            c_sym, c_tag = st.columns(2)
+            c_sym.dataframe(bucket_df(h_stats['by_symbol'], 'Symbol'), hide_index=True, width="stretch")
+            c_tag.dataframe(bucket_df(h_stats['by_tag'], 'Reason'), hide_index=True, width="stretch")
+        
+        st.caption(f"Latest {HISTORY_ROWS} trades")
+        st.dataframe(pd.DataFrame(sheets_db.fetch_history(limit=HISTORY_ROWS)), width="stretch")
     else:
         st.info("No closed trades yet.")
 with tab_portfolio:
@@ -609,8 +658,8 @@ with tab_portfolio:
         st.write("") # Spacer for alignment
         if st.button("🔄 Refresh Data", use_container_width=True):
             # FIX: Force Clear Cache to fetch fresh EOD prices
-            if 'market_cache' in st.session_state:
-                st.session_state.market_cache = {}
+            import market_data
+            market_data.clear_cache()
             st.rerun()
             
     with t_col2:
@@ -665,22 +714,27 @@ with tab_portfolio:
         
         # 1. AUTO-ANALYZE & MERGE
         # Use Pre-Calculated JSON from Background Job if available (Fast)
-        pf_json_path = os.path.join(CACHE_DIR, "ui_portfolio_analysis.json")
-        analysis = []
+        analysis = ui_data.load_portfolio_analysis(snapshot_version)
         
-        if os.path.exists(pf_json_path):
+        if not analysis:
+             # Fallback 1: Check exits against the cached snapshot (no network)
+             live_df = pos_df # Positions the snapshot can't answer for
              try:
-                 with open(pf_json_path, "r") as f:
-                     analysis = json.load(f)
+                 snap_map = ui_data.load_snapshot_map(st.session_state['engine'], snapshot_version)
+                 in_snap = ui_data.snapshot_symbols(snap_map, pos_df['Symbol'] if 'Symbol' in pos_df.columns else [])
+                 if in_snap:
+                     snap_df = pos_df[pos_df['Symbol'].isin(in_snap)]
+                     analysis = st.session_state['engine'].check_exits(snap_df, data_map=snap_map) # Empty just means all HOLD
+                     live_df = pos_df[~pos_df['Symbol'].isin(in_snap)]
              except: pass
-        
-        # Fallback to On-Demand (Slow) if JSON missing
-        if not analysis:
-             with st.spinner("Analyzing Positions (Fallback)..."):
-                try:
-                    # Run Engine Check
-                    analysis = st.session_state['engine'].check_exits(pos_df)
-                except: pass
+
+             # Fallback 2: On-Demand (Slow) for positions missing from the snapshot
+             if len(live_df):
+                 with st.spinner("Analyzing Positions (Fallback)..."):
+                    try:
+                        # Run Engine Check
+                        analysis = list(analysis or []) + list(st.session_state['engine'].check_exits(live_df) or [])
+                    except: pass
                 
         if analysis:
             an_df = pd.DataFrame(analysis)
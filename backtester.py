@@ -0,0 +1,537 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import numpy as np
+import pandas as pd
+import engine_v2
+import metrics
+import mtf_align
+
+# Bar-by-bar replay of the live swing rules over the cached parquet panel.
+#   Indicators: engine_v2.indicator_columns (calculate_indicators' math), so every bar
+#               holds exactly what the live engine computed when that bar was the latest.
+#   Scores:     engine_v2's vectorized rules, computed for all bars x symbols at once.
+#               mode="daily": light TQS entries, check_exits exits, classify_trade
+#               tags on one timeframe (1d by default).
+#               mode="multi_tf": the scan's hybrid score on the 15m grid. Multi-TF
+#               TQS where the light TQS earns a deep scan, exits from the 1h bar.
+#               The 1h / 1d bars are the latest *completed* ones (mtf_align index).
+#   Portfolio:  as swing_bot: exits first, then free slots (MAX_TRADES) are filled
+#               from the TQS >= entry_tqs picks, highest TQS first, then cheapest.
+# Decisions use bar t's close; orders fill at bar t+1's open (fill="next_open"),
+# so no decision sees data that was not known yet.
+#
+# Thresholds come from engine_v2.RULES; pass `rules` overrides to try others
+# (optimizer.py sweeps them).
+#
+# With cache_dir (the CLI's default) every layer is cached content-addressed under
+# cache/backtests/ (see RESULT CACHE), so a re-run with one threshold changed
+# recomputes only what that threshold feeds.
+#
+# Run: python backtester.py [--mode daily|multi_tf] [--start 2024-01-01] [--end ...] [--max-trades 3]
+#                           [--fill next_open|close] [--rule entry_tqs=9 ...] [--out trades.csv] [--no-cache]
+
+MAX_TRADES = 3 # swing_bot.MAX_TRADES
+MIN_BARS = 20 # score_symbol() skips shorter histories
+CAPITAL = 100000.0 # Split evenly across the slots
+FIELDS = ["Open", "High", "Low", "Close", "Volume", "EMA_20", "EMA_50", "RSI", "MACD", "Signal",
+          "Vol_SMA", "High_20", "CHOP"]
+
+def _engine():
+    eng = engine_v2.SwingEngine.__new__(engine_v2.SwingEngine) # Scoring only: no universe download / Discord
+    eng.universe, eng.category_map, eng.discord = [], {}, None
+    return eng
+
+_naive = mtf_align.naive # Exchange-local naive timestamps
+
+# --- PANEL ---
+class Panel:
+    """Prices + indicators of one timeframe as aligned [bars x symbols] float64 arrays."""
+    def __init__(self, index, symbols, fields, timeframe="1d"):
+        self.index = index # DatetimeIndex (naive, exchange time)
+        self.symbols = list(symbols)
+        self.fields = fields # {name: ndarray (len(index), len(symbols))}
+        self.timeframe = timeframe
+        self._marks = None
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    @property
+    def shape(self):
+        return (len(self.index), len(self.symbols))
+
+    @property
+    def mode(self):
+        """Scoring mode: multi_tf panels carry the aligned 1h / 1d fields."""
+        return "multi_tf" if "d1_Close" in self.fields else "daily"
+
+    @property
+    def marks(self):
+        """Close carried forward over missing bars (mark-to-market price)."""
+        if self._marks is None: self._marks = pd.DataFrame(self["Close"]).ffill().to_numpy()
+        return self._marks
+
+def build_panel(frames, timeframe="1d", symbols=None, min_bars=MIN_BARS):
+    """
+    {symbol: OHLCV frame} -> Panel. Indicators for all symbols come from one pass of
+    engine_v2.indicator_columns over [bar position x symbol] frames (each symbol's bars
+    from row 0, NaN after its last one), then land on the union of bar times.
+    Field "Bar" holds each bar's row in its symbol's frame (-1 = no bar).
+    Symbols with fewer than min_bars bars are dropped.
+    """
+    parts = {}
+    for sym in symbols or sorted(frames):
+        df = frames.get(sym)
+        if df is None or len(df) < max(min_bars, 1) or not set(FIELDS[:5]).issubset(df.columns): continue
+        parts[sym] = df[~df.index.duplicated(keep="last")] # As mtf_align.bars()
+    if not parts:
+        fields = {f: np.empty((0, 0)) for f in FIELDS}
+        fields["Bar"] = np.empty((0, 0), np.int32)
+        return Panel(pd.DatetimeIndex([]), [], fields, timeframe)
+
+    syms = list(parts)
+    longest = max(len(df) for df in parts.values())
+    def padded(values): # NaN after the last bar; each symbol keeps its own float dtype, as in calculate_indicators
+        out = np.full(longest, np.nan, dtype=values.dtype if values.dtype.kind == "f" else np.float64)
+        out[:len(values)] = values
+        return out
+    wide = {col: pd.DataFrame({s: padded(parts[s][col].to_numpy()) for s in syms}) for col in FIELDS[:5]}
+    wide.update(engine_v2.indicator_columns(wide["High"], wide["Low"], wide["Close"], wide["Volume"]))
+
+    times = [_naive(parts[s].index) for s in syms]
+    index = pd.DatetimeIndex(np.unique(np.concatenate([t.values for t in times])))
+    rows = np.concatenate([index.searchsorted(t) for t in times])
+    cols = np.concatenate([np.full(len(t), j) for j, t in enumerate(times)])
+    pos = np.concatenate([np.arange(len(t)) for t in times])
+    fields = {}
+    for f in FIELDS:
+        arr = np.full((len(index), len(syms)), np.nan)
+        arr[rows, cols] = wide[f].to_numpy(dtype=np.float64)[pos, cols]
+        fields[f] = arr
+    fields["Bar"] = np.full((len(index), len(syms)), -1, np.int32)
+    fields["Bar"][rows, cols] = pos
+    return Panel(index, syms, fields, timeframe)
+
+def load_panel(timeframe="1d", data_map=None, symbols=None):
+    """Panel from the cached snapshot (ui_*.parquet via load_snapshot) or a given data_map."""
+    data_map = data_map if data_map is not None else (_engine().load_snapshot() or {})
+    return build_panel(data_map.get(timeframe, {}), timeframe, symbols)
+
+# --- MULTI-TIMEFRAME PANEL ---
+MTF_TIMEFRAMES = ("15m", "1h", "1d")
+MTF_PREFIX = {"1h": "h1_", "1d": "d1_"}
+
+def _aligned_rows(base, other, timeframe, align=None):
+    """
+    [15m bars x symbols] row in `other` of each bar's latest completed `timeframe` bar
+    (-1 = none). Offsets come from the stored index where it matches the panel's bars;
+    other symbols are searched here. Returns (rows, number of symbols searched).
+    """
+    out = np.full(base.shape, -1, np.int64)
+    other_col = {s: k for k, s in enumerate(other.symbols)}
+    searched = 0
+    for j, sym in enumerate(base.symbols):
+        k = other_col.get(sym)
+        if k is None: continue
+        rows = np.flatnonzero(base["Bar"][:, j] >= 0) # The symbol's 15m bars, oldest first
+        other_rows = np.flatnonzero(other["Bar"][:, k] >= 0)
+        stored = align.get(sym) if align else None
+        if (stored is not None and len(stored) == len(rows) and np.array_equal(stored.index.values, base.index.values[rows])
+                and stored[timeframe].max() < len(other_rows)):
+            pos = stored[timeframe].to_numpy()
+        else:
+            pos = mtf_align.offsets(base.index[rows], "15m", other.index[other_rows], timeframe)
+            searched += 1
+        ok = pos >= 0
+        out[rows[ok], j] = other_rows[pos[ok]]
+    return out, searched
+
+def build_mtf_panel(data_map, symbols=None, align=None):
+    """
+    15m Panel plus, for every 15m bar, the fields of the latest completed 1h and 1d bar
+    (prefixed h1_ / d1_), h1_ok (a 1h bar exists) and d1_ok (a daily bar with MIN_BARS
+    of history, as score_symbol requires). `align` is mtf_align.load() output.
+    """
+    base = build_panel(data_map.get("15m", {}), "15m", symbols, min_bars=1)
+    fields = dict(base.fields)
+    for tf, prefix in MTF_PREFIX.items():
+        other = build_panel(data_map.get(tf, {}), tf, base.symbols, min_bars=1)
+        if not other.symbols:
+            fields.update({prefix + f: np.full(base.shape, np.nan) for f in FIELDS})
+            fields[prefix + "ok"] = np.zeros(base.shape, bool)
+            continue
+        rows, searched = _aligned_rows(base, other, tf, align)
+        if align and searched: print(f"⚠️ Alignment index stale for {searched} symbols ({tf}); searched instead.")
+        other_col = {s: k for k, s in enumerate(other.symbols)}
+        cols = np.array([other_col.get(s, -1) for s in base.symbols], dtype=np.int64)
+        ok = (rows >= 0) & (cols >= 0)
+        r, c = np.where(ok, rows, 0), np.where(ok, cols, 0)
+        for f in FIELDS: fields[prefix + f] = np.where(ok, other[f][r, c], np.nan)
+        if tf == "1d": ok &= (np.cumsum(other["Bar"] >= 0, axis=0) >= MIN_BARS)[r, c]
+        fields[prefix + "ok"] = ok
+    return Panel(base.index, base.symbols, fields, "15m")
+
+def load_mtf_panel(data_map=None, symbols=None):
+    """Multi-TF panel from the snapshot (with its stored alignment index) or a given data_map."""
+    align = None
+    if data_map is None:
+        data_map = _engine().load_snapshot() or {}
+        align = mtf_align.load()
+    return build_mtf_panel(data_map, symbols, align)
+
+def save_panel(panel, directory):
+    """One .npy per field + panel.json, for open_panel() to memory-map (e.g. from worker processes)."""
+    os.makedirs(directory, exist_ok=True)
+    for name, arr in panel.fields.items(): np.save(os.path.join(directory, name + ".npy"), arr)
+    np.save(os.path.join(directory, "_index.npy"), panel.index.values)
+    with open(os.path.join(directory, "panel.json"), "w") as f:
+        json.dump({"symbols": panel.symbols, "fields": list(panel.fields), "timeframe": panel.timeframe}, f)
+    return directory
+
+def open_panel(directory, mmap=True):
+    """Panel written by save_panel(). With mmap the field arrays are read-only views of the files."""
+    with open(os.path.join(directory, "panel.json"), "r") as f: meta = json.load(f)
+    mode = "r" if mmap else None
+    fields = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mode) for name in meta["fields"]}
+    index = pd.DatetimeIndex(np.load(os.path.join(directory, "_index.npy")))
+    return Panel(index, meta["symbols"], fields, meta["timeframe"])
+
+# --- SIGNALS ---
+# RULES keys each signal array depends on, per scoring mode. A stage is recomputed
+# only when one of its own keys changes (see the `cache` argument of signals()).
+_LIGHT = ("light_rsi_low", "light_rsi_high")
+_MTF = _LIGHT + ("light_tqs", "rsi_low", "rsi_high", "chop_max", "vol_mult")
+STAGE_RULES = {
+    "daily": {"tqs": _LIGHT, "exit": ("exit_rsi", "exit_rev_tqs"), "tag": _LIGHT + ("entry_tqs",)},
+    "multi_tf": {"tqs": _MTF, "exit": ("exit_rsi", "exit_rev_tqs"), "tag": _MTF + ("entry_tqs",)},
+}
+
+def stage_key(stage, rules=None, mode="daily"):
+    r = engine_v2.rules_with(rules)
+    return (mode, stage) + tuple((k, r[k]) for k in STAGE_RULES[mode][stage])
+
+def _view(panel, prefix):
+    return {f: panel[prefix + f] for f in FIELDS}
+
+def signals(panel, rules=None, cache=None):
+    """
+    {tqs, exit, tag} int8 arrays shaped like the panel. Bars a live scan would not
+    score (no bar for the symbol, or fewer than MIN_BARS daily bars so far) get TQS 0 / HOLD.
+    In multi_tf mode (see build_mtf_panel), as in the scan: the multi-TF TQS for bars
+    whose light TQS reaches RULES['light_tqs'] and that have a 1h bar, the light TQS
+    otherwise; exits from the 1h bar; tags from the daily bar.
+    `cache` (a dict kept by the caller for one panel) reuses stage arrays whose rule
+    keys are unchanged, so e.g. sweeping exit rules rescores exits only.
+    """
+    cache = {} if cache is None else cache
+    mode = panel.mode
+    if "valid" not in cache:
+        have = ~np.isnan(panel["Close"])
+        cache["valid"] = have & (panel["d1_ok"] if mode == "multi_tf" else np.cumsum(have, axis=0) >= MIN_BARS)
+    valid = cache["valid"]
+
+    def stage(name, compute):
+        key = stage_key(name, rules, mode)
+        if key not in cache: cache[key] = compute()
+        return cache[key]
+
+    if mode == "multi_tf":
+        h1, d1, h1_ok = _view(panel, "h1_"), _view(panel, "d1_"), panel["h1_ok"]
+        def hybrid_tqs():
+            light = engine_v2.tqs_daily_only_bars(d1, rules)
+            deep = h1_ok & (light >= engine_v2.rules_with(rules)["light_tqs"])
+            tqs = np.where(deep, engine_v2.tqs_multi_tf_bars(panel.fields, h1, d1, rules), light)
+            return np.where(valid, tqs, 0).astype(np.int8)
+        tqs = stage("tqs", hybrid_tqs)
+        exits = stage("exit", lambda: np.where(valid & h1_ok, engine_v2.exit_signal_bars(h1, rules), 0).astype(np.int8))
+        tags = stage("tag", lambda: engine_v2.classify_bars(d1, tqs, rules))
+    else:
+        tqs = stage("tqs", lambda: np.where(valid, engine_v2.tqs_daily_only_bars(panel.fields, rules), 0).astype(np.int8))
+        exits = stage("exit", lambda: np.where(valid, engine_v2.exit_signal_bars(panel.fields, rules), 0).astype(np.int8))
+        tags = stage("tag", lambda: engine_v2.classify_bars(panel.fields, tqs, rules))
+    return {"tqs": tqs, "exit": exits, "tag": tags}
+
+# --- SIMULATION ---
+def _window(index, start, end):
+    lo = 0 if start is None else index.searchsorted(pd.Timestamp(start))
+    hi = len(index) if end is None else index.searchsorted(pd.Timestamp(end), side="right")
+    return lo, hi
+
+def simulate(panel, sig, max_trades=MAX_TRADES, entry_tqs=None, capital=CAPITAL, fill="next_open",
+             start=None, end=None):
+    """
+    Slot-limited portfolio replay. Returns (trades, equity):
+      trades: list of dicts (open positions at the end have exit_time None, marked at the last close)
+      equity: capital + realized + unrealized P&L per bar of the window.
+    entry_tqs defaults to RULES['entry_tqs'].
+    """
+    entry_tqs = engine_v2.RULES["entry_tqs"] if entry_tqs is None else entry_tqs
+    opens, closes, marks = panel["Open"], panel["Close"], panel.marks
+    tqs, exit_code, tags = sig["tqs"], sig["exit"], sig["tag"]
+    lo, hi = _window(panel.index, start, end)
+    slot_capital = capital / max_trades
+    same_bar = fill == "close"
+
+    positions = {} # col -> position dict
+    pending_exit, pending_entry = {}, {} # col -> reason / (tqs, tag), filled at the next bar with an open
+    trades, equity, realized = [], np.full(hi - lo, capital), 0.0
+
+    def do_exit(col, t, price):
+        nonlocal realized
+        pos = positions.pop(col)
+        pnl = (price - pos["entry_price"]) * pos["qty"]
+        realized += pnl
+        trades.append({**pos, "exit_time": panel.index[t], "exit_price": float(price), "pnl": float(pnl),
+                       "pnl_pct": float((price / pos["entry_price"] - 1) * 100), "bars_held": t - pos["_bar"],
+                       "reason": pending_exit.pop(col)})
+
+    def do_entry(col, t, price):
+        score, tag = pending_entry.pop(col)
+        positions[col] = {"symbol": panel.symbols[col], "entry_time": panel.index[t], "entry_price": float(price),
+                          "qty": max(1, int(slot_capital // price)), "tqs": int(score),
+                          "tag": engine_v2.CLASSIFY_TAGS[tag], "_bar": t}
+
+    def fill_orders(t, prices):
+        for col in [c for c in pending_exit if np.isfinite(prices[t, c])]: do_exit(col, t, prices[t, col])
+        for col in [c for c in pending_entry if np.isfinite(prices[t, c]) and c not in positions]:
+            do_entry(col, t, prices[t, col])
+
+    for t in range(lo, hi):
+        if not same_bar: fill_orders(t, opens)
+
+        # Decisions on bar t's close: exits, then entries into the free slots
+        for col in positions:
+            if col not in pending_exit and exit_code[t, col]:
+                pending_exit[col] = engine_v2.EXIT_SIGNALS[exit_code[t, col]]
+        free = max_trades - (len(positions) - len(pending_exit)) - len(pending_entry)
+        if free > 0:
+            picks = np.flatnonzero(tqs[t] >= entry_tqs)
+            picks = [c for c in picks[np.lexsort((closes[t, picks], -tqs[t, picks]))]
+                     if (c not in positions or c in pending_exit) and c not in pending_entry]
+            for col in picks[:free]: pending_entry[col] = (tqs[t, col], tags[t, col])
+        if same_bar: fill_orders(t, closes)
+
+        equity[t - lo] = capital + realized + sum((marks[t, c] - p["entry_price"]) * p["qty"] for c, p in positions.items())
+
+    last = hi - 1
+    for col, pos in positions.items():
+        price = marks[last, col]
+        trades.append({**pos, "exit_time": None, "exit_price": float(price), "pnl": float((price - pos["entry_price"]) * pos["qty"]),
+                       "pnl_pct": float((price / pos["entry_price"] - 1) * 100), "bars_held": last - pos["_bar"], "reason": "OPEN"})
+    for tr in trades: tr.pop("_bar", None)
+    return trades, pd.Series(equity, index=panel.index[lo:hi], name="equity")
+
+def summarize(trades, equity, capital=CAPITAL):
+    closed = [t for t in trades if t["exit_time"] is not None]
+    wins = [t for t in closed if t["pnl"] > 0]
+    peak = equity.cummax() if len(equity) else equity
+    return {"trades": len(closed), "open": len(trades) - len(closed),
+            "win_rate": round(len(wins) / len(closed) * 100, 1) if closed else 0.0,
+            "avg_pnl_pct": round(float(np.mean([t["pnl_pct"] for t in closed])), 2) if closed else 0.0,
+            "total_pnl": round(float(equity.iloc[-1] - capital), 2) if len(equity) else 0.0,
+            "return_pct": round(float(equity.iloc[-1] / capital * 100 - 100), 2) if len(equity) else 0.0,
+            "max_drawdown_pct": round(float(((equity - peak) / peak).min() * 100), 2) if len(equity) else 0.0,
+            "avg_bars_held": round(float(np.mean([t["bars_held"] for t in closed])), 1) if closed else 0.0}
+
+# --- RESULT CACHE ---
+# cache/backtests/<panel key>/
+#   panel/            save_panel() arrays, memory-mapped on a hit
+#   signals/<k>.npy   one signal array per stage key (SignalStore)
+#   results/<k>.*     stats JSON + trades / equity parquet of one run
+# The panel key hashes the data (the ui_<tf>.parquet bytes it is built from, or the
+# given frames), the universe, the scoring mode and the indicator / alignment code; signal and result keys add the rule values and
+# rule / simulation code they depend on. Nothing is invalidated in place: new
+# data or code gives new keys, and prune() drops all but the newest panels.
+CACHE_DIR = os.path.join("cache", "backtests")
+KEEP_PANELS = 3
+
+def _digest(obj):
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _code(*fns):
+    return _digest([inspect.getsource(fn) for fn in fns])
+
+def data_digest(frames, timeframe="1d"):
+    """Content hash of {symbol: OHLCV frame} (the snapshot file itself when frames is None)."""
+    h = hashlib.sha1()
+    if frames is None:
+        path = os.path.join("cache", f"ui_{timeframe}.parquet")
+        if not os.path.exists(path): return None
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""): h.update(chunk)
+        return h.hexdigest()
+    for sym in sorted(frames):
+        df = frames[sym]
+        h.update(sym.encode())
+        h.update(_naive(df.index).values.tobytes())
+        h.update(np.ascontiguousarray(df.reindex(columns=FIELDS[:5]).to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()
+
+def panel_key(timeframe="1d", data_map=None, symbols=None, mode="daily"):
+    timeframes = MTF_TIMEFRAMES if mode == "multi_tf" else (timeframe,)
+    versions = [data_digest(data_map.get(tf, {}) if data_map is not None else None, tf) for tf in timeframes]
+    if None in versions: return None
+    code = [engine_v2.indicator_columns, build_panel]
+    if mode == "multi_tf": code += [build_mtf_panel, _aligned_rows, mtf_align.bar_ends, mtf_align.offsets]
+    return _digest({"data": versions, "timeframes": timeframes, "mode": mode, "min_bars": MIN_BARS,
+                    "universe": sorted(symbols) if symbols else "all", "code": _code(*code)})
+
+def _write_npy(path, arr):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f: np.save(f, arr)
+    os.replace(tmp, path)
+
+def _signal_code():
+    """Digest of the scoring code signals() runs (rule functions and their code tables)."""
+    return _digest([_code(engine_v2.tqs_daily_only_bars, engine_v2.tqs_multi_tf_bars, engine_v2.exit_signal_bars,
+                          engine_v2.reverse_tqs_bars, engine_v2.classify_bars, signals),
+                    engine_v2.CLASSIFY_TAGS, engine_v2.EXIT_SIGNALS])
+
+class SignalStore:
+    """On-disk `cache` for signals(): one .npy per stage key, memory-mapped on read."""
+    def __init__(self, directory):
+        self.directory = directory
+        self.hits, self.misses = 0, 0
+        self._loaded = {}
+        self._code = _signal_code()
+
+    def _path(self, key):
+        return os.path.join(self.directory, _digest([self._code, key]) + ".npy")
+
+    def __contains__(self, key):
+        return key in self._loaded or os.path.exists(self._path(key))
+
+    def __getitem__(self, key):
+        if key not in self._loaded:
+            self._loaded[key] = np.load(self._path(key), mmap_mode="r")
+            self.hits += 1
+            metrics.inc("backtest_cache_total", layer="signals", result="hit")
+        return self._loaded[key]
+
+    def __setitem__(self, key, arr):
+        os.makedirs(self.directory, exist_ok=True)
+        _write_npy(self._path(key), arr)
+        self._loaded[key] = arr
+        self.misses += 1
+        metrics.inc("backtest_cache_total", layer="signals", result="miss")
+
+def _load(timeframe, data_map, symbols, mode):
+    return load_mtf_panel(data_map, symbols) if mode == "multi_tf" else load_panel(timeframe, data_map, symbols)
+
+def cached_panel(timeframe="1d", data_map=None, symbols=None, cache_dir=None, mode="daily"):
+    """(panel, key): the cached panel for this data / universe, built and stored on a miss. key None = not cacheable."""
+    cache_dir = cache_dir or CACHE_DIR
+    key = panel_key(timeframe, data_map, symbols, mode)
+    if key is None: return _load(timeframe, data_map, symbols, mode), None
+    path = os.path.join(cache_dir, key, "panel")
+    if os.path.exists(os.path.join(path, "panel.json")):
+        metrics.inc("backtest_cache_total", layer="panel", result="hit")
+        return open_panel(path), key
+    metrics.inc("backtest_cache_total", layer="panel", result="miss")
+    panel = _load(timeframe, data_map, symbols, mode)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    save_panel(panel, tmp)
+    try: os.replace(tmp, path)
+    except OSError: shutil.rmtree(tmp, ignore_errors=True) # Another run stored it first
+    prune(cache_dir)
+    return panel, key
+
+def _result_key(rules, mode, **params):
+    # A hit skips signals(), so the scoring code is part of the key as well as the simulation
+    return _digest({"rules": rules, "mode": mode, **params, "code": _code(simulate, summarize),
+                    "signals": _signal_code()})
+
+def _load_result(base):
+    try:
+        with open(base + ".json", "r") as f: meta = json.load(f)
+        trades = pd.read_parquet(base + "_trades.parquet")
+        equity = pd.read_parquet(base + "_equity.parquet")["equity"]
+    except Exception: return None
+    return {"trades": trades, "equity": equity, "stats": meta["stats"], "shape": tuple(meta["shape"])}
+
+def _save_result(base, res):
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    res["trades"].to_parquet(base + "_trades.parquet")
+    res["equity"].to_frame().to_parquet(base + "_equity.parquet")
+    with open(base + ".json.tmp", "w") as f: json.dump({"stats": res["stats"], "shape": res["shape"]}, f)
+    os.replace(base + ".json.tmp", base + ".json") # Written last: marks the entry complete
+
+def prune(cache_dir=None, keep=KEEP_PANELS):
+    """Drops all but the newest `keep` panel directories (with their signals / results)."""
+    cache_dir = cache_dir or CACHE_DIR
+    try: entries = [os.path.join(cache_dir, d) for d in os.listdir(cache_dir)]
+    except OSError: return
+    entries = sorted((d for d in entries if os.path.isdir(d)), key=os.path.getmtime, reverse=True)
+    for old in entries[keep:]: shutil.rmtree(old, ignore_errors=True)
+
+def run(data_map=None, timeframe="1d", start=None, end=None, max_trades=MAX_TRADES, rules=None,
+        capital=CAPITAL, fill="next_open", panel=None, cache_dir=None, mode="daily"):
+    """
+    Panel -> signals -> simulation. Returns {trades (DataFrame), equity (Series), stats, timings, shape}.
+    mode="multi_tf" replays on the 15m grid (timeframe is ignored); a given panel brings its own mode.
+    With cache_dir (and no explicit panel) each layer is read from / written to the result cache;
+    timings["cache"] says which layers were reused.
+    """
+    rules = engine_v2.rules_with(rules)
+    timings, t0 = {}, time.perf_counter()
+    key = store = result_base = None
+    if cache_dir and panel is None:
+        panel, key = cached_panel(timeframe, data_map, cache_dir=cache_dir, mode=mode)
+    else:
+        panel = panel or _load(timeframe, data_map, None, mode)
+    timings["panel_s"] = round(time.perf_counter() - t0, 3)
+
+    if key is not None:
+        rkey = _result_key(rules, panel.mode, max_trades=max_trades, capital=capital, fill=fill, start=start, end=end)
+        result_base = os.path.join(cache_dir, key, "results", rkey)
+        res = _load_result(result_base)
+        metrics.inc("backtest_cache_total", layer="result", result="hit" if res else "miss")
+        if res:
+            timings["cache"] = {"panel": key, "result": "hit"}
+            return {**res, "timings": timings}
+        store = SignalStore(os.path.join(cache_dir, key, "signals"))
+
+    t0 = time.perf_counter()
+    sig = signals(panel, rules, cache=store)
+    timings["signals_s"] = round(time.perf_counter() - t0, 3)
+    t0 = time.perf_counter()
+    trades, equity = simulate(panel, sig, max_trades, rules["entry_tqs"], capital, fill, start, end)
+    timings["simulate_s"] = round(time.perf_counter() - t0, 3)
+    res = {"trades": pd.DataFrame(trades), "equity": equity, "stats": summarize(trades, equity, capital),
+           "shape": panel.shape}
+    if result_base:
+        try: _save_result(result_base, res)
+        except Exception as e: print(f"⚠️ Backtest cache write failed: {e}")
+        timings["cache"] = {"panel": key, "result": "miss", "signals_reused": store.hits, "signals_computed": store.misses}
+    return {**res, "timings": timings}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Replay the swing rules over the cached snapshot")
+    parser.add_argument("--mode", default="daily", choices=list(STAGE_RULES))
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--max-trades", type=int, default=MAX_TRADES)
+    parser.add_argument("--rule", nargs="*", default=[], metavar="KEY=VALUE", help="engine_v2.RULES overrides")
+    parser.add_argument("--capital", type=float, default=CAPITAL)
+    parser.add_argument("--fill", default="next_open", choices=["next_open", "close"])
+    parser.add_argument("--out", default=None, help="Write the trade log as CSV")
+    parser.add_argument("--no-cache", action="store_true", help=f"Recompute everything (skip {CACHE_DIR})")
+    args = parser.parse_args()
+
+    rules = {k: type(engine_v2.RULES[k])(v) for k, v in (item.split("=", 1) for item in args.rule)}
+    res = run(start=args.start, end=args.end, max_trades=args.max_trades, rules=rules, capital=args.capital,
+              fill=args.fill, cache_dir=None if args.no_cache else CACHE_DIR, mode=args.mode)
+    if not res["shape"][1]:
+        print("No snapshot data (run run_engine_job.py first).")
+        sys.exit(1)
+    print(f"Panel: {res['shape'][0]} bars x {res['shape'][1]} symbols · {res['timings']}")
+    for k, v in res["stats"].items(): print(f"  {k:<18} {v}")
+    if args.out and not res["trades"].empty:
+        res["trades"].to_csv(args.out, index=False)
+        print(f"Trades -> {args.out}")
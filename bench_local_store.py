@@ -0,0 +1,81 @@
+import os
+import time
+import json
+import shutil
+import tempfile
+import local_store
+
+# Compares the legacy db.json layer (parse/dump whole file) with the SQLite store
+# as history grows. Run: python bench_local_store.py
+
+SIZES = [100, 1000, 10000, 50000]
+REPEATS = 20
+
+def make_trade(i):
+    return {
+        "Date": "2025-01-01", "Symbol": f"SYM{i % 250}", "Entry": 100.0 + i % 7,
+        "Exit": 105.0, "PnL": 5.0 - (i % 11), "Reason": "TEST"
+    }
+
+def make_db(n_history):
+    return {
+        "portfolio": [{"Symbol": f"P{i}", "Status": "OPEN", "Entry": 100.0} for i in range(3)],
+        "history": [make_trade(i) for i in range(n_history)],
+        "scan_results": [{"Symbol": f"S{i}", "TQS": i % 11} for i in range(250)],
+        "watchlist": [{"Symbol": f"W{i}", "status": "ACTIVE"} for i in range(100)],
+        "last_synced": "bench"
+    }
+
+def timeit(fn, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats): fn()
+    return (time.perf_counter() - start) / repeats * 1000 # ms
+
+def bench_json(path, db):
+    with open(path, "w") as f: json.dump(db, f, indent=4)
+
+    def read():
+        with open(path, "r") as f: return json.load(f)["portfolio"]
+
+    def write():
+        with open(path, "r") as f: data = json.load(f)
+        data["history"].append(make_trade(0))
+        with open(path, "w") as f: json.dump(data, f, indent=4)
+
+    return timeit(read), timeit(write)
+
+def bench_sqlite(db):
+    local_store.save_all(db)
+
+    def read():
+        return local_store.read_table("portfolio")
+
+    def write():
+        local_store.append_row("history", make_trade(0))
+
+    return timeit(read), timeit(write)
+
+def run():
+    tmp = tempfile.mkdtemp(prefix="bench_store_")
+    orig_store = local_store.STORE_FILE
+    orig_json = local_store.LEGACY_JSON_FILE
+    try:
+        local_store.LEGACY_JSON_FILE = os.path.join(tmp, "none.json")
+        print(f"{'History':>8} | {'JSON read':>10} | {'JSON write':>10} | {'SQL read':>9} | {'SQL write':>9}  (ms/op)")
+        print("-" * 62)
+        for n in SIZES:
+            db = make_db(n)
+            local_store.close()
+            local_store.STORE_FILE = os.path.join(tmp, f"bench_{n}.sqlite")
+
+            j_read, j_write = bench_json(os.path.join(tmp, f"bench_{n}.json"), db)
+            s_read, s_write = bench_sqlite(db)
+            print(f"{n:>8} | {j_read:>10.2f} | {j_write:>10.2f} | {s_read:>9.2f} | {s_write:>9.2f}")
+    finally:
+        local_store.close()
+        local_store.STORE_FILE = orig_store
+        local_store.LEGACY_JSON_FILE = orig_json
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import threading
+import tracemalloc
+import pandas as pd
+
+# End-to-end benchmark of the scan pipeline on synthetic universes.
+# Each stage is timed (best of REPEATS) while its peak memory growth is sampled
+# (RSS from /proc on Linux; tracemalloc elsewhere, which slows the stage down).
+# Results go to a JSON file; with --baseline they are compared stage by stage
+# and the run exits 1 on a regression.
+#
+#   aggregate_and_swap   raw cache files -> ui_*.parquet (run_engine_job)
+#   load_snapshot        ui_*.parquet -> data_map
+#   calculate_indicators every symbol's daily frame
+#   get_weekly_rankings  daily frames -> weekly rank map
+#   scan                 full scan over the snapshot data_map
+#   check_exits          PORTFOLIO_SIZE open positions
+#   update_watchlist     watchlist pass over the snapshot (local store in the workdir)
+#
+# Run: python bench_pipeline.py [--sizes 250 1000 5000] [--out bench_results.json]
+#                               [--baseline bench_baseline.json] [--tolerance 0.25]
+
+SIZES = [250, 1000, 5000]
+REPEATS = 2
+RSS_SAMPLE_S = 0.01
+TOLERANCE = 0.25 # Allowed slowdown / memory growth vs baseline before flagging
+MIN_DELTA_MS = 5.0 # Ignore regressions smaller than these (noise on tiny stages)
+MIN_DELTA_MB = 5.0
+PORTFOLIO_SIZE = 50
+DAYS, INTRADAY_DAYS = 500, 60 # Daily history / intraday sessions per symbol (15m is trimmed to 30 days on write)
+SEED = 7
+
+# --- SYNTHETIC UNIVERSE ---
+def write_universe(raw_dir, n_symbols, seed=SEED):
+    """Raw cache files ({SYM}_{tf}.parquet) for n symbols (synthetic_data, anomalies on). Returns the tickers."""
+    import synthetic_data
+    tickers = [f"SYN{i}.NS" for i in range(n_symbols)]
+    synthetic_data.write_raw_cache(synthetic_data.iter_universe(symbols=tickers, days=DAYS, intraday_days=INTRADAY_DAYS,
+                                                               seed=seed), raw_dir)
+    return tickers
+
+def seed_store(tickers):
+    """Local store with a portfolio and a half-full watchlist (no cloud sync needed)."""
+    import local_store
+    pf = [{"Symbol": t, "Status": "OPEN", "Entry": 100.0, "Qty": 1} for t in tickers[:PORTFOLIO_SIZE]]
+    wl = [{"Symbol": t, "status": "ACTIVE", "current_tqs": 8, "max_tqs": 8, "days_tracked": 1}
+          for t in tickers[:: max(1, len(tickers) // 50)]]
+    local_store.save_all({"portfolio": pf, "history": [], "scan_results": [], "watchlist": wl, "last_synced": "bench"})
+    return pd.DataFrame(pf)
+
+def make_engine(tickers):
+    import engine_v2
+    eng = engine_v2.SwingEngine.__new__(engine_v2.SwingEngine) # Skip universe download / Discord
+    eng.universe, eng.category_map, eng.discord = list(tickers), {}, None
+    return eng
+
+# --- MEASUREMENT ---
+def _rss():
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+MEM_SOURCE = "rss" if _rss() is not None else "tracemalloc"
+
+class PeakMemory:
+    """Peak memory growth (bytes) over a with-block."""
+    def __enter__(self):
+        self.peak = 0
+        if MEM_SOURCE == "tracemalloc":
+            tracemalloc.start()
+            return self
+        self._base, self._stop = _rss(), threading.Event()
+        def sample():
+            while not self._stop.wait(RSS_SAMPLE_S):
+                self.peak = max(self.peak, _rss() - self._base)
+        self._thread = threading.Thread(target=sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if MEM_SOURCE == "tracemalloc":
+            self.peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, _rss() - self._base)
+
+def measure(fn, repeats):
+    """(best wall ms, peak memory growth MB, result of the last run)."""
+    best, peak, result = None, 0, None
+    for _ in range(repeats):
+        with PeakMemory() as mem:
+            start = time.perf_counter()
+            result = fn()
+            ms = (time.perf_counter() - start) * 1000
+        best = ms if best is None else min(best, ms)
+        peak = max(peak, mem.peak)
+    return round(best, 1), round(peak / 1024 ** 2, 2), result
+
+def run_size(n_symbols, repeats=REPEATS, workdir=None):
+    """All stages for one universe size, inside a throwaway workdir. Returns {stage: {ms, peak_mb}}."""
+    own = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix=f"bench_pipeline_{n_symbols}_")
+    cwd = os.getcwd()
+    os.makedirs(os.path.join(workdir, "cache", "raw"), exist_ok=True)
+    os.chdir(workdir) # run_engine_job / market_data / local_store use cwd-relative paths
+    try:
+        import local_store
+        import run_engine_job as job
+        local_store.close()
+        tickers = write_universe(os.path.join("cache", "raw"), n_symbols)
+        pf_df = seed_store(tickers)
+        eng = make_engine(tickers)
+        stages, state = {}, {}
+
+        def stage(name, fn, n=repeats):
+            ms, peak, result = measure(fn, n)
+            stages[name] = {"ms": ms, "peak_mb": peak}
+            print(f"  {name:<22} {ms:>10.1f} ms {peak:>9.1f} MB", flush=True)
+            return result
+
+        stage("aggregate_and_swap", lambda: job.aggregate_and_swap(tickers, "full"))
+        data_map = stage("load_snapshot", eng.load_snapshot)
+        d_1d = data_map.get("1d", {})
+        stage("calculate_indicators", lambda: [eng.calculate_indicators(df) for df in d_1d.values()])
+        stage("get_weekly_rankings", lambda: eng.get_weekly_rankings(d_1d))
+        state["scan"] = stage("scan", lambda: eng.scan(data_map=data_map))
+        stage("check_exits", lambda: eng.check_exits(pf_df, data_map=data_map))
+        eng.fetch_data = lambda limit_to_tickers=None: data_map # Snapshot instead of a live fetch
+        stage("update_watchlist", eng.update_watchlist)
+        return {"symbols": n_symbols, "scan_results": len(state["scan"]), "stages": stages}
+    finally:
+        try:
+            import local_store
+            local_store.close()
+        except Exception: pass
+        os.chdir(cwd)
+        if own: shutil.rmtree(workdir, ignore_errors=True)
+
+# --- BASELINE ---
+def compare(results, baseline, tolerance=TOLERANCE, min_delta_ms=MIN_DELTA_MS, min_delta_mb=MIN_DELTA_MB):
+    """Stages slower (or hungrier) than baseline * (1 + tolerance). Returns a list of messages."""
+    regressions = []
+    same_mem = results.get("mem_source") == baseline.get("mem_source") # RSS and tracemalloc don't compare
+    base_sizes = {str(r["symbols"]): r for r in baseline.get("runs", [])}
+    for run in results.get("runs", []):
+        base = base_sizes.get(str(run["symbols"]))
+        if not base: continue
+        for name, cur in run["stages"].items():
+            ref = base["stages"].get(name)
+            if not ref: continue
+            if cur["ms"] > ref["ms"] * (1 + tolerance) and cur["ms"] - ref["ms"] >= min_delta_ms:
+                regressions.append(f"{run['symbols']} symbols / {name}: {ref['ms']:.1f} -> {cur['ms']:.1f} ms")
+            if (same_mem and cur["peak_mb"] > ref.get("peak_mb", 0) * (1 + tolerance)
+                    and cur["peak_mb"] - ref.get("peak_mb", 0) >= min_delta_mb):
+                regressions.append(f"{run['symbols']} symbols / {name}: {ref['peak_mb']:.1f} -> {cur['peak_mb']:.1f} MB peak")
+    return regressions
+
+def run(sizes=None, repeats=REPEATS, out=None, baseline=None, tolerance=TOLERANCE):
+    results = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+               "pandas": pd.__version__, "machine": platform.machine(), "repeats": repeats,
+               "mem_source": MEM_SOURCE, "runs": []}
+    for n in sizes or SIZES:
+        print(f"Universe: {n} symbols")
+        results["runs"].append(run_size(n, repeats))
+    if out:
+        with open(out, "w") as f: json.dump(results, f, indent=2)
+        print(f"Results -> {out}")
+
+    regressions = []
+    if baseline and os.path.exists(baseline):
+        with open(baseline, "r") as f: regressions = compare(results, json.load(f), tolerance)
+        print(f"Baseline {baseline}: " + ("no regressions" if not regressions else f"{len(regressions)} regressions"))
+        for r in regressions: print(f"  ⚠️ {r}")
+    elif baseline:
+        print(f"Baseline {baseline} not found (save one with --out {baseline}).")
+    return results, regressions
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Scan pipeline benchmark on synthetic universes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    _, regressions = run(args.sizes, args.repeats, os.path.abspath(args.out),
+                         os.path.abspath(args.baseline) if args.baseline else None, args.tolerance)
+    sys.exit(1 if regressions else 0)
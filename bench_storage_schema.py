@@ -0,0 +1,91 @@
+import os
+import glob
+import time
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+import market_data
+
+# Compares the legacy snapshot layout (float64, snappy, string Symbol) with the
+# compact storage schema (market_data.to_storage + zstd + categorical Symbol):
+# on-disk size of ui_*.parquet and SwingEngine.load_snapshot() time.
+# Uses cache/raw when present, otherwise a synthetic universe.
+# Run: python bench_storage_schema.py [n_symbols]
+
+TIMEFRAMES = {"1d": ("D", 500), "1h": ("h", 700), "15m": ("15min", 3500)}
+REPEATS = 5
+
+def synthetic_raw(n_symbols):
+    rng = np.random.default_rng(7)
+    raw = {tf: {} for tf in TIMEFRAMES}
+    for tf, (freq, rows) in TIMEFRAMES.items():
+        idx = pd.date_range(end="2025-06-30 15:15", periods=rows, freq=freq, tz="Asia/Kolkata", name="Date")
+        for i in range(n_symbols):
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+            raw[tf][f"SYM{i}.NS"] = pd.DataFrame({
+                "Open": close * 0.999, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                "Volume": rng.integers(1_000, 1_000_000, rows).astype(float),
+            }, index=idx)
+    return raw
+
+def cached_raw():
+    raw = {tf: {} for tf in TIMEFRAMES}
+    for path in glob.glob(os.path.join("cache", "raw", "*.parquet")):
+        sym, _, tf = os.path.basename(path)[:-len(".parquet")].rpartition("_")
+        if tf in raw: raw[tf][f"{sym}.NS"] = pd.read_parquet(path)
+    return raw
+
+def write_snapshot(cache_dir, raw, compact):
+    total = 0
+    for tf, frames in raw.items():
+        if not frames: continue
+        dfs = []
+        for sym, df in frames.items():
+            df = market_data.to_storage(df, tf) if compact else df.astype(float)
+            df = df.copy()
+            df["Symbol"] = sym
+            dfs.append(df)
+        full = pd.concat(dfs).reset_index()
+        date_col = "Date" if "Date" in full.columns else full.columns[0]
+        if compact: full["Symbol"] = full["Symbol"].astype("category")
+        full = full.set_index(["Symbol", date_col])
+        path = os.path.join(cache_dir, f"ui_{tf}.parquet")
+        full.to_parquet(path, **(market_data.PARQUET_OPTIONS if compact else {}))
+        total += os.path.getsize(path)
+    return total
+
+def time_load(workdir):
+    import engine_v2
+    eng = engine_v2.SwingEngine.__new__(engine_v2.SwingEngine) # Skip universe download
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        for _ in range(REPEATS): data_map = eng.load_snapshot()
+        return (time.perf_counter() - start) / REPEATS * 1000, data_map
+    finally:
+        os.chdir(cwd)
+
+def run(n_symbols=None):
+    raw = synthetic_raw(n_symbols) if n_symbols else cached_raw()
+    if not any(raw.values()): raw = synthetic_raw(250)
+    n = len(raw["1d"])
+    tmp = tempfile.mkdtemp(prefix="bench_schema_")
+    try:
+        print(f"Symbols: {n}")
+        print(f"{'Layout':>8} | {'Disk (KB)':>10} | {'load_snapshot (ms)':>18} | {'Memory (MB)':>11}")
+        print("-" * 58)
+        for label, compact in (("legacy", False), ("compact", True)):
+            workdir = os.path.join(tmp, label)
+            os.makedirs(os.path.join(workdir, "cache"))
+            size = write_snapshot(os.path.join(workdir, "cache"), raw, compact)
+            ms, data_map = time_load(workdir)
+            mem = sum(df.memory_usage(deep=True).sum() for tf in (data_map or {}).values() for df in tf.values())
+            print(f"{label:>8} | {size / 1024:>10.0f} | {ms:>18.1f} | {mem / 1024 ** 2:>11.1f}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    import sys
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else None)
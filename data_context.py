@@ -0,0 +1,123 @@
+import os
+import threading
+
+# --- RUNTIME CONTEXT ---
+# Where library modules (market_data, angel_data, engine_v2, ...) keep
+# per-process state such as the memory candle cache and the Angel session,
+# and where they read secrets from.
+#
+#   InProcessContext  - default. Plain dicts; used by run_engine_job, swing_bot, tests.
+#   StreamlitContext  - injected by app.py via use_streamlit(st). Per-session state.
+#
+# Library code only talks to get_context(); it never imports streamlit itself.
+
+SECRETS_FILE = os.path.join(".streamlit", "secrets.toml")
+
+class InProcessContext:
+    """Process-wide state for headless runs."""
+    name = "in-process"
+
+    def __init__(self, secrets_file=None):
+        self._state = {}
+        self._lock = threading.Lock()
+        self._secrets_file = secrets_file or SECRETS_FILE
+        self._secrets = None
+
+    def get(self, key, default=None):
+        return self._state.get(key, default)
+
+    def set(self, key, value):
+        self._state[key] = value
+
+    def pop(self, key, default=None):
+        return self._state.pop(key, default)
+
+    def reset(self, key):
+        """Drops key so the next get_or_create rebuilds it."""
+        self._state.pop(key, None)
+
+    def get_or_create(self, key, factory):
+        """Returns state[key], building it once with factory() (thread-safe)."""
+        if key in self._state: return self._state[key]
+        with self._lock:
+            if key not in self._state:
+                self._state[key] = factory()
+            return self._state[key]
+
+    @property
+    def secrets(self):
+        # Same file Streamlit reads, parsed without importing Streamlit.
+        if self._secrets is None:
+            try:
+                import tomllib
+                with open(self._secrets_file, "rb") as f: self._secrets = tomllib.load(f)
+            except Exception:
+                self._secrets = {}
+        return self._secrets
+
+class StreamlitContext(InProcessContext):
+    """
+    st.session_state on the script thread (one state per browser session).
+    Worker threads (fetch pool) have no script context, so they share the
+    in-process dicts instead of going through the session-state proxy.
+    """
+    name = "streamlit"
+
+    def __init__(self, st):
+        super().__init__()
+        self._st = st
+
+    def _store(self):
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        if get_script_run_ctx(suppress_warning=True) is None:
+            return self._state
+        return self._st.session_state
+
+    def get(self, key, default=None):
+        return self._store().get(key, default)
+
+    def set(self, key, value):
+        self._store()[key] = value
+
+    def pop(self, key, default=None):
+        return self._store().pop(key, default)
+
+    def reset(self, key):
+        # Clears both the session copy and the one shared by worker threads.
+        super().reset(key)
+        if self._store() is not self._state:
+            self._st.session_state.pop(key, None)
+
+    def get_or_create(self, key, factory):
+        store = self._store()
+        if store is self._state: return super().get_or_create(key, factory)
+        if key not in store: store[key] = factory()
+        return store[key]
+
+    @property
+    def secrets(self):
+        return self._st.secrets
+
+_context = InProcessContext()
+
+def get_context():
+    return _context
+
+def set_context(ctx):
+    """Installs ctx for this process. Returns the previous context."""
+    global _context
+    prev, _context = _context, ctx
+    return prev
+
+def use_streamlit(st):
+    """Called by app.py. No-op if a Streamlit context is already installed."""
+    if not isinstance(_context, StreamlitContext):
+        set_context(StreamlitContext(st))
+    return _context
+
+def get_secret(key, default=None):
+    try:
+        secrets = _context.secrets
+        return secrets[key] if key in secrets else default
+    except Exception:
+        return default
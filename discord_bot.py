@@ -1,6 +1,4 @@
 
-import requests
-import streamlit as st
 import datetime
 
 class DiscordBot:
@@ -18,11 +16,8 @@ class DiscordBot:
         
     def _get_secret(self, key):
         """Fetch secure webhook from secrets"""
-        try:
-            if key in st.secrets:
-                return st.secrets[key]
-        except: pass
-        return None
+        import data_context
+        return data_context.get_secret(key)
 
     def send_embed(self, title, description, color=0x00ff00, fields=None, webhook_url=None):
         """Send Fancy Embed to specific URL"""
@@ -42,6 +37,7 @@ class DiscordBot:
         data = {"embeds": [embed]}
         
         try:
+            import requests
             response = requests.post(target_url, json=data)
             return response.status_code == 204
         except: return False
@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import time
 import os
+import metrics
 
 # --- CONSTANTS ---
 DEFAULT_TICKERS = [
@@ -11,11 +12,96 @@ DEFAULT_TICKERS = [
     "VBL.NS", "COALINDIA.NS", "ONGC.NS", "NTPC.NS", "POWERGRID.NS"
 ]
 
-from nifty_utils import get_combined_universe, get_categorized_universe
+# Signal thresholds shared by the engine, swing_bot, run_engine_job and the
+# backtester (optimizer.py sweeps them). Read at call time, never copied.
+RULES = {
+    "entry_tqs": 8,         # TQS that makes a trade: auto-buy, watchlist entry, ROCKET / STRONG tags
+    "exit_rev_tqs": 7,      # Reverse TQS -> EXIT SIGNAL / watchlist INACTIVE
+    "exit_rsi": 75,         # RSI -> EXIT WARNING (overbought)
+    "rsi_low": 55,          # Multi-TF TQS: 1H RSI sweet spot (half points within 5 of it)
+    "rsi_high": 70,
+    "chop_max": 50,         # Multi-TF TQS: 1H CHOP below = trending (half points within 5)
+    "vol_mult": 1.2,        # Multi-TF TQS: 1H volume vs its 20-bar average
+    "light_rsi_low": 50,    # Daily-only TQS: bullish RSI zone
+    "light_rsi_high": 70,
+    "light_tqs": 5,         # Daily-only TQS that earns a deep (1h/15m) fetch
+}
+
+def rules_with(overrides=None):
+    """RULES with `overrides` applied (unknown keys raise KeyError)."""
+    for k in overrides or {}:
+        if k not in RULES: raise KeyError(f"Unknown rule: {k}")
+    return {**RULES, **(overrides or {})}
+
+# --- INDICATORS ---
+def indicator_columns(high, low, close, volume):
+    """
+    Indicator columns of SwingEngine.calculate_indicators, in order. Inputs are
+    Series (one symbol) or DataFrames (one column per symbol, bars by position);
+    every operation is column-wise and causal, so both give the same numbers.
+    """
+    out = {}
+    # EMA
+    out['EMA_9'] = close.ewm(span=9, adjust=False).mean()
+    out['EMA_20'] = close.ewm(span=20, adjust=False).mean()
+    out['EMA_50'] = close.ewm(span=50, adjust=False).mean()
+    out['EMA_200'] = close.ewm(span=200, adjust=False).mean()
+
+    # RSI
+    delta = close.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
+    rs = gain / loss
+    out['RSI'] = 100 - (100 / (1 + rs))
+
+    # MACD
+    ema12 = close.ewm(span=12, adjust=False).mean()
+    ema26 = close.ewm(span=26, adjust=False).mean()
+    out['MACD'] = ema12 - ema26
+    out['Signal'] = out['MACD'].ewm(span=9, adjust=False).mean()
+
+    # ATR (Approx)
+    out['TR'] = np.maximum(
+        high - low,
+        np.maximum(
+            abs(high - close.shift(1)),
+            abs(low - close.shift(1))
+        )
+    )
+    out['ATR'] = out['TR'].rolling(window=14).mean()
+
+    # Volume SMA
+    out['Vol_SMA'] = volume.rolling(window=20).mean()
+
+    # Highs
+    out['High_20'] = high.rolling(window=20).max()
+
+    # --- CHOP INDEX (14) ---
+    # 100 * LOG10( SUM(TR, 14) / (MaxHi(14) - MinLo(14)) ) / LOG10(14)
+    high_14 = high.rolling(window=14).max()
+    low_14 = low.rolling(window=14).min()
+    range_14 = high_14 - low_14
+    sum_tr_14 = out['TR'].rolling(window=14).sum()
+
+    # Avoid Division by Zero & Invalid Log inputs
+    # Replace 0 range with NaN or small epsilon
+    range_14 = range_14.replace(0, np.nan) 
+
+    ratio = sum_tr_14 / range_14
+    out['CHOP'] = 100 * np.log10(ratio) / np.log10(14)
+
+    # Fill NaNs (first 14 rows) with 50 (Neutral)
+    out['CHOP'] = out['CHOP'].fillna(50)
+
+    # Handle Infinite?
+    out['CHOP'] = out['CHOP'].replace([np.inf, -np.inf], 50)
+
+    return out
 
 class SwingEngine:
     def __init__(self):
-        # Auto-load Midcap/Smallcap Universe
+        # Auto-load Midcap/Smallcap Universe (nifty_utils pulls in requests: import on use)
+        from nifty_utils import get_categorized_universe
         univ, cat_map = get_categorized_universe()
         self.universe = univ
         self.category_map = cat_map
@@ -72,8 +158,9 @@ class SwingEngine:
                                        for symbol, data in df.groupby('Symbol')}
                 elif isinstance(df.index, pd.MultiIndex):
                      data_map['15m'] = {symbol: data.droplevel(0) for symbol, data in df.groupby(level=0)}
-                
-            return data_map
+
+            import market_data # Snapshot files use the float32 storage schema
+            return {tf: {sym: market_data.from_storage(data) for sym, data in frames.items()} for tf, frames in data_map.items()}
         except Exception as e:
             print(f"Snapshot Load Error: {e}")
             return None
@@ -81,69 +168,16 @@ class SwingEngine:
     # [Deleted duplicate fetch_data method]
 
 
+    @metrics.timed("engine_seconds")
     def calculate_indicators(self, df):
         """Add Technicals (EMA, RSI, MACD)"""
         if df.empty: return None
         
         # Ensure single level column if series
-        df = df.copy() # Critial Fix for Data Leaking
         try:
-            # EMA
-            df['EMA_9'] = df['Close'].ewm(span=9, adjust=False).mean()
-            df['EMA_20'] = df['Close'].ewm(span=20, adjust=False).mean()
-            df['EMA_50'] = df['Close'].ewm(span=50, adjust=False).mean()
-            df['EMA_200'] = df['Close'].ewm(span=200, adjust=False).mean()
-            
-            # RSI
-            delta = df['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            df['RSI'] = 100 - (100 / (1 + rs))
-            
-            # MACD
-            ema12 = df['Close'].ewm(span=12, adjust=False).mean()
-            ema26 = df['Close'].ewm(span=26, adjust=False).mean()
-            df['MACD'] = ema12 - ema26
-            df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-            
-            # ATR (Approx)
-            df['TR'] = np.maximum(
-                df['High'] - df['Low'],
-                np.maximum(
-                    abs(df['High'] - df['Close'].shift(1)),
-                    abs(df['Low'] - df['Close'].shift(1))
-                )
-            )
-            df['ATR'] = df['TR'].rolling(window=14).mean()
-            
-            # Volume SMA
-            df['Vol_SMA'] = df['Volume'].rolling(window=20).mean()
-            
-            # Highs
-            df['High_20'] = df['High'].rolling(window=20).max()
-            
-            # --- CHOP INDEX (14) ---
-            # 100 * LOG10( SUM(TR, 14) / (MaxHi(14) - MinLo(14)) ) / LOG10(14)
-            high_14 = df['High'].rolling(window=14).max()
-            low_14 = df['Low'].rolling(window=14).min()
-            range_14 = high_14 - low_14
-            sum_tr_14 = df['TR'].rolling(window=14).sum()
-            
-            # Avoid Division by Zero & Invalid Log inputs
-            # Replace 0 range with NaN or small epsilon
-            range_14 = range_14.replace(0, np.nan) 
-            
-            ratio = sum_tr_14 / range_14
-            df['CHOP'] = 100 * np.log10(ratio) / np.log10(14)
-            
-            # Fill NaNs (first 14 rows) with 50 (Neutral)
-            df['CHOP'] = df['CHOP'].fillna(50)
-            
-            # Handle Infinite?
-            df['CHOP'] = df['CHOP'].replace([np.inf, -np.inf], 50)
-            
-            return df
+            cols = indicator_columns(df['High'], df['Low'], df['Close'], df['Volume'])
+            # New frame (never the caller's: Critial Fix for Data Leaking), re-computed columns replaced
+            return pd.concat([df.drop(columns=list(cols), errors='ignore'), pd.DataFrame(cols, index=df.index)], axis=1)
         except Exception as e:
             # print(f"Indicator Error: {e}")
             return None
@@ -151,9 +185,9 @@ class SwingEngine:
     def get_live_price(self, symbol):
         """Fetches the latest close price for a single symbol via Angel One."""
         try:
-             import streamlit as st
-             if 'angel_mgr' in st.session_state:
-                 mgr = st.session_state.angel_mgr
+             import data_context
+             mgr = data_context.get_context().get("angel_mgr")
+             if mgr is not None:
                  # Fetch 1 day, 1m interval to get latest
                  # Or use specific "LTP" API if available? 
                  # Candle is safer for consistency
@@ -165,6 +199,7 @@ class SwingEngine:
             return 0.0
         return 0.0
 
+    @metrics.timed("engine_seconds")
     def calculate_tqs_multi_tf(self, df_15m, df_1h, df_1d):
         """
         Calculates TQS based on 3 Timeframes (0-10 Score).
@@ -189,23 +224,23 @@ class SwingEngine:
             # 2. RSI (2 pts): 1H RSI in Sweet Spot (55-70)
             rsi = row_1h.get('RSI', 50)
             rsi_score = 0
-            if 55 <= rsi <= 70: rsi_score = 2
-            elif 50 <= rsi <= 75: rsi_score = 1
+            if RULES['rsi_low'] <= rsi <= RULES['rsi_high']: rsi_score = 2
+            elif RULES['rsi_low'] - 5 <= rsi <= RULES['rsi_high'] + 5: rsi_score = 1
             score += rsi_score
             
             # 3. VOLUME (2 pts): 1H Volume > 20MA * 1.2 + Green Candle
             vol = row_1h.get('Volume', 0)
             vol_avg = row_1h.get('Vol_SMA', 99999999)
             vol_score = 1 # Default neutral
-            if vol > (vol_avg * 1.2) and row_1h['Close'] > row_1h['Open']:
+            if vol > (vol_avg * RULES['vol_mult']) and row_1h['Close'] > row_1h['Open']:
                 vol_score = 2
             score += vol_score
             
             # 4. STRUCTURE (2 pts): 1H CHOP < 50
             chop = row_1h.get('CHOP', 50)
             struct_score = 0
-            if chop < 50: struct_score = 2
-            elif chop < 55: struct_score = 1
+            if chop < RULES['chop_max']: struct_score = 2
+            elif chop < RULES['chop_max'] + 5: struct_score = 1
             score += struct_score
             
             # 5. MOMENTUM (2 pts): 1H MACD > Signal + Price > VWAP (Using EMA20 as VWAP proxy here to save fetch)
@@ -230,7 +265,7 @@ class SwingEngine:
         tag = "WAIT"
         rec_entry = 0.0
         
-        if tqs >= 8:
+        if tqs >= RULES['entry_tqs']:
             # STRONG
             # Check for "Gainer Forecast" (Volume Shock + Breakout)
             vol_shock = row['Volume'] > (row['Vol_SMA'] * 2.0)
@@ -329,6 +364,7 @@ class SwingEngine:
             print(f"Deep Dive Error: {e}")
             return None
 
+    @metrics.timed("engine_seconds")
     def check_exits(self, positions_df, data_map=None):
         """
         Check existing positions for Exit Signals.
@@ -390,10 +426,10 @@ class SwingEngine:
             signal = "HOLD"
             reason = ""
             
-            if rsi > 75:
+            if rsi > RULES['exit_rsi']:
                 signal = "EXIT WARNING"
                 reason = f"Overbought RSI ({round(rsi,1)})"
-            elif rev_tqs >= 7:
+            elif rev_tqs >= RULES['exit_rev_tqs']:
                  signal = "EXIT SIGNAL"
                  reason = f"Bearish Reversal (Score {rev_tqs})"
                  
@@ -402,12 +438,13 @@ class SwingEngine:
                     'Symbol': sym,
                     'Signal': signal,
                     'Reason': reason,
-                    'Price': df_1h['Close'].iloc[-1],
+                    'Price': float(round(float(df_1h['Close'].iloc[-1]), 2)),
                     'Time': str(df_1h.index[-1])
                 })
                 
         return exits
 
+    @metrics.timed("engine_seconds")
     def calculate_reverse_tqs(self, row, df_daily):
         """
         Calculates Reverse TQS (Weakness/Sell Score 0-10).
@@ -445,6 +482,7 @@ class SwingEngine:
         except: return 0
         return max(min(score, 10), 0)
 
+    @metrics.timed("engine_seconds")
     def fetch_data(self, limit_to_tickers=None):
         """
         Fetch Multi-Timeframe Data.
@@ -454,9 +492,7 @@ class SwingEngine:
         
         import market_data
         import os
-        try:
-             import streamlit as st
-        except: st = None
+        import data_context
         
         # Determine scope
         tickers = limit_to_tickers if limit_to_tickers else self.universe
@@ -475,7 +511,7 @@ class SwingEngine:
 
         # PARALLEL EXECUTION STRATEGY
         is_cloud = os.getenv("CI") or os.getenv("GITHUB_ACTIONS") or (
-            st is not None and hasattr(st, "secrets") and "ANGEL_API_KEY" in st.secrets
+            data_context.get_secret("ANGEL_API_KEY") is not None
         )
 
         if is_cloud:
@@ -505,6 +541,7 @@ class SwingEngine:
             return results
 
 
+    @metrics.timed("engine_seconds")
     def get_weekly_rankings(self, d_1d_dict):
         """
         Compute top weekly gainers from Daily Data Dict.
@@ -636,6 +673,7 @@ class SwingEngine:
         print(f"[INFO] Smart Filter: Reduced {len(self.universe)} -> {len(combined)} Candidates.")
         return combined
 
+    @metrics.timed("engine_seconds")
     def calculate_tqs_daily_only(self, df_1d):
         """
         Calculates a 'Light' TQS based on Daily Data Only.
@@ -651,8 +689,8 @@ class SwingEngine:
             
             # 2. RSI (3 pts): Bullish Zone
             rsi = row.get('RSI', 50)
-            if 50 <= rsi <= 70: score += 3
-            elif 40 <= rsi < 50: score += 1
+            if RULES['light_rsi_low'] <= rsi <= RULES['light_rsi_high']: score += 3
+            elif 40 <= rsi < RULES['light_rsi_low']: score += 1
             
             # 3. VOLUME (3 pts): High Volume
             vol = row.get('Volume', 0)
@@ -661,6 +699,7 @@ class SwingEngine:
         except: return 0
         return min(score, 10)
 
+    @metrics.timed("engine_seconds")
     def scan(self, progress_callback=None, data_map=None):
         """
         Main Scan Loop.
@@ -698,7 +737,7 @@ class SwingEngine:
         # --- PRE-CALCULATE WEEKLY RANKINGS ---
         weekly_map = self.get_weekly_rankings(d_1d)
         
-        results = []
+        scored = {}
         tickers = self.universe
         total_tickers = len(tickers)
         
@@ -707,97 +746,116 @@ class SwingEngine:
                 try: progress_callback(0.10 + (0.90 * (i + 1) / total_tickers))
                 except: pass
 
-            try:
-                # Direct Dict Lookup (O(1))
-                df_day = d_1d.get(ticker)
-                
-                # OPTIMIZATION: Check if we have 1D data first
-                if df_day is None: continue
-                if isinstance(df_day, pd.DataFrame) and df_day.empty: continue
-                if len(df_day) < 20: continue
-                
-                # Check for Granular Data
-                df_60 = d_1h.get(ticker)
-                df_15 = d_15m.get(ticker)
-                
-                # Calculate Daily Indicators (Always needed)
-                if 'EMA_200' not in df_day.columns: df_day = self.calculate_indicators(df_day)
-                
-                # Weekly Data
-                clean_ticker = ticker.replace(".NS", "")
-                w_data = weekly_map.get(clean_ticker, {'Rank': 999, 'Percent': 0.0, 'Category': ''})
-                
-                rev_tqs = 0
-                
-                # --- HYBRID TQS CALCULATION ---
-                if df_60 is not None and df_15 is not None and not df_60.empty:
-                    # FULL PRECISION TQS (For Portfolio/Watchlist)
-                    if 'EMA_50' not in df_60.columns: df_60 = self.calculate_indicators(df_60)
-                    if 'EMA_20' not in df_15.columns: df_15 = self.calculate_indicators(df_15)
-                    
-                    tqs = self.calculate_tqs_multi_tf(df_15, df_60, df_day)
-                    rev_tqs = self.calculate_reverse_tqs(df_60.iloc[-1], df_day)
-                    tag_suffix = ""
-                else:
-                    # LIGHT TQS (For Bulk Discovery)
-                    tqs = self.calculate_tqs_daily_only(df_day)
-                    tag_suffix = " (1D)"
-                
-                # Tag Logic
-                curr_price = df_day['Close'].iloc[-1]
+            # Direct Dict Lookup (O(1))
+            s = self.score_symbol(ticker, d_1d.get(ticker), d_1h.get(ticker), d_15m.get(ticker))
+            if s is not None: scored[ticker] = s
+        
+        return self.finalize_scan(scored, weekly_map)
+
+    @metrics.timed("engine_seconds")
+    def score_symbol(self, ticker, df_day, df_60=None, df_15=None):
+        """
+        Per-symbol part of scan(): indicators + TQS / RevTQS. Needs nothing from
+        other symbols, so it can run as soon as one symbol's data is complete.
+        Returns None if the symbol can't be scored.
+        """
+        try:
+            # OPTIMIZATION: Check if we have 1D data first
+            if df_day is None: return None
+            if isinstance(df_day, pd.DataFrame) and df_day.empty: return None
+            if len(df_day) < 20: return None
+            
+            # Calculate Daily Indicators (Always needed)
+            if 'EMA_200' not in df_day.columns: df_day = self.calculate_indicators(df_day)
+            
+            rev_tqs = 0
+            
+            # --- HYBRID TQS CALCULATION ---
+            if df_60 is not None and df_15 is not None and not df_60.empty:
+                # FULL PRECISION TQS (For Portfolio/Watchlist)
+                if 'EMA_50' not in df_60.columns: df_60 = self.calculate_indicators(df_60)
+                if 'EMA_20' not in df_15.columns: df_15 = self.calculate_indicators(df_15)
                 
-                tag = "WAIT"
+                tqs = self.calculate_tqs_multi_tf(df_15, df_60, df_day)
+                rev_tqs = self.calculate_reverse_tqs(df_60.iloc[-1], df_day)
+                tag_suffix = ""
+            else:
+                # LIGHT TQS (For Bulk Discovery)
+                tqs = self.calculate_tqs_daily_only(df_day)
+                tag_suffix = " (1D)"
+            return {'df_day': df_day, 'tqs': tqs, 'rev_tqs': rev_tqs, 'tag_suffix': tag_suffix}
+        except Exception as e:
+            # print(f"Scan Error {ticker}: {e}")
+            return None
+
+    def build_scan_result(self, ticker, scored, w_data):
+        """Tag + result row for one scored symbol (needs the weekly rank)."""
+        df_day, tqs, rev_tqs, tag_suffix = scored['df_day'], scored['tqs'], scored['rev_tqs'], scored['tag_suffix']
+        clean_ticker = ticker.replace(".NS", "")
+        try:
+            # Tag Logic
+            curr_price = df_day['Close'].iloc[-1]
+            
+            tag = "WAIT"
+            conf = "LOW"
+            
+            if w_data['Rank'] <= 10 and tqs >= 7:
+                tag = f"🔥 #{w_data['Rank']} W.GAINER ({w_data['Category']})"
+                conf = "EXTREME"
+            elif tqs >= RULES['entry_tqs']:
+                tag = "🚀 ROCKET"
+                conf = "HIGH"
+            elif w_data['Percent'] > 5 and tqs >= 6:
+                tag = "💪 STRONG"
+                conf = "HIGH"
+            elif rev_tqs >= RULES['exit_rev_tqs']:
+                tag = "⚠️ SELL SIGNAL"
                 conf = "LOW"
                 
-                if w_data['Rank'] <= 10 and tqs >= 7:
-                    tag = f"🔥 #{w_data['Rank']} W.GAINER ({w_data['Category']})"
-                    conf = "EXTREME"
-                elif tqs >= 8:
-                    tag = "🚀 ROCKET"
-                    conf = "HIGH"
-                elif w_data['Percent'] > 5 and tqs >= 6:
-                    tag = "💪 STRONG"
-                    conf = "HIGH"
-                elif rev_tqs >= 7:
-                    tag = "⚠️ SELL SIGNAL"
-                    conf = "LOW"
-                    
-                if tag != "WAIT": tag += tag_suffix
-
-                # Safe Extraction Helper
-                def get_val(series, default=0.0):
-                    try:
-                        val = series.iloc[-1]
-                        if isinstance(val, pd.Series): val = val.iloc[0]
-                        return float(val)
-                    except: return float(default)
-
-                # Result Object (Strict JSON Compatibility)
-                chop_val = 50.0
-                if 'CHOP' in df_day.columns:
-                    chop_val = get_val(df_day['CHOP'], 50.0)
-                    
-                rsi_val = get_val(df_day['RSI']) # Default to Daily RSI if 1H missing
-
-                results.append({
-                    'Symbol': str(clean_ticker),
-                    'Price': float(round(get_val(df_day['Close']), 2)),
-                    'Change': float(round(((get_val(df_day['Close']) - get_val(df_day['Open']))/get_val(df_day['Open']) )*100, 2)),
-                    'TQS': int(tqs),
-                    'RevTQS': int(rev_tqs),
-                    'Weekly %': float(round(w_data['Percent'], 2)),
-                    'Type': str(tag),
-                    'Confidence': str(conf),
-                    'RSI': float(round(rsi_val, 1)),
-                    'CHOP': float(round(chop_val, 1)),
-                    'Stop': float(round(get_val(df_day['EMA_20']), 2)), 
-                    'Entry': float(round(get_val(df_day['Close']), 2))
-                })
-                
-            except Exception as e:
-                # print(f"Scan Error {ticker}: {e}")
-                continue
+            if tag != "WAIT": tag += tag_suffix
+
+            # Safe Extraction Helper
+            def get_val(series, default=0.0):
+                try:
+                    val = series.iloc[-1]
+                    if isinstance(val, pd.Series): val = val.iloc[0]
+                    return float(val)
+                except: return float(default)
+
+            # Result Object (Strict JSON Compatibility)
+            chop_val = 50.0
+            if 'CHOP' in df_day.columns:
+                chop_val = get_val(df_day['CHOP'], 50.0)
                 
+            rsi_val = get_val(df_day['RSI']) # Default to Daily RSI if 1H missing
+
+            return {
+                'Symbol': str(clean_ticker),
+                'Price': float(round(get_val(df_day['Close']), 2)),
+                'Change': float(round(((get_val(df_day['Close']) - get_val(df_day['Open']))/get_val(df_day['Open']) )*100, 2)),
+                'TQS': int(tqs),
+                'RevTQS': int(rev_tqs),
+                'Weekly %': float(round(w_data['Percent'], 2)),
+                'Type': str(tag),
+                'Confidence': str(conf),
+                'RSI': float(round(rsi_val, 1)),
+                'CHOP': float(round(chop_val, 1)),
+                'Stop': float(round(get_val(df_day['EMA_20']), 2)), 
+                'Entry': float(round(get_val(df_day['Close']), 2))
+            }
+        except Exception as e:
+            # print(f"Scan Error {ticker}: {e}")
+            return None
+
+    @metrics.timed("engine_seconds")
+    def finalize_scan(self, scored, weekly_map):
+        """scored: {ticker: score_symbol(...)} -> sorted scan results (+ Discord alert)."""
+        results = []
+        for ticker, s in scored.items():
+            # Weekly Data
+            w_data = weekly_map.get(ticker.replace(".NS", ""), {'Rank': 999, 'Percent': 0.0, 'Category': ''})
+            row = self.build_scan_result(ticker, s, w_data)
+            if row is not None: results.append(row)
         
         # Sort by Ranking (Rocket/Weekly top)
         # Priority: TQS (High) -> Confidence -> Price (Low/Cheap)
@@ -811,6 +869,7 @@ class SwingEngine:
              
         return results
 
+    @metrics.timed("engine_seconds")
     def update_watchlist(self):
         """Phase 6: Watchlist 2.0 (ML Data Layer - Soft Delete)"""
         import sheets_db
@@ -889,13 +948,13 @@ class SwingEngine:
                     prev_status = rec.get('status', 'ACTIVE')
                     if ticker in open_positions:
                         rec['status'] = 'OPEN_POSITION'
-                    elif rev_tqs >= 7:
+                    elif rev_tqs >= RULES['exit_rev_tqs']:
                         rec['status'] = 'INACTIVE'
                         rec['exit_reason'] = 'REV_TQS_HIGH'
                     elif tqs < 6:
                         rec['status'] = 'INACTIVE'
                         rec['exit_reason'] = 'WEAKNESS'
-                    elif tqs >= 8 and prev_status == 'INACTIVE':
+                    elif tqs >= RULES['entry_tqs'] and prev_status == 'INACTIVE':
                         rec['status'] = 'ACTIVE' # Re-Activate
                         rec['entry_reason'] = 'REACTIVATED_STRONG'
                     
@@ -907,7 +966,7 @@ class SwingEngine:
                 else:
                     # --- NEW CANDIDATE COLLECTION ---
                     # Don't add yet, collect for sorting/limiting
-                    if tqs >= 8:
+                    if tqs >= RULES['entry_tqs']:
                         # Initial Priority
                         p_score = (int(tqs) * 0.5) + (int(tqs) * 0.3) - (0 * 0.1)
                         
@@ -991,3 +1050,65 @@ class SwingEngine:
         print(f"   > Watchlist Updated. Total: {len(final_list)} (Active: {len(all_active)})")
         sheets_db.save_watchlist(final_list)
         return final_list
+
+# --- VECTORIZED RULES ---
+# The scoring / exit rules above, evaluated for every bar at once (historical
+# replay, see backtester.py). `b` maps column -> array (a calculate_indicators()
+# DataFrame, or [bars x symbols] arrays); bar i gets the score the method returns
+# when that bar is iloc[-1]. NaN compares False, exactly as in the methods.
+# `rules` overrides RULES (see rules_with) without touching the live engine.
+CLASSIFY_TAGS = ["WAIT", "WATCH", "PULLBACK WATCH", "SWING BUILD", "MOMENTUM SWING", "RANGE BREAK", "ROCKET LAUNCH 🚀"]
+EXIT_SIGNALS = ["HOLD", "EXIT WARNING", "EXIT SIGNAL"] # check_exits() signal per code
+
+def _col(b, name):
+    return np.asarray(b[name], dtype=float)
+
+def tqs_daily_only_bars(b, rules=None):
+    """SwingEngine.calculate_tqs_daily_only() for every bar."""
+    r = rules_with(rules)
+    close, rsi = _col(b, 'Close'), _col(b, 'RSI')
+    score = np.where(close > _col(b, 'EMA_20'), 4, np.where(close > _col(b, 'EMA_50'), 2, 0))
+    score += np.where((rsi >= r['light_rsi_low']) & (rsi <= r['light_rsi_high']), 3,
+                      np.where((rsi >= 40) & (rsi < r['light_rsi_low']), 1, 0))
+    score += np.where(_col(b, 'Volume') > _col(b, 'Vol_SMA'), 3, 0)
+    return np.minimum(score, 10).astype(np.int8)
+
+def tqs_multi_tf_bars(m15, h1, d1, rules=None):
+    """SwingEngine.calculate_tqs_multi_tf() for bars already aligned row by row across the three timeframes."""
+    r = rules_with(rules)
+    c15, ch, cd = _col(m15, 'Close'), _col(h1, 'Close'), _col(d1, 'Close')
+    rsi, chop = _col(h1, 'RSI'), _col(h1, 'CHOP')
+    score = np.where((c15 > _col(m15, 'EMA_20')) & (ch > _col(h1, 'EMA_20')) & (cd > _col(d1, 'EMA_20')), 2, 0)
+    score += np.where((rsi >= r['rsi_low']) & (rsi <= r['rsi_high']), 2,
+                      np.where((rsi >= r['rsi_low'] - 5) & (rsi <= r['rsi_high'] + 5), 1, 0))
+    score += np.where((_col(h1, 'Volume') > _col(h1, 'Vol_SMA') * r['vol_mult']) & (ch > _col(h1, 'Open')), 2, 1)
+    score += np.where(chop < r['chop_max'], 2, np.where(chop < r['chop_max'] + 5, 1, 0))
+    score += np.where((ch > _col(h1, 'EMA_20')) & (_col(h1, 'MACD') > _col(h1, 'Signal')), 2, 1)
+    return np.clip(score, 0, 10).astype(np.int8)
+
+def reverse_tqs_bars(row, d_row):
+    """SwingEngine.calculate_reverse_tqs() with `row` / `d_row` the aligned bar and daily bar."""
+    close, opn, rsi = _col(row, 'Close'), _col(row, 'Open'), _col(row, 'RSI')
+    score = np.where(close < _col(row, 'EMA_20'), 2, 0)
+    score += np.where(_col(d_row, 'Close') < _col(d_row, 'EMA_20'), 1, 0)
+    score += np.where(rsi < 40, 2, np.where(rsi < 50, 1, 0))
+    score += np.where(_col(row, 'MACD') < _col(row, 'Signal'), 1, 0)
+    score += np.where((close < opn) & (_col(row, 'Volume') > _col(row, 'Vol_SMA')), 2, 0)
+    score += np.where(close < opn, 2, 0)
+    return np.clip(score, 0, 10).astype(np.int8)
+
+def exit_signal_bars(b, rules=None):
+    """check_exits() per bar as an EXIT_SIGNALS code (0 = HOLD). Like the method, the bar is also the 'daily' row."""
+    r = rules_with(rules)
+    rev_tqs = reverse_tqs_bars(b, b)
+    return np.where(_col(b, 'RSI') > r['exit_rsi'], 1, np.where(rev_tqs >= r['exit_rev_tqs'], 2, 0)).astype(np.int8)
+
+def classify_bars(b, tqs, rules=None):
+    """SwingEngine.classify_trade() tag per bar, as a CLASSIFY_TAGS index."""
+    r = rules_with(rules)
+    close, high_20, ema20 = _col(b, 'Close'), _col(b, 'High_20'), _col(b, 'EMA_20')
+    breakout = close > high_20
+    strong = np.select([breakout & (_col(b, 'Volume') > _col(b, 'Vol_SMA') * 2.0), breakout, _col(b, 'RSI') > 60],
+                       [6, 5, 4], 3)
+    mid = np.where((close < ema20) & (close > _col(b, 'EMA_50')), 2, 1)
+    return np.where(tqs >= r['entry_tqs'], strong, np.where(tqs >= 5, mid, 0)).astype(np.int8)
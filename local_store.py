@@ -0,0 +1,281 @@
+import sqlite3
+import threading
+import json
+import os
+import numpy as np
+import pandas as pd
+
+# --- CONFIG ---
+STORE_FILE = "db.sqlite"
+LEGACY_JSON_FILE = "db.json"
+
+# db.json key -> SQLite table
+TABLES = {
+    "portfolio": "portfolio",
+    "history": "history",
+    "watchlist": "watchlist",
+    "scan_results": "scans",
+}
+
+_local = threading.local()
+_migrate_lock = threading.Lock()
+_migrated_paths = set()
+
+# Read-through cache: (store path, collection) -> (store version, rows)
+_read_cache = {}
+_read_cache_lock = threading.Lock()
+
+class SafeJSONEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, pd.Series):
+            try: return float(obj.iloc[-1]) # Try to get scalar
+            except: return str(obj) # Fallback to string repr
+        if isinstance(obj, np.integer):
+            return int(obj)
+        if isinstance(obj, np.floating):
+            return float(obj)
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return super().default(obj)
+
+# --- CONNECTION ---
+def _init_schema(conn):
+    with conn:
+        for table in TABLES.values():
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    symbol TEXT,
+                    status TEXT,
+                    data TEXT NOT NULL
+                )""")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_symbol ON {table}(symbol)")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_status ON {table}(status)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+def get_conn():
+    """
+    One connection per thread (Streamlit reruns + fetch pool share the store).
+    WAL lets the background job write while the UI keeps reading.
+    """
+    path = os.path.abspath(STORE_FILE)
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _init_schema(conn)
+        conns[path] = conn
+        _auto_migrate(conn, path)
+    return conn
+
+def close():
+    """Closes this thread's connections (tests / store path changes)."""
+    for conn in getattr(_local, "conns", {}).values():
+        try: conn.close()
+        except: pass
+    _local.conns = {}
+    clear_read_cache()
+
+# --- ROW HELPERS ---
+def _clean_symbol(symbol):
+    return str(symbol or "").replace(".NS", "").upper()
+
+def _row_keys(row):
+    """Indexed columns: Symbol + Status (portfolio) / status (watchlist)."""
+    status = row.get("Status", row.get("status"))
+    return _clean_symbol(row.get("Symbol")), (str(status) if status is not None else None)
+
+def _dump(row):
+    return json.dumps(row, cls=SafeJSONEncoder)
+
+def _insert_rows(conn, table, rows):
+    conn.executemany(
+        f"INSERT INTO {table} (symbol, status, data) VALUES (?, ?, ?)",
+        [(*_row_keys(r), _dump(r)) for r in rows]
+    )
+
+def _set_meta(conn, key, value):
+    conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def _touch(conn):
+    # Every write bumps the store version inside its own transaction,
+    # which is what invalidates the read cache (in this and other processes).
+    _set_meta(conn, "initialized", "1")
+    conn.execute("""
+        INSERT INTO meta (key, value) VALUES ('version', '1')
+        ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1""")
+
+# --- READS ---
+def store_version():
+    """Monotonic write counter. Cheap (single PK lookup, no row decoding)."""
+    return int(get_meta("version", 0))
+
+def read_table(name):
+    """
+    Returns all rows of a collection (insertion order) as a list of dicts.
+    Served from memory while the store version is unchanged. Callers get
+    fresh dict copies, so mutating the result never touches the cache.
+    """
+    key = (os.path.abspath(STORE_FILE), name)
+    version = store_version()
+
+    with _read_cache_lock:
+        hit = _read_cache.get(key)
+    if hit is not None and hit[0] == version:
+        rows = hit[1]
+    else:
+        cur = get_conn().execute(f"SELECT data FROM {TABLES[name]} ORDER BY id")
+        rows = tuple(json.loads(d) for (d,) in cur)
+        with _read_cache_lock:
+            _read_cache[key] = (version, rows)
+
+    # Rows are flat sheet records, so a per-row copy is enough.
+    return [dict(r) for r in rows]
+
+def clear_read_cache():
+    with _read_cache_lock:
+        _read_cache.clear()
+
+def find_rows(name, symbol=None, status=None):
+    """Indexed lookup by Symbol and/or status. Returns [(row_id, dict)]."""
+    table = TABLES[name]
+    sql = f"SELECT id, data FROM {table} WHERE 1=1"
+    params = []
+    if symbol is not None:
+        sql += " AND symbol = ?"
+        params.append(_clean_symbol(symbol))
+    if status is not None:
+        sql += " AND status = ?"
+        params.append(status)
+    cur = get_conn().execute(sql + " ORDER BY id", params)
+    return [(rid, json.loads(d)) for rid, d in cur]
+
+def get_meta(key, default=None):
+    row = get_conn().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+def has_data():
+    """True once anything was written (mirrors the old 'db.json exists' check)."""
+    return get_meta("initialized") == "1"
+
+def load_all():
+    """Full snapshot in the legacy db.json shape ({} if the store is empty)."""
+    if not has_data(): return {}
+    db = {key: read_table(key) for key in TABLES}
+    last_synced = get_meta("last_synced")
+    if last_synced is not None:
+        db["last_synced"] = last_synced
+    return db
+
+# --- WRITES (each call is one transaction) ---
+def replace_table(name, rows, last_synced=None):
+    conn = get_conn()
+    table = TABLES[name]
+    with conn:
+        conn.execute(f"DELETE FROM {table}")
+        _insert_rows(conn, table, rows or [])
+        if last_synced is not None:
+            _set_meta(conn, "last_synced", str(last_synced))
+        _touch(conn)
+
+def append_row(name, row):
+    conn = get_conn()
+    with conn:
+        _insert_rows(conn, TABLES[name], [row])
+        _touch(conn)
+
+def update_row(name, row_id, row):
+    conn = get_conn()
+    with conn:
+        conn.execute(
+            f"UPDATE {TABLES[name]} SET symbol = ?, status = ?, data = ? WHERE id = ?",
+            (*_row_keys(row), _dump(row), row_id)
+        )
+        _touch(conn)
+
+def delete_by_symbol(name, symbol):
+    """Deletes every row matching the clean symbol. Returns rows removed."""
+    conn = get_conn()
+    with conn:
+        cur = conn.execute(f"DELETE FROM {TABLES[name]} WHERE symbol = ?", (_clean_symbol(symbol),))
+        _touch(conn)
+    return cur.rowcount
+
+def save_all(db, append=(), meta=None):
+    """
+    Writes every collection present in `db` in one transaction.
+    Collections named in `append` are appended to instead of replaced;
+    `meta` key/values are committed alongside.
+    """
+    conn = get_conn()
+    with conn:
+        for key, table in TABLES.items():
+            if key in db:
+                if key not in append:
+                    conn.execute(f"DELETE FROM {table}")
+                _insert_rows(conn, table, db.get(key) or [])
+        if db.get("last_synced") is not None:
+            _set_meta(conn, "last_synced", str(db["last_synced"]))
+        for key, value in (meta or {}).items():
+            _set_meta(conn, key, value)
+        _touch(conn)
+
+def set_meta(key, value):
+    """Bookkeeping value (does not bump the store version)."""
+    conn = get_conn()
+    with conn:
+        _set_meta(conn, key, value)
+
+# --- MIGRATION ---
+def migrate_from_json(json_path=None, force=False):
+    """
+    One-shot import of the legacy db.json into the store.
+    Skipped if already migrated (unless force=True). Returns rows imported.
+    """
+    json_path = json_path or LEGACY_JSON_FILE
+    if not os.path.exists(json_path): return 0
+    if not force and get_meta("migrated_from_json"): return 0
+
+    try:
+        with open(json_path, "r") as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"db.json Migration Skipped (Unreadable): {e}")
+        return 0
+    if not isinstance(data, dict): return 0
+
+    conn = get_conn()
+    save_all(data)
+    with conn:
+        _set_meta(conn, "migrated_from_json", os.path.abspath(json_path))
+
+    count = sum(len(data.get(k) or []) for k in TABLES)
+    print(f"✅ Migrated {count} rows from {json_path} -> {STORE_FILE}")
+    return count
+
+def _auto_migrate(conn, path):
+    # Runs once per store path per process, on first connection.
+    with _migrate_lock:
+        if path in _migrated_paths: return
+        _migrated_paths.add(path)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'migrated_from_json'").fetchone()
+    if row is None and os.path.exists(LEGACY_JSON_FILE):
+        migrate_from_json()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--migrate", action="store_true", help="Import db.json into the SQLite store")
+    parser.add_argument("--force", action="store_true", help="Re-import even if already migrated")
+    args = parser.parse_args()
+
+    if args.migrate:
+        n = migrate_from_json(force=args.force)
+        print(f"Imported {n} rows.")
+    for key in TABLES:
+        print(f"{key}: {len(read_table(key))} rows")
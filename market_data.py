@@ -1,15 +1,298 @@
 import os
+import io
+import glob
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 import pandas as pd
 import datetime
-try:
-    import streamlit as st
-except ImportError:
-    st = None
+import data_context
+import metrics
 
 # --- CONFIG ---
 CACHE_DIR = os.path.join("cache", "raw")
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+CHECKSUM_SUFFIX = ".sha1" # Sidecar next to every raw cache file: {sha1, size, rows}
+TMP_MAX_AGE = 3600 # Leftover *.tmp / *.lock files (killed writer) older than this are removed
+
+# Storage schema: float32 prices, int64 volume, zstd, bounded history per interval.
+# Windows cover what scoring reads (1d: 1y + EMA_200 warm-up, 1h: 1mo, 15m: 5d).
+PRICE_COLS = ["Open", "High", "Low", "Close"]
+RETENTION_DAYS = {"15m": 30, "1h": 90, "1d": 730}
+PARQUET_OPTIONS = {"compression": "zstd"}
+
+# Memory cache: byte budget (DataFrame bytes) and per-interval freshness.
+MEM_CACHE_BYTES = int(float(os.getenv("MARKET_CACHE_MB", "256")) * 1024 * 1024)
+MEM_CACHE_TTL = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 3600} # Daily capped: live candle moves intraday
+MEM_CACHE_TTL_DEFAULT = 900
+
+# --- MEMORY CACHE ---
+class FrameCache:
+    """
+    LRU of DataFrames bounded by total memory_usage() bytes, with a TTL per
+    entry. One instance per process, shared by the fetch threads and all
+    app sessions (the candles are the same for everyone).
+    """
+    def __init__(self, max_bytes=MEM_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._data = OrderedDict() # key -> (df, nbytes, expires_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @staticmethod
+    def _nbytes(df):
+        try: return int(df.memory_usage(index=True, deep=True).sum())
+        except: return 0
+
+    def _drop(self, key):
+        _, nbytes, _ = self._data.pop(key)
+        self._bytes -= nbytes
+
+    def get(self, key, count=True):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += count
+                return None
+            if entry[2] <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += count
+                return None
+            self._data.move_to_end(key)
+            self.hits += count
+            return entry[0]
+
+    def put(self, key, df, ttl):
+        nbytes = self._nbytes(df)
+        with self._lock:
+            if key in self._data: self._drop(key)
+            if nbytes > self.max_bytes: return # Larger than the whole budget: don't cache
+            self._data[key] = (df, nbytes, time.monotonic() + ttl)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits / lookups * 100) if lookups else 0.0,
+            }
+
+_mem_cache = FrameCache()
+
+# --- IN-FLIGHT FETCHES ---
+# Single-flight: concurrent callers for the same (symbol, interval) wait on
+# one fetch and share its result. Cache-file reads/writes are serialized per path.
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+_file_locks = {}
+_coalesced = 0
+
+def _single_flight(key, fn):
+    global _coalesced
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader: call = _inflight[key] = _Call()
+        else: _coalesced += 1
+    if not leader:
+        call.done.wait()
+        if call.error is not None: raise call.error
+        return call.result
+    try:
+        call.result = fn()
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock: _inflight.pop(key, None)
+        call.done.set()
+
+def _file_lock(path):
+    with _inflight_lock:
+        return _file_locks.setdefault(path, threading.Lock())
+
+# --- STORAGE SCHEMA ---
+def to_storage(df, interval=None):
+    """Compact copy of an OHLCV frame: float32 OHLC, int64 Volume, trimmed to RETENTION_DAYS."""
+    if df is None or df.empty: return df
+    df = df.copy()
+    days = RETENTION_DAYS.get(interval)
+    if days and isinstance(df.index, pd.DatetimeIndex):
+        df = df[df.index >= df.index.max() - pd.Timedelta(days=days)]
+    for c in PRICE_COLS:
+        if c in df.columns: df[c] = pd.to_numeric(df[c], errors="coerce").astype("float32")
+    if "Volume" in df.columns:
+        df["Volume"] = pd.to_numeric(df["Volume"], errors="coerce").fillna(0).round().astype("int64")
+    return df
+
+def from_storage(df):
+    """Stored frame with float32 columns widened back to float64 for analysis (float32 leaks noise into results and isn't JSON serializable)."""
+    if df is None or df.empty: return df
+    cols = [c for c in df.columns if df[c].dtype == "float32"]
+    return df.astype({c: "float64" for c in cols}) if cols else df
+
+# --- RAW CACHE FILES ---
+# Writes go to a temp file that is fsync'ed and renamed over the target, so a
+# killed job leaves either the old file or the new one, never a truncated one.
+# Each file's checksum sits in a sidecar (<file>.sha1) replaced right after it
+# under that file's lock; reads verify it and treat a mismatch as corruption.
+# (Caches written with the older single _manifest.json get sidecars on first read.)
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    except OSError:
+        return # Windows: directories can't be opened
+    try: os.fsync(fd)
+    except OSError: pass
+    finally: os.close(fd)
+
+def _write_bytes_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+
+class _LockFile:
+    """Cross-process lock (O_EXCL lock file)."""
+    def __init__(self, path, timeout=10):
+        self.path = path
+        self.timeout = timeout
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    # Holder died (killed job): take the lock over.
+                    try: os.remove(self.path)
+                    except OSError: pass
+                    deadline = time.monotonic() + self.timeout
+                time.sleep(0.01)
+
+    def __exit__(self, *exc):
+        try: os.remove(self.path)
+        except OSError: pass
+
+def _checksum_path(path):
+    return path + CHECKSUM_SUFFIX
+
+def read_checksum(path):
+    """{sha1, size, rows} recorded for a raw cache file, or None."""
+    try:
+        with open(_checksum_path(path), "r") as f: return json.load(f)
+    except: return None
+
+def _encode(df):
+    buf = io.BytesIO()
+    df.to_parquet(buf, **PARQUET_OPTIONS)
+    data = buf.getvalue()
+    return data, {"sha1": hashlib.sha1(data).hexdigest(), "size": len(data), "rows": len(df)}
+
+def write_cache_file(path, df):
+    """Atomically writes df to a raw cache file, then its checksum sidecar (both under the file's lock)."""
+    data, entry = _encode(df)
+    with _file_lock(path), _LockFile(path + ".lock"):
+        _write_bytes_atomic(path, data)
+        _write_bytes_atomic(_checksum_path(path), json.dumps(entry).encode())
+
+def write_cache_files(frames):
+    """write_cache_file for many files ({path: df}), for bulk loads (seeding, synthetic universes)."""
+    for path, df in frames.items(): write_cache_file(path, df)
+    return len(frames)
+
+def read_cache_file(path):
+    """
+    Reads a raw cache file, verifying it against its sidecar. A file with no
+    sidecar (written before checksums) gets one. A checksum mismatch is
+    corruption and raises like an unreadable file; incremental_fetch then
+    discards the file and refetches.
+    """
+    with open(path, "rb") as f: data = f.read()
+    entry = read_checksum(path)
+    if entry is not None and entry.get("sha1") == hashlib.sha1(data).hexdigest():
+        return pd.read_parquet(io.BytesIO(data))
+
+    # Settle it under the file's lock: a writer may be between the file and its sidecar
+    with _file_lock(path), _LockFile(path + ".lock"):
+        with open(path, "rb") as f: data = f.read()
+        entry = read_checksum(path)
+        digest = hashlib.sha1(data).hexdigest()
+        if entry is not None and entry.get("sha1") != digest:
+            raise ValueError(f"Cache checksum mismatch for {os.path.basename(path)} (corrupt file)")
+        df = pd.read_parquet(io.BytesIO(data))
+        if entry is None:
+            _write_bytes_atomic(_checksum_path(path), json.dumps({"sha1": digest, "size": len(data), "rows": len(df)}).encode())
+    return df
+
+def load_cached(symbol, interval):
+    """Raw cache file as stored, without touching the API (empty frame if missing/unreadable)."""
+    path = get_cache_path(symbol, interval)
+    if not os.path.exists(path): return pd.DataFrame()
+    try: return read_cache_file(path)
+    except Exception as e:
+        print(f"Cache Read Error {symbol}: {e}")
+        return pd.DataFrame()
+
+def remove_cache_file(path):
+    for p in (path, _checksum_path(path)):
+        try: os.remove(p)
+        except OSError: pass
+
+def clean_stale_tmp(max_age=TMP_MAX_AGE):
+    """Removes temp and lock files left behind by killed writers. Returns how many."""
+    removed = 0
+    cutoff = time.time() - max_age
+    for tmp in glob.glob(os.path.join(CACHE_DIR, "*.tmp")) + glob.glob(os.path.join(CACHE_DIR, "*.lock")):
+        try:
+            if os.path.getmtime(tmp) < cutoff:
+                os.remove(tmp)
+                removed += 1
+        except OSError: pass
+    return removed
+
+def get_cache_stats():
+    """Hit/miss/eviction counters and current size of the memory cache."""
+    stats = _mem_cache.stats()
+    stats["coalesced"] = _coalesced
+    return stats
+
+def _angel_mgr():
+    """One AngelDataManager per context (app session or headless process)."""
+    def create():
+        from angel_data import AngelDataManager
+        return AngelDataManager()
+    return data_context.get_context().get_or_create("angel_mgr", create)
+
 def get_cache_path(symbol, interval):
     clean_sym = symbol.replace(".NS", "").replace("^", "")
     return os.path.join(CACHE_DIR, f"{clean_sym}_{interval}.parquet")
@@ -21,33 +304,39 @@ def incremental_fetch(symbol, interval="1d", period="1y"):
     2. Downloads only NEW data from Yahoo.
     3. Merges and updates cache.
     4. Returns DataFrame.
+    Concurrent calls for the same (symbol, interval) share one fetch.
     """
     
-    # 0. Memory Cache (Session State or Global)
+    # 0. Memory Cache (process-wide LRU, see FrameCache)
     mem_key = f"market_{symbol}_{interval}"
-    
-    # Global fallback for Bot
-    global _MEM_CACHE
-    if '_MEM_CACHE' not in globals(): _MEM_CACHE = {}
-
-    if st is not None and hasattr(st, 'session_state'):
-        if 'market_cache' not in st.session_state:
-            st.session_state.market_cache = {}
-        cache_store = st.session_state.market_cache
-    else:
-        cache_store = _MEM_CACHE
-        
-    if mem_key in cache_store:
-        return cache_store[mem_key]
+    cached = _mem_cache.get(mem_key)
+    if cached is not None:
+        metrics.inc("market_data_cache_total", layer="memory", result="hit", interval=interval)
+        return cached
+    metrics.inc("market_data_cache_total", layer="memory", result="miss", interval=interval)
+
+    def fetch():
+        # A fetch that finished while we were queueing up already cached it.
+        cached = _mem_cache.get(mem_key, count=False)
+        if cached is not None: return cached
+        with metrics.timed("market_data_fetch_seconds", interval=interval):
+            final_df = _fetch_and_merge(symbol, interval, period)
+        _mem_cache.put(mem_key, final_df, MEM_CACHE_TTL.get(interval, MEM_CACHE_TTL_DEFAULT))
+        return final_df
+
+    return _single_flight((symbol, interval), fetch)
 
+def _fetch_and_merge(symbol, interval, period):
+    """Parquet cache + Angel One delta -> merged frame (written back to the cache)."""
     path = get_cache_path(symbol, interval)
     existing_df = pd.DataFrame()
     start_date = None
     
     # 1. Load Parquet
+    metrics.inc("market_data_cache_total", layer="disk", result="hit" if os.path.exists(path) else "miss", interval=interval)
     if os.path.exists(path):
         try:
-            existing_df = pd.read_parquet(path)
+            existing_df = read_cache_file(path)
             if not existing_df.empty:
                 last_dt = existing_df.index[-1]
                 # If timezone aware, convert to naive for comparison or keep aware?
@@ -60,30 +349,14 @@ def incremental_fetch(symbol, interval="1d", period="1y"):
                 # For now, we trust the incremental fetch to be fast (empty response if up to date).
         except Exception as e:
             print(f"Cache Read Error {symbol}: {e}")
-            # FIX: Corrupt file? Delete it to self-heal.
-            try: os.remove(path)
-            except: pass
+            # Unreadable or failed its checksum despite atomic writes (disk damage / foreign file): self-heal.
+            remove_cache_file(path)
             existing_df = pd.DataFrame()
 
 # 2. Fetch from Angel One (Primary)
     try:
-        # Initialize Angel Manager only once
-        mgr = None
-        
-        # Streamlit Context
-        if st is not None and hasattr(st, 'session_state'):
-            if 'angel_mgr' not in st.session_state:
-                 from angel_data import AngelDataManager
-                 st.session_state.angel_mgr = AngelDataManager()
-            mgr = st.session_state.angel_mgr
-        else:
-            # Headless / Bot Context (Global Fallback)
-            # We use a simple global singleton pattern here if needed, 
-            # or just instantiate for now (Bot runs once so it is fine)
-            from angel_data import AngelDataManager
-            # In a real bot, we might want to keep this instance alive across loop iterations.
-            # For now, let's instantiate.
-            mgr = AngelDataManager()
+        # Initialize Angel Manager only once (reused across calls and loop iterations)
+        mgr = _angel_mgr()
 
         # Calculate days needed
         days_to_fetch = 365 # Default period="1y" -> ~365 days
@@ -116,7 +389,8 @@ def incremental_fetch(symbol, interval="1d", period="1y"):
              print(f"⚠️ Gap {days_to_fetch} days too large for 1h. Capping to 90.")
              days_to_fetch = 90
 
-        new_data = mgr.fetch_hist_data(symbol, interval=angel_interval, days=days_to_fetch)
+        with metrics.timed("market_data_api_seconds", interval=interval):
+            new_data = mgr.fetch_hist_data(symbol, interval=angel_interval, days=days_to_fetch)
         
     except Exception as e:
         print(f"Angel Download Error {symbol}: {e}")
@@ -145,19 +419,18 @@ def incremental_fetch(symbol, interval="1d", period="1y"):
             final_df = pd.concat([existing_df, new_data])
             final_df = final_df[~final_df.index.duplicated(keep='last')]
         
+        final_df = to_storage(final_df, interval)
+
         # Save to Parquet
         try:
-            final_df.to_parquet(path)
+            write_cache_file(path, final_df)
         except Exception as e:
             print(f"Cache Write Error {symbol}: {e}")
             
     else:
         final_df = existing_df
 
-    # 4. Update Memory Cache
-    cache_store[mem_key] = final_df
-    
-    return final_df
+    return from_storage(final_df) # float32 stays on disk; callers get float64 prices
 
 def get_bulk_snapshot(symbols):
     """
@@ -167,12 +440,8 @@ def get_bulk_snapshot(symbols):
     
     # 1. Angel One
     try:
-        if st is not None and hasattr(st, 'session_state') and 'angel_mgr' in st.session_state:
-            mgr = st.session_state.angel_mgr
-        else:
-            from angel_data import AngelDataManager
-            mgr = AngelDataManager()
-            
+        mgr = _angel_mgr()
+
         # Chunking to prevent API Overload / Timeout
         all_dfs = []
         chunk_size = 50
@@ -195,6 +464,5 @@ def get_bulk_snapshot(symbols):
 
 def clear_cache():
     """Utils to clear cache if things break"""
-    if 'market_cache' in st.session_state:
-        st.session_state.market_cache = {}
+    _mem_cache.clear()
     # Could also delete files, but risky.
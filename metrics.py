@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+
+# Lightweight in-process instrumentation: counters, gauges and latency
+# histograms keyed by name + labels. Recording is a perf_counter() and a short
+# lock, so it is cheap enough for per-symbol hot paths. run_engine_job exports
+# one JSON + one Prometheus text file per run; the app's debug panel reads them.
+#
+#   @metrics.timed("engine_seconds")                  decorator (label fn=<function name>)
+#   with metrics.timed("job_stage_seconds", stage="aggregate"): ...
+#   metrics.inc("market_data_cache_total", layer="memory", result="hit")
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120) # Seconds (+Inf implied)
+EXPORT_DIR = "cache"
+EXPORT_NAME = "engine_metrics" # -> engine_metrics.json / engine_metrics.prom
+
+_lock = threading.Lock()
+_counters = {} # (name, labels) -> value
+_gauges = {}
+_hists = {}
+
+def _round(v):
+    return round(v, 6) if v is not None else None
+
+def _key(name, labels):
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+# --- RECORDING ---
+class Histogram:
+    """Bucket counts + sum / count / max of observed values."""
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max: self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (max if it is in +Inf)."""
+        if not self.count: return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank: return min(bound, self.max)
+        return self.max
+
+def inc(name, n=1, **labels):
+    key = _key(name, labels)
+    with _lock: _counters[key] = _counters.get(key, 0) + n
+
+def gauge(name, value, **labels):
+    with _lock: _gauges[_key(name, labels)] = value
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        hist = _hists.get(key)
+        if hist is None: hist = _hists[key] = Histogram()
+        hist.observe(value)
+
+class timed:
+    """
+    Times a block or every call of a function into histogram `name`.
+    As a decorator it adds fn=<function name> unless labels are given.
+    A block / call that raises also bumps counter `<name>_errors_total`.
+    """
+    def __init__(self, name, **labels):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.elapsed = time.perf_counter() - self._start
+        observe(self.name, self.elapsed, **self.labels)
+        if exc_type is not None: inc(self.name + "_errors_total", **self.labels)
+
+    def __call__(self, fn):
+        name, labels = self.name, self.labels or {"fn": fn.__name__}
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                inc(name + "_errors_total", **labels)
+                raise
+            finally:
+                observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _hists.clear()
+
+# --- EXPORT ---
+def snapshot(**meta):
+    """Plain dict of everything recorded so far (plus `meta`, e.g. the job mode)."""
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())]
+        gauges = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_gauges.items())]
+        hists = [{"name": n, "labels": dict(l), "count": h.count, "sum": round(h.sum, 6),
+                  "mean": round(h.sum / h.count, 6) if h.count else None, "max": round(h.max, 6),
+                  "p50": _round(h.quantile(0.5)), "p95": _round(h.quantile(0.95)),
+                  "buckets": dict(zip([str(b) for b in h.buckets] + ["+Inf"], h.counts))}
+                 for (n, l), h in sorted(_hists.items())]
+    return {"created": time.strftime("%Y-%m-%d %H:%M:%S"), **meta,
+            "counters": counters, "gauges": gauges, "histograms": hists}
+
+def _labels(labels, **more):
+    items = {**labels, **more}
+    if not items: return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items.items()) + "}"
+
+def to_prometheus(snap=None):
+    """Prometheus text exposition format (for a node_exporter textfile collector or a push)."""
+    snap = snap or snapshot()
+    lines, typed = [], set()
+    def header(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+    for c in snap["counters"]:
+        header(c["name"], "counter")
+        lines.append(f"{c['name']}{_labels(c['labels'])} {c['value']}")
+    for g in snap["gauges"]:
+        header(g["name"], "gauge")
+        lines.append(f"{g['name']}{_labels(g['labels'])} {g['value']}")
+    for h in snap["histograms"]:
+        header(h["name"], "histogram")
+        cumulative = 0
+        for le, n in h["buckets"].items():
+            cumulative += n
+            lines.append(f"{h['name']}_bucket{_labels(h['labels'], le=le)} {cumulative}")
+        lines.append(f"{h['name']}_sum{_labels(h['labels'])} {h['sum']}")
+        lines.append(f"{h['name']}_count{_labels(h['labels'])} {h['count']}")
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path, text):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f: f.write(text)
+    os.replace(tmp, path)
+
+def export(directory=None, name=EXPORT_NAME, **meta):
+    """Writes <name>.json and <name>.prom (replacing the previous run's). Returns the JSON path."""
+    directory = directory or EXPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    snap = snapshot(**meta)
+    path = os.path.join(directory, name + ".json")
+    _write_atomic(path, json.dumps(snap, indent=1, default=str))
+    _write_atomic(os.path.join(directory, name + ".prom"), to_prometheus(snap))
+    return path
+
+def timing_rows(snap):
+    """Histograms as table rows, slowest total first (for the debug panel)."""
+    rows = []
+    for h in (snap or {}).get("histograms", []):
+        ms = lambda v: round(v * 1000, 1) if v is not None else None
+        rows.append({"metric": h["name"], "labels": ", ".join(f"{k}={v}" for k, v in h["labels"].items()),
+                     "calls": h["count"], "total_s": round(h["sum"], 2), "mean_ms": ms(h["mean"]),
+                     "p95_ms": ms(h["p95"]), "max_ms": ms(h["max"])})
+    return sorted(rows, key=lambda r: r["total_s"], reverse=True)
@@ -0,0 +1,86 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+# Multi-timeframe alignment index. For every 15m bar of a symbol it holds the row
+# (within that symbol's snapshot frame) of the latest *completed* 1h and 1d bar, so
+# a historical multi-TF score is three row lookups instead of three searches.
+#   A bar is complete at its end: start + its length, capped at the session close
+#   (daily bars, labelled 00:00, end at that day's close). The 15m bar 10:00-10:15
+#   therefore sees the 1h bar 09:15-10:15 and the previous day's daily bar; the last
+#   15m bar of the day (ending 15:30) sees that day's daily bar.
+# aggregate_and_swap writes it next to the snapshot as ui_align.parquet:
+#   index (Symbol, Datetime) of the 15m bars; columns 1h, 1d = row, -1 = none yet.
+# Rows count bars after dropping duplicate timestamps (keep last), as the backtester does.
+
+TZ = "Asia/Kolkata"
+SESSION_CLOSE = pd.Timedelta(hours=15, minutes=30)
+BAR_LENGTH = {"15m": pd.Timedelta(minutes=15), "1h": pd.Timedelta(hours=1), "1d": None} # None: ends at the close
+BASE = "15m"
+TARGETS = ("1h", "1d")
+ALIGN_FILE = "ui_align.parquet"
+
+def naive(index):
+    """Exchange-local naive timestamps (snapshot files mix tz-aware and naive indexes)."""
+    index = pd.DatetimeIndex(index)
+    return index.tz_convert(TZ).tz_localize(None) if index.tz is not None else index
+
+def bars(obj):
+    """Bar times of a frame / index, duplicates dropped (keep last)."""
+    index = obj.index if isinstance(obj, (pd.DataFrame, pd.Series)) else pd.DatetimeIndex(obj)
+    return index[~index.duplicated(keep="last")]
+
+def bar_ends(index, timeframe):
+    index = naive(index)
+    close = index.normalize() + SESSION_CLOSE
+    length = BAR_LENGTH[timeframe]
+    if length is None: return close
+    ends = index + length
+    return ends.where(ends <= close, close)
+
+def offsets(base_index, base_tf, index, timeframe):
+    """Row in `index` of the latest `timeframe` bar complete when each base bar completes (-1 = none)."""
+    ends = bar_ends(index, timeframe)
+    return (ends.searchsorted(bar_ends(base_index, base_tf), side="right") - 1).astype(np.int32)
+
+# --- INDEX ---
+def build(data_map, base=BASE, targets=TARGETS):
+    """
+    Alignment index for {tf: {symbol: frame or DatetimeIndex}}: DataFrame indexed by
+    (Symbol, Datetime) of every base bar, one int32 row column per target timeframe.
+    """
+    syms, times, cols = [], [], {tf: [] for tf in targets}
+    for sym, obj in (data_map.get(base) or {}).items():
+        idx = bars(obj)
+        if not len(idx): continue
+        syms.append(np.full(len(idx), sym, dtype=object))
+        times.append(naive(idx).values)
+        for tf in targets:
+            other = (data_map.get(tf) or {}).get(sym)
+            cols[tf].append(offsets(idx, base, bars(other), tf) if other is not None and len(other)
+                            else np.full(len(idx), -1, np.int32))
+    if not syms:
+        empty = pd.MultiIndex.from_arrays([pd.Categorical([]), pd.DatetimeIndex([])], names=["Symbol", "Datetime"])
+        return pd.DataFrame({tf: np.array([], np.int32) for tf in targets}, index=empty)
+    index = pd.MultiIndex.from_arrays([pd.Categorical(np.concatenate(syms)), pd.DatetimeIndex(np.concatenate(times))],
+                                      names=["Symbol", "Datetime"])
+    return pd.DataFrame({tf: np.concatenate(cols[tf]) for tf in targets}, index=index)
+
+def write(index, path):
+    """Parquet via temp file + move, like the ui_*.parquet swap."""
+    import market_data
+    tmp = path + ".tmp"
+    index.to_parquet(tmp, **market_data.PARQUET_OPTIONS)
+    shutil.move(tmp, path)
+    return path
+
+def load(cache_dir="cache"):
+    """{symbol: DataFrame (Datetime index; 1h, 1d rows)} from ui_align.parquet, or None if missing / unreadable."""
+    path = os.path.join(cache_dir, ALIGN_FILE)
+    if not os.path.exists(path): return None
+    try: df = pd.read_parquet(path)
+    except Exception as e:
+        print(f"⚠️ Alignment index unreadable: {e}")
+        return None
+    return {sym: part.droplevel(0) for sym, part in df.groupby(level=0, observed=True)}
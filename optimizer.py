@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+import shutil
+import itertools
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+import engine_v2
+import backtester
+
+# Parameter sweep + walk-forward over engine_v2.RULES (and the slot count) on the
+# backtester's panel.
+#   Workers: a process pool. The panel is written once as .npy files and every
+#            worker memory-maps the same files (backtester.open_panel), so nothing
+#            big is pickled per task.
+#   Caching: each worker keeps the signal arrays per rule subset
+#            (backtester.STAGE_RULES). Tasks are batched by entry-score settings, so a
+#            grid of N entry x M exit settings scores N + M signal sets, not N x M.
+#   Output:  one row per (combo, window) with backtester.summarize() stats;
+#            surface() pivots any two parameters into a P&L / hit-rate grid.
+#
+# Run: python optimizer.py --grid entry_tqs=7,8,9 exit_rev_tqs=6,7,8 [--mode daily|multi_tf] [--workers 4]
+#                          [--walk-forward --train 250 --test 60] [--objective return_pct] [--out sweep.csv]
+
+SIM_PARAMS = ("max_trades",) # Grid keys passed to simulate(); everything else must be a RULES key
+OBJECTIVE = "return_pct"
+WORKERS = max(1, (os.cpu_count() or 2) - 1)
+TRAIN_BARS = 250 # Walk-forward: ~1 year of daily bars to pick on
+TEST_BARS = 60 # ... then ~3 months out of sample
+CACHE_MAX = 64 # Signal arrays kept per worker
+
+# --- GRID ---
+def parse_grid(specs):
+    """["entry_tqs=7,8,9", "vol_mult=1.1,1.2"] -> {key: [values]} typed like the defaults."""
+    grid = {}
+    for spec in specs:
+        key, _, values = spec.partition("=")
+        if key in SIM_PARAMS: cast = int
+        elif key in engine_v2.RULES: cast = type(engine_v2.RULES[key])
+        else: raise KeyError(f"Unknown parameter: {key}")
+        grid[key] = [cast(v) for v in values.split(",") if v.strip()]
+    return grid
+
+def combos(grid, mode="daily"):
+    """Every combination as a dict. Entry-score keys vary slowest, so equal signal sets sit together."""
+    stages = backtester.STAGE_RULES[mode]
+    order = {k: i for i, k in enumerate(stages["tqs"] + stages["exit"])}
+    keys = sorted(grid, key=lambda k: order.get(k, len(order)))
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def inert_params(grid, mode="daily"):
+    """Swept RULES keys no backtester stage of `mode` reads (their surface is flat)."""
+    used = set(itertools.chain(*backtester.STAGE_RULES[mode].values()))
+    return [k for k in grid if k not in SIM_PARAMS and k not in used]
+
+# --- WORKERS ---
+_panel = None # Worker-process state (set by _init)
+_cache = {}
+
+def _init(panel_dir):
+    global _panel, _cache
+    _panel, _cache = backtester.open_panel(panel_dir), {}
+
+def _evaluate(task):
+    """Runs a batch of combos over every window. Returns result rows."""
+    batch, windows, capital, fill = task
+    rows = []
+    for params in batch:
+        rules = engine_v2.rules_with({k: v for k, v in params.items() if k not in SIM_PARAMS})
+        if len(_cache) > CACHE_MAX: _cache.clear()
+        sig = backtester.signals(_panel, rules, cache=_cache)
+        max_trades = params.get("max_trades", backtester.MAX_TRADES)
+        for window, (start, end) in enumerate(windows):
+            trades, equity = backtester.simulate(_panel, sig, max_trades, rules["entry_tqs"], capital, fill, start, end)
+            rows.append({**params, "window": window, **backtester.summarize(trades, equity, capital)})
+    return rows
+
+def _batches(combo_list, n_tasks=1, mode="daily"):
+    """Combos grouped by their entry-score settings, big groups split so ~n_tasks batches keep the pool busy."""
+    groups = {}
+    for params in combo_list:
+        key = backtester.stage_key("tqs", {k: v for k, v in params.items() if k not in SIM_PARAMS}, mode)
+        groups.setdefault(key, []).append(params)
+    size = max(1, -(-len(combo_list) // max(1, n_tasks)))
+    return [group[i:i + size] for group in groups.values() for i in range(0, len(group), size)]
+
+# --- SWEEP ---
+def sweep(panel, grid, windows=None, workers=WORKERS, capital=backtester.CAPITAL, fill="next_open"):
+    """
+    Evaluates every grid combo on `windows` ([(start, end)], default the whole panel).
+    The panel's mode (daily / multi_tf) decides the scoring.
+    Returns a DataFrame: the parameters, window, and the backtester.summarize() stats.
+    """
+    global _panel, _cache
+    windows = windows or [(None, None)]
+    batches = _batches(combos(grid, panel.mode), workers * 4 if workers > 1 else 1, panel.mode)
+    tasks = [(batch, windows, capital, fill) for batch in batches]
+    if workers <= 1 or len(tasks) == 1:
+        _panel, _cache = panel, {}
+        try: parts = [_evaluate(task) for task in tasks]
+        finally: _panel, _cache = None, {}
+    else:
+        panel_dir = tempfile.mkdtemp(prefix="sweep_panel_")
+        try:
+            backtester.save_panel(panel, panel_dir)
+            with ProcessPoolExecutor(min(workers, len(tasks)), initializer=_init, initargs=(panel_dir,)) as pool:
+                parts = list(pool.map(_evaluate, tasks))
+        finally:
+            shutil.rmtree(panel_dir, ignore_errors=True)
+    return pd.DataFrame([row for part in parts for row in part])
+
+def surface(results, x, y, value=OBJECTIVE, agg="mean"):
+    """value over (y rows x x columns), aggregated over the other parameters."""
+    return results.pivot_table(index=y, columns=x, values=value, aggfunc=agg)
+
+# --- WALK-FORWARD ---
+def folds(index, train=TRAIN_BARS, test=TEST_BARS):
+    """[(train_start, train_end, test_start, test_end)] rolling by `test` bars; test never overlaps its train."""
+    out, lo = [], 0
+    while lo + train + test <= len(index):
+        out.append((index[lo], index[lo + train - 1], index[lo + train], index[lo + train + test - 1]))
+        lo += test
+    return out
+
+def walk_forward(panel, grid, train=TRAIN_BARS, test=TEST_BARS, objective=OBJECTIVE, workers=WORKERS,
+                 capital=backtester.CAPITAL, fill="next_open"):
+    """
+    Picks the best combo on each train window (by `objective`) and scores it on the
+    following test window. Signals are causal, so one sweep over all windows serves
+    every fold. Returns {folds (DataFrame), oos (out-of-sample totals), results}.
+    """
+    spans = folds(panel.index, train, test)
+    if not spans: return {"folds": pd.DataFrame(), "oos": {}, "results": pd.DataFrame()}
+    windows = [w for tr0, tr1, te0, te1 in spans for w in ((tr0, tr1), (te0, te1))]
+    results = sweep(panel, grid, windows, workers, capital, fill)
+    params = list(grid)
+
+    rows = []
+    for i, (tr0, tr1, te0, te1) in enumerate(spans):
+        train_rows = results[results["window"] == 2 * i]
+        best = train_rows.sort_values([objective] + params, ascending=[False] + [True] * len(params)).iloc[0]
+        test_row = results[(results["window"] == 2 * i + 1) &
+                           (results[params] == best[params]).all(axis=1)].iloc[0]
+        rows.append({"fold": i, "train_start": tr0, "test_start": te0, "test_end": te1,
+                     **{k: best[k] for k in params}, "train_" + objective: best[objective],
+                     **{"test_" + k: test_row[k] for k in ("trades", "win_rate", "return_pct", "max_drawdown_pct")}})
+    table = pd.DataFrame(rows)
+    trades = int(table["test_trades"].sum())
+    oos = {"folds": len(table), "trades": trades,
+           "return_pct": round(float((np.prod(1 + table["test_return_pct"] / 100) - 1) * 100), 2),
+           "win_rate": round(float((table["test_win_rate"] * table["test_trades"]).sum() / trades), 1) if trades else 0.0,
+           "worst_drawdown_pct": round(float(table["test_max_drawdown_pct"].min()), 2)}
+    return {"folds": table, "oos": oos, "results": results}
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Sweep / walk-forward the swing rules over the cached snapshot")
+    parser.add_argument("--grid", nargs="+", required=True, metavar="KEY=V1,V2,...",
+                        help=f"engine_v2.RULES keys or {', '.join(SIM_PARAMS)}")
+    parser.add_argument("--mode", default="daily", choices=list(backtester.STAGE_RULES))
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--walk-forward", action="store_true")
+    parser.add_argument("--train", type=int, default=TRAIN_BARS)
+    parser.add_argument("--test", type=int, default=TEST_BARS)
+    parser.add_argument("--objective", default=OBJECTIVE)
+    parser.add_argument("--fill", default="next_open", choices=["next_open", "close"])
+    parser.add_argument("--out", default=None, help="Write every result row as CSV")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.grid)
+    for key in inert_params(grid, args.mode): print(f"⚠️ {key} is not used by the {args.mode} replay; its surface will be flat.")
+    t0 = time.perf_counter()
+    panel, _ = backtester.cached_panel(mode=args.mode) # Reused from the backtest cache while the snapshot is unchanged
+    if not panel.shape[1]:
+        print("No snapshot data (run run_engine_job.py first).")
+        sys.exit(1)
+    n = len(combos(grid, args.mode))
+    print(f"Panel: {panel.shape[0]} bars x {panel.shape[1]} symbols · {n} combos · {args.workers} workers")
+
+    pd.set_option("display.width", 160)
+    if args.walk_forward:
+        res = walk_forward(panel, grid, args.train, args.test, args.objective, args.workers, fill=args.fill)
+        print(res["folds"].to_string(index=False))
+        print(f"Out of sample: {res['oos']}")
+        results = res["results"]
+    else:
+        results = sweep(panel, grid, [(args.start, args.end)], args.workers, fill=args.fill)
+        print(results.sort_values(args.objective, ascending=False).head(10).to_string(index=False))
+        keys = list(grid)
+        if len(keys) >= 2:
+            for value in (args.objective, "win_rate"):
+                print(f"\n{value} ({keys[1]} x {keys[0]}):")
+                print(surface(results, keys[0], keys[1], value).round(2).to_string())
+    print(f"\nDone in {time.perf_counter() - t0:.1f}s")
+    if args.out and not results.empty:
+        results.to_csv(args.out, index=False)
+        print(f"Results -> {args.out}")
@@ -0,0 +1,136 @@
+import os
+import io
+import glob
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import functools
+
+# Opt-in profiler for job / bot runs (run_engine_job --profile, swing_bot --profile).
+# cProfile for CPU (the main thread plus any worker started through
+# profiling.thread_target) and tracemalloc for memory. Each run leaves
+# artifacts under cache/profiles/ and the app's debug panel shows their top-N:
+#
+#   <name>_<stamp>.prof   pstats dump (snakeviz / python -m pstats)
+#   <name>_<stamp>.mem    tracemalloc snapshot (tracemalloc.Snapshot.load)
+#   <name>_<stamp>.json   summary: wall time, peak memory, top functions, top allocation sites
+#
+# Expect the run to be noticeably slower while profiling (tracemalloc hooks every allocation).
+
+PROFILE_DIR = os.path.join("cache", "profiles")
+TOP_N = 25
+TRACE_FRAMES = 5 # Stack depth kept per allocation
+KEEP = 10 # Newest runs kept per profile name
+
+ACTIVE = None # Profile currently running in this process
+
+class Profile:
+    """Profiles a with-block and writes the artifacts on exit (also when the block raises)."""
+    def __init__(self, name, directory=None, top_n=TOP_N, keep=KEEP):
+        self.name, self.top_n, self.keep = name, top_n, keep
+        self.directory = directory or PROFILE_DIR
+        self.summary = None
+        self._threads = [] # Finished worker-thread profilers
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        global ACTIVE
+        ACTIVE = self
+        self._own_trace = not tracemalloc.is_tracing()
+        if self._own_trace: tracemalloc.start(TRACE_FRAMES)
+        self._started = time.perf_counter()
+        self._prof = cProfile.Profile()
+        self._prof.enable()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        global ACTIVE
+        self._prof.disable()
+        wall = time.perf_counter() - self._started
+        snap = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self._own_trace: tracemalloc.stop()
+        ACTIVE = None
+        try:
+            self.summary = self._save(wall, snap, current, peak, failed=exc_type is not None)
+            print(f"🔬 Profile -> {self.summary['path']}")
+        except Exception as e:
+            print(f"⚠️ Failed to save profile: {e}")
+
+    def wrap(self, fn):
+        """Runs fn under its own profiler (cProfile is per thread), merged into this profile."""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            prof = cProfile.Profile()
+            prof.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                prof.disable()
+                with self._lock: self._threads.append(prof)
+        return wrapper
+
+    def _save(self, wall, snap, current, peak, failed=False):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"{self.name}_{time.strftime('%Y%m%d-%H%M%S')}")
+        stats = pstats.Stats(self._prof, stream=io.StringIO())
+        with self._lock:
+            for prof in self._threads: stats.add(prof)
+        stats.dump_stats(base + ".prof")
+        snap.dump(base + ".mem")
+
+        summary = {"name": self.name, "created": time.strftime("%Y-%m-%d %H:%M:%S"), "path": base + ".prof",
+                   "failed": failed, "wall_s": round(wall, 2), "threads": len(self._threads) + 1,
+                   "total_calls": stats.total_calls, "peak_mb": round(peak / 1024 ** 2, 1),
+                   "current_mb": round(current / 1024 ** 2, 1),
+                   "top_cumulative": top_functions(stats, "cumulative", self.top_n),
+                   "top_self": top_functions(stats, "tottime", self.top_n),
+                   "top_alloc": top_allocations(snap, self.top_n)}
+        with open(base + ".json", "w") as f: json.dump(summary, f, indent=1)
+        prune(self.name, self.keep, self.directory)
+        return summary
+
+def thread_target(fn):
+    """Worker-thread target, profiled as part of the active Profile (unchanged if none)."""
+    return ACTIVE.wrap(fn) if ACTIVE is not None else fn
+
+# --- SUMMARIES ---
+def _func_name(func):
+    path, line, name = func
+    return f"{name} ({os.path.basename(path)}:{line})" if line else name
+
+def top_functions(stats, sort="cumulative", n=TOP_N):
+    """[{function, calls, self_s, cumulative_s}] for the n biggest entries by `sort`."""
+    key = {"cumulative": 3, "tottime": 2}[sort]
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][key], reverse=True)[:n]
+    return [{"function": _func_name(func), "calls": nc, "self_s": round(tt, 4), "cumulative_s": round(ct, 4)}
+            for func, (cc, nc, tt, ct, callers) in rows]
+
+def top_allocations(snap, n=TOP_N):
+    """[{where, size_kb, blocks}] for the n biggest live allocation sites (by line)."""
+    snap = snap.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                               tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")])
+    return [{"where": f"{os.path.basename(s.traceback[0].filename)}:{s.traceback[0].lineno}",
+             "size_kb": round(s.size / 1024, 1), "blocks": s.count}
+            for s in snap.statistics("lineno")[:n]]
+
+def list_profiles(directory=None):
+    """Saved summaries, newest first."""
+    out = []
+    for path in glob.glob(os.path.join(directory or PROFILE_DIR, "*.json")):
+        try:
+            with open(path, "r") as f: out.append(json.load(f))
+        except: pass
+    return sorted(out, key=lambda s: s.get("created", ""), reverse=True)
+
+def prune(name, keep=KEEP, directory=None):
+    """Drops all but the newest `keep` runs of one profile name."""
+    runs = sorted(glob.glob(os.path.join(directory or PROFILE_DIR, f"{name}_*.json")), reverse=True)
+    for old in runs[keep:]:
+        base = old[:-len(".json")]
+        for ext in (".json", ".prof", ".mem"):
+            try: os.remove(base + ext)
+            except OSError: pass
@@ -5,8 +5,11 @@ import json
 import pandas as pd
 import shutil
 import argparse
+import queue
+import threading
 from datetime import datetime
 import logging
+import metrics
 
 # Setup Logging
 logging.basicConfig(
@@ -30,6 +33,9 @@ socket.setdefaulttimeout(15.0)
 CACHE_DIR = "cache"
 RAW_DIR = os.path.join(CACHE_DIR, "raw")
 STATUS_FILE = os.path.join(CACHE_DIR, "engine_status.json")
+CHECKPOINT_FILE = os.path.join(CACHE_DIR, "engine_checkpoint.json")
+API_LEDGER_FILE = os.path.join(CACHE_DIR, "api_ledger.json")
+CHECKPOINT_EVERY = 10 # Symbols between checkpoint writes (at most this many are redone on resume)
 UI_CACHE_PREFIX = "ui_"
 ENGINE_CACHE_PREFIX = "engine_"
 
@@ -37,19 +43,40 @@ ENGINE_CACHE_PREFIX = "engine_"
 os.makedirs(CACHE_DIR, exist_ok=True)
 os.makedirs(RAW_DIR, exist_ok=True)
 
+# Bumped once per completed run; the UI keys its artifact caches on it.
+SNAPSHOT_VERSION = None
+
+def load_snapshot_version():
+    """Snapshot version of the last completed run (from the status file)."""
+    try:
+        with open(STATUS_FILE, "r") as f:
+            return json.load(f).get("snapshot_version")
+    except Exception:
+        return None
+
+_status_lock = threading.Lock()
+
 def write_status(state, progress, mode="full", error=None):
-    """Writes the current engine state to JSON."""
+    """Writes the current engine state to JSON (serialized: workers and the main thread all report)."""
+    with _status_lock:
+        _write_status(state, progress, mode, error)
+
+def _write_status(state, progress, mode, error):
     status = {
         "state": state,
         "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "progress": progress,
         "mode": mode,
-        "error": str(error) if error else None
+        "error": str(error) if error else None,
+        "snapshot_version": SNAPSHOT_VERSION,
+        "resumable": CHECKPOINT is not None and state != "COMPLETED",
+        "checkpoint": CHECKPOINT.summary() if CHECKPOINT is not None else None,
+        "stats": PROGRESS.snapshot() if PROGRESS is not None else None
     }
     
     # Atomic Write: Write to temp file then rename
     # This prevents app.py from reading an empty/partial file during the write operation
-    tmp_file = STATUS_FILE + ".tmp"
+    tmp_file = f"{STATUS_FILE}.{os.getpid()}.tmp" # Own name per process (the job and the app's reset can both write)
     try:
         with open(tmp_file, "w") as f:
             json.dump(status, f)
@@ -57,6 +84,186 @@ def write_status(state, progress, mode="full", error=None):
     except Exception as e:
         logger.error(f"Failed to write status: {e}")
 
+# --- PROGRESS ---
+STATUS_INTERVAL = 2.0 # Min seconds between RUNNING status writes (the UI polls every few seconds)
+
+class Progress:
+    """
+    Structured progress for the status file: phase, done/total, ETA, request
+    throughput and error count. Counters are updated per symbol, but the status
+    file is only rewritten on a phase change, on flush(), or when STATUS_INTERVAL
+    has passed since the last write.
+    """
+    def __init__(self, mode, interval=None):
+        self.mode = mode
+        self.interval = STATUS_INTERVAL if interval is None else interval
+        self.phase = None
+        self.done = self.total = 0
+        self.requests = self.errors = 0
+        self.extra = {} # Per-phase counters shown next to done/total (e.g. deep fetches)
+        self.started = self.phase_started = time.monotonic()
+        self.writes = 0
+        self._last_write = None
+        self._lock = threading.Lock()
+
+    def start(self, phase, total=0):
+        with self._lock:
+            self.phase, self.total, self.done, self.extra = phase, total, 0, {}
+            self.phase_started = time.monotonic()
+        self.flush()
+
+    def advance(self, n=1, **extra):
+        with self._lock:
+            self.done += n
+            self.extra.update(extra)
+        self._maybe_flush()
+
+    def request(self, n=1):
+        with self._lock: self.requests += n
+
+    def error(self, n=1):
+        with self._lock: self.errors += n
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            phase_elapsed = now - self.phase_started
+            eta = None
+            if self.total and self.done:
+                eta = round(phase_elapsed / self.done * max(self.total - self.done, 0))
+            return {"phase": self.phase, "done": self.done, "total": self.total,
+                    "pct": int(self.done / self.total * 100) if self.total else None,
+                    "eta_s": eta, "elapsed_s": round(now - self.started),
+                    "req_per_s": round(self.requests / max(now - self.started, 1e-9), 2),
+                    "requests": self.requests, "errors": self.errors, **self.extra}
+
+    def text(self):
+        """Short form for the legacy `progress` field."""
+        if not self.total: return f"{self.phase}..."
+        return f"{self.phase} {self.done}/{self.total} ({int(self.done / self.total * 100)}%)"
+
+    def _maybe_flush(self):
+        with self._lock: # Test-and-set, so concurrent workers don't both write
+            now = time.monotonic()
+            if self._last_write is not None and now - self._last_write < self.interval: return
+            self._last_write = now
+            self.writes += 1
+        write_status("RUNNING", self.text(), self.mode)
+
+    def flush(self):
+        with self._lock:
+            self._last_write = time.monotonic()
+            self.writes += 1
+        write_status("RUNNING", self.text(), self.mode)
+
+PROGRESS = None
+
+def export_metrics(state, mode):
+    """
+    This run's timings and counters -> cache/engine_metrics.json / .prom, and its
+    broker call ledger -> cache/api_ledger.json (both read by the app's debug panel).
+    """
+    try:
+        import market_data
+        for k, v in market_data.get_cache_stats().items(): metrics.gauge(f"market_data_mem_cache_{k}", v)
+        if PROGRESS is not None: metrics.gauge("job_elapsed_seconds", PROGRESS.snapshot()["elapsed_s"])
+        path = metrics.export(CACHE_DIR, state=state, mode=mode, snapshot_version=SNAPSHOT_VERSION)
+        logger.info(f"Metrics -> {path}")
+    except Exception as e:
+        logger.error(f"Failed to export metrics: {e}")
+    try:
+        import api_ledger
+        api_ledger.save(API_LEDGER_FILE, state=state, mode=mode, snapshot_version=SNAPSHOT_VERSION)
+        summary = api_ledger.summarize(api_ledger.entries())
+        if summary:
+            logger.info(f"API: {summary['calls']} calls, {summary['avg_rps']} req/s avg, "
+                        f"{summary['ab1004']} AB1004 ({summary['ab1004_pct']}%)")
+    except Exception as e:
+        logger.error(f"Failed to save API ledger: {e}")
+
+# --- CHECKPOINT ---
+class Checkpoint:
+    """
+    Progress of one run, persisted to CHECKPOINT_FILE so `--resume` can skip
+    completed work: symbols done per phase, the deep-scan candidate set and
+    which post-fetch steps (aggregate / scan / portfolio) already ran.
+    """
+    PHASES = ("daily", "deep")
+    STEPS = ("aggregate", "scan", "portfolio")
+
+    def __init__(self, mode, universe, vip=()):
+        self.mode = mode
+        self.started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.universe = list(universe)
+        self.vip = sorted(vip)
+        self.done = {p: set() for p in self.PHASES}
+        self.candidates = set()
+        self.steps = set()
+        self._dirty = 0
+        self._lock = threading.RLock() # Pipeline stages mark from different threads
+
+    @classmethod
+    def load(cls, mode):
+        """The unfinished checkpoint for `mode`, or None."""
+        try:
+            with open(CHECKPOINT_FILE, "r") as f: data = json.load(f)
+        except Exception:
+            return None
+        if data.get("mode") != mode: return None
+        cp = cls(mode, data.get("universe", []), data.get("vip", []))
+        cp.started = data.get("started", cp.started)
+        cp.done = {p: set(data.get("done", {}).get(p, [])) for p in cls.PHASES}
+        cp.candidates = set(data.get("candidates", []))
+        cp.steps = set(data.get("steps", []))
+        return cp
+
+    def save(self):
+        with self._lock: self._save()
+
+    def _save(self):
+        data = {
+            "mode": self.mode, "started": self.started, "universe": self.universe, "vip": self.vip,
+            "done": {p: sorted(s) for p, s in self.done.items()},
+            "candidates": sorted(self.candidates), "steps": sorted(self.steps),
+        }
+        tmp_file = CHECKPOINT_FILE + ".tmp"
+        try:
+            with open(tmp_file, "w") as f: json.dump(data, f)
+            os.replace(tmp_file, CHECKPOINT_FILE)
+            self._dirty = 0
+        except Exception as e:
+            logger.error(f"Failed to write checkpoint: {e}")
+
+    def mark(self, phase, ticker, candidate=False):
+        """Records a finished symbol (and whether it needs a deep fetch); flushed every CHECKPOINT_EVERY symbols."""
+        with self._lock:
+            self.done[phase].add(ticker)
+            if candidate: self.candidates.add(ticker)
+            self._dirty += 1
+            if self._dirty >= CHECKPOINT_EVERY: self._save()
+
+    def mark_step(self, step):
+        with self._lock:
+            self.steps.add(step)
+            self._save()
+
+    def summary(self):
+        with self._lock:
+            return {
+                "started": self.started,
+                "daily": f"{len(self.done['daily'])}/{len(self.universe)}",
+                "deep": f"{len(self.done['deep'])}/{len(self.candidates)}",
+                "steps": sorted(self.steps),
+            }
+
+    @staticmethod
+    def clear():
+        try: os.remove(CHECKPOINT_FILE)
+        except OSError: pass
+
+CHECKPOINT = None
+
 def get_universe(mode="full"):
     """
     Loads the universe based on mode.
@@ -106,9 +313,12 @@ def aggregate_and_swap(tickers, mode):
     Then performs atomic swap to UI files.
     """
     logger.info("Starting Aggregation...")
+    import market_data
     
     # We need to aggregate 1d, 1h, 15m
     timeframes = ["1d", "1h", "15m"]
+    bar_index = {tf: {} for tf in timeframes} # Bar times per symbol, for the alignment index
+    failed = [] # Timeframes whose UI file was not swapped (the index would point into a stale one)
     
     for tf in timeframes:
         combined_data = [] # List of DFs (or dicts?) 
@@ -125,8 +335,9 @@ def aggregate_and_swap(tickers, mode):
             
             if os.path.exists(path):
                 try:
-                    df = pd.read_parquet(path)
+                    df = market_data.to_storage(pd.read_parquet(path), tf) # Also compacts pre-schema files
                     if not df.empty:
+                        bar_index[tf][ticker] = df.index
                         # Add Symbol column for MultiIndex
                         df['Symbol'] = ticker
                         valid_dfs.append(df)
@@ -135,6 +346,7 @@ def aggregate_and_swap(tickers, mode):
         
         if not valid_dfs:
             logger.warning(f"No data found for TF {tf}")
+            failed.append(tf)
             continue
             
         # Concatenate
@@ -157,11 +369,12 @@ def aggregate_and_swap(tickers, mode):
             # For simplicity: Keep flat with Symbol column. User can filter.
             # But converting to MultiIndex (Symbol, Date) is faster for lookup.
             if 'Symbol' in full_df.columns and date_col in full_df.columns:
+                full_df['Symbol'] = full_df['Symbol'].astype("category") # Dictionary-encoded in parquet
                 full_df.set_index(['Symbol', date_col], inplace=True)
             
             # Write to Engine Staging
             engine_path = os.path.join(CACHE_DIR, f"{ENGINE_CACHE_PREFIX}{tf}.parquet")
-            full_df.to_parquet(engine_path)
+            full_df.to_parquet(engine_path, **market_data.PARQUET_OPTIONS)
             
             # Atomic Swap to UI
             ui_path = os.path.join(CACHE_DIR, f"{UI_CACHE_PREFIX}{tf}.parquet")
@@ -174,152 +387,279 @@ def aggregate_and_swap(tickers, mode):
             
         except Exception as e:
             logger.error(f"Aggregation Failed for {tf}: {e}")
+            failed.append(tf)
+
+    # Multi-TF alignment index (15m bar -> latest completed 1h / 1d row) next to the snapshot
+    import mtf_align
+    align_path = os.path.join(CACHE_DIR, mtf_align.ALIGN_FILE)
+    if failed:
+        # Rows into mismatched files can be wrong yet in range: drop the index, readers fall back
+        logger.warning(f"Skipping alignment index ({', '.join(failed)} not swapped).")
+        try: os.remove(align_path)
+        except OSError: pass
+        return
+    try:
+        index = mtf_align.build(bar_index)
+        mtf_align.write(index, align_path)
+        logger.info(f"Wrote alignment index for {len(index)} 15m bars.")
+    except Exception as e:
+        logger.error(f"Alignment index failed: {e}")
+        try: os.remove(align_path) # The previous index would point into the new files
+        except OSError: pass
+
+# --- PIPELINE ---
+API_RATE = float(os.getenv("ENGINE_API_RATE", "2.5")) # Candle requests/s across all stages (Angel ceiling: 3/s)
+
+class RateLimiter:
+    """Spaces calls at least 1/rate apart, shared by every fetch stage."""
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now: time.sleep(start - now)
+        metrics.observe("job_rate_limit_wait_seconds", start - now)
+
+def run_pipeline(universe, vip_universe, cp, eng, mode):
+    """
+    Streams symbols through three overlapping stages:
+      daily (this thread) -> deep fetch (worker, candidates only) -> scoring (worker)
+    A candidate's intraday fetch starts as soon as its daily bars mark it, and each
+    symbol is scored as soon as its data is complete. One RateLimiter paces both
+    fetch stages, so wall-clock tracks the API budget rather than the stage sum.
+    Symbols already done in the checkpoint are read from the raw cache (no API call).
+    Returns (frames {tf: {ticker: df}}, scored {ticker: eng.score_symbol(...)}).
+    """
+    import market_data
+    import engine_v2
+    light_tqs = engine_v2.RULES["light_tqs"] # Daily-only TQS that earns a deep (1h/15m) fetch
+    limiter = RateLimiter(API_RATE)
+    frames = {"1d": {}, "1h": {}, "15m": {}}
+    scored = {}
+    deep_q, score_q = queue.Queue(), queue.Queue()
+    errors = [] # BaseException raised inside a worker (re-raised here)
+    counts = {"daily": 0, "deep": 0, "scored": 0}
+    total = len(universe)
+
+    progress = PROGRESS or Progress(mode)
+    progress.start("Scanning", total)
+
+    def stored(df, tf):
+        # Scored exactly as the snapshot stores it, then widened back to float64 for analysis
+        return market_data.from_storage(market_data.to_storage(df, tf))
+
+    def fetch(ticker, tf, period, done):
+        if done: return stored(market_data.load_cached(ticker, tf), tf)
+        limiter.wait()
+        progress.request()
+        return stored(market_data.incremental_fetch(ticker, tf, period), tf)
+
+    def deep_worker():
+        try:
+            while True:
+                ticker = deep_q.get()
+                if ticker is None: break
+                done = ticker in cp.done["deep"]
+                try:
+                    if not done: logger.info(f"[{counts['deep']}/{len(cp.candidates)}] Deep Fetch {ticker}...")
+                    frames["1h"][ticker] = fetch(ticker, "1h", "1mo", done) # Fetch Hourly (1 Month)
+                    frames["15m"][ticker] = fetch(ticker, "15m", "5d", done) # Fetch 15m (5 Days)
+                    if not done: cp.mark("deep", ticker)
+                except Exception as e:
+                    logger.error(f"Deep Fetch failed for {ticker}: {e}")
+                    progress.error()
+                counts["deep"] += 1
+                score_q.put(ticker)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            score_q.put(None)
+
+    def score_worker():
+        try:
+            while True:
+                ticker = score_q.get()
+                if ticker is None: break
+                try:
+                    # Non-candidates score on whatever intraday bars are cached (as the snapshot would)
+                    for tf in ("1h", "15m"):
+                        if ticker not in frames[tf]:
+                            frames[tf][ticker] = stored(market_data.load_cached(ticker, tf), tf)
+                    s = eng.score_symbol(ticker, frames["1d"].get(ticker), frames["1h"].get(ticker), frames["15m"].get(ticker))
+                    if s is not None: scored[ticker] = s
+                except Exception as e:
+                    logger.error(f"Scoring failed for {ticker}: {e}")
+                    progress.error()
+                counts["scored"] += 1
+                # done/total counts fully scored symbols; fetch stages ride along
+                progress.advance(daily=counts["daily"], deep=counts["deep"], candidates=len(cp.candidates))
+        except BaseException as e:
+            errors.append(e)
+
+    import profiling # Workers join the --profile run (no-op otherwise)
+    workers = [threading.Thread(target=profiling.thread_target(deep_worker), name="deep", daemon=True),
+               threading.Thread(target=profiling.thread_target(score_worker), name="score", daemon=True)]
+    for w in workers: w.start()
+
+    try:
+        for i, ticker in enumerate(universe):
+            if errors: break
+            done = ticker in cp.done["daily"]
+            try:
+                if not done: logger.info(f"[{i}/{total}] Fast Fetch {ticker}...")
+                df_daily = fetch(ticker, "1d", "1y", done)
+                frames["1d"][ticker] = df_daily
+
+                if done:
+                    is_candidate = ticker in cp.candidates
+                else:
+                    # Check for Deep Scan Eligibility (VIP or Light TQS)
+                    is_candidate = ticker in vip_universe
+                    if not is_candidate and not df_daily.empty and len(df_daily) > 50:
+                        is_candidate = eng.calculate_tqs_daily_only(df_daily) >= light_tqs
+                    cp.mark("daily", ticker, candidate=is_candidate)
+
+                (deep_q if is_candidate else score_q).put(ticker)
+            except Exception as e:
+                logger.error(f"Daily Fetch failed for {ticker}: {e}")
+                progress.error()
+            counts["daily"] += 1
+    finally:
+        deep_q.put(None) # Drains: deep worker finishes its queue, then releases the scorer
+        for w in workers: w.join()
+        cp.save()
+        progress.extra.update(daily=counts["daily"], deep=counts["deep"], candidates=len(cp.candidates))
+        progress.flush()
+
+    if errors: raise errors[0]
+    logger.info(f"Pipeline done. Daily: {counts['daily']}, Deep: {counts['deep']}, Scored: {len(scored)}")
+    return frames, scored
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--mode", default="full", choices=["full", "watchlist"], help="Scan mode")
+    parser.add_argument("--resume", action="store_true", help="Continue the last unfinished run from its checkpoint")
+    parser.add_argument("--profile", action="store_true", help="cProfile + tracemalloc the run (artifacts in cache/profiles/)")
     args = parser.parse_args()
-    
+
+    if args.profile:
+        import profiling
+        with profiling.Profile(f"engine_job_{args.mode}"):
+            run_job(args)
+    else:
+        run_job(args)
+
+def run_job(args):
+    global SNAPSHOT_VERSION, CHECKPOINT, PROGRESS
     mode = args.mode
     logger.info(f"Starting Engine Job. Mode: {mode}")
+    SNAPSHOT_VERSION = load_snapshot_version() # UI keeps showing this until we finish
+    CHECKPOINT = Checkpoint.load(mode) if args.resume else None
+    if args.resume and CHECKPOINT is None:
+        logger.info("No checkpoint to resume. Starting a fresh run.")
+    
+    PROGRESS = Progress(mode)
     
     try:
         # 1. Start
-        write_status("RUNNING", "0%", mode)
+        PROGRESS.start("Starting")
         
         try:
             from discord_bot import DiscordBot
-            DiscordBot().notify_job_status(f"🚀 Background Scan Started (Mode: {mode})")
+            verb = "Resumed" if CHECKPOINT else "Started"
+            DiscordBot().notify_job_status(f"🚀 Background Scan {verb} (Mode: {mode})")
         except: pass
         
-        # 2. Get Universe
-        universe = get_universe(mode)
-        logging.info(f"Universe Size: {len(universe)}")
-        
-        if not universe:
-            logger.warning("Empty Universe!")
-            write_status("COMPLETED", "No Data", mode)
-            return
+        if CHECKPOINT is not None:
+            # 2. Universe / VIP set as of the interrupted run
+            universe = CHECKPOINT.universe
+            vip_universe = set(CHECKPOINT.vip)
+            logger.info(f"Resuming run from {CHECKPOINT.started}: {CHECKPOINT.summary()}")
+        else:
+            # 2. Get Universe
+            universe = get_universe(mode)
+            logging.info(f"Universe Size: {len(universe)}")
+            
+            if not universe:
+                logger.warning("Empty Universe!")
+                write_status("COMPLETED", "No Data", mode)
+                return
 
-        # 2a. Get VIP Universe (Watchlist + Portfolio) for Deep Data
-        vip_universe = set()
-        if mode == "full":
-            try:
-                vip_list = get_universe(mode="watchlist")
-                vip_universe = set(vip_list)
-                logging.info(f"VIP Universe (Deep Scan): {len(vip_universe)} stocks")
-            except: pass
+            # 2a. Get VIP Universe (Watchlist + Portfolio) for Deep Data
+            vip_universe = set()
+            if mode == "full":
+                try:
+                    vip_list = get_universe(mode="watchlist")
+                    vip_universe = set(vip_list)
+                    logging.info(f"VIP Universe (Deep Scan): {len(vip_universe)} stocks")
+                except: pass
+
+            Checkpoint.clear()
+            CHECKPOINT = Checkpoint(mode, universe, vip_universe)
+            CHECKPOINT.save()
+        cp = CHECKPOINT
 
-        # 3. Sequential Fetch
+        # 3a. Raw cache housekeeping
         import market_data
+        stale = market_data.clean_stale_tmp() # Left behind if the last run was killed mid-write
+        if stale: logger.info(f"Removed {stale} stale temp files from raw cache.")
         
-        # 3. Two-Phase Scan Strategy
-        import market_data
+        # 3. Pipelined Scan: daily fetch -> deep fetch (candidates) -> scoring, all overlapping
         import engine_v2
-        
-        # Temp engine for Light TSQ check
-        temp_eng = engine_v2.SwingEngine()
-        
-        deep_scan_candidates = set()
-        total = len(universe)
-        
-        # --- PHASE 1: BROAD SCAN (Daily Data Only) ---
-        write_status("RUNNING", "Phase 1: Broad Scan (Daily)...", mode)
-        
-        for i, ticker in enumerate(universe):
-            pct = int((i / total) * 50) # First 50% of progress bar
-            write_status("RUNNING", f"Daily Scan {i}/{total} ({pct}%)", mode)
-            
-            try:
-                logger.info(f"[{i}/{total}] Fast Fetch {ticker}...")
-                
-                # Fetch Daily (Incremental) - Stores to Parquet
-                df_daily = market_data.incremental_fetch(ticker, "1d", "1y")
-                
-                # Check for Deep Scan Eligibility
-                is_vip = ticker in vip_universe
-                is_high_potential = False
-                
-                if not df_daily.empty and len(df_daily) > 50:
-                    # Quick TSQ Check
-                    light_tqs = temp_eng.calculate_tqs_daily_only(df_daily)
-                    if light_tqs >= 5: # As per user request: TSQ > 5
-                        is_high_potential = True
-                
-                if is_vip or is_high_potential:
-                    deep_scan_candidates.add(ticker)
-                    
-                time.sleep(0.25) # Fast throttle for Daily
-                
-            except Exception as e:
-                logger.error(f"Daily Fetch failed for {ticker}: {e}")
+        eng = engine_v2.SwingEngine()
+        with metrics.timed("job_stage_seconds", stage="pipeline"):
+            frames, scored = run_pipeline(universe, vip_universe, cp, eng, mode)
+
+        logger.info(f"Memory Cache: {market_data.get_cache_stats()}")
 
-        # --- PHASE 2: DEEP SCAN (Hourly/15m for Candidates) ---
-        write_status("RUNNING", "Phase 2: Deep Scan (Intraday)...", mode)
-        
-        deep_list = list(deep_scan_candidates)
-        total_deep = len(deep_list)
-        logger.info(f"Deep Scan Candidates: {total_deep} stocks")
-        
-        for i, ticker in enumerate(deep_list):
-            pct = 50 + int((i / total_deep) * 40) # 50% to 90%
-            write_status("RUNNING", f"Deep Scan {i}/{total_deep} ({pct}%)", mode)
-            
-            try:
-                logger.info(f"[{i}/{total_deep}] Deep Fetch {ticker}...")
-                
-                # Fetch Hourly (1 Month) - Optimized Storage
-                market_data.incremental_fetch(ticker, "1h", "1mo")
-                
-                # Fetch 15m (5 Days)
-                market_data.incremental_fetch(ticker, "15m", "5d")
-                
-                time.sleep(1.0) # Slower throttle for heavy data
-                
-            except Exception as e:
-                logger.error(f"Deep Fetch failed for {ticker}: {e}")
-                
         # 4. Aggregation & Swap
-        write_status("RUNNING", "Aggregating...", mode)
-        aggregate_and_swap(universe, mode)
+        if "aggregate" not in cp.steps:
+            PROGRESS.start("Aggregating")
+            with metrics.timed("job_stage_seconds", stage="aggregate"):
+                aggregate_and_swap(universe, mode)
+            cp.mark_step("aggregate")
         
-        # 5. Analysis (Heavy Lifting)
-        write_status("RUNNING", "Analyzing Market...", mode)
+        # 5. Analysis (symbols were scored as their data arrived; only ranking is left)
+        PROGRESS.start("Analyzing")
         
         try:
-            import engine_v2
             import sheets_db # Needed for saving results
             
-            # Re-init engine (clean state)
-            eng = engine_v2.SwingEngine()
+            # Same shape as load_snapshot(), straight from memory
+            data_map = {tf: {t: df for t, df in frames[tf].items() if df is not None and not df.empty} for tf in frames}
             
-            # Load the data we just aggregated (Snapshot)
-            data_map = eng.load_snapshot()
-            
-            if data_map:
-                logger.info(f"Loaded Snapshot Data. 1D: {len(data_map.get('1d', []))}")
-                
-                # A. Run Scan
-                logger.info("Running Deep Scan...")
+            if data_map['1d']:
+                logger.info(f"Pipeline Data. 1D: {len(data_map['1d'])}")
                 
-                def scan_progress(pct_float):
-                    # Map 0.0-1.0 to text progress
-                    p_text = f"Analyzing {int(pct_float*100)}%"
-                    write_status("RUNNING", p_text, mode)
+                # A. Finalize Scan (weekly ranks need every symbol's daily bars)
+                if "scan" in cp.steps:
+                    scan_results, _, _ = sheets_db.fetch_scan_results() # Saved before the interruption
+                    logger.info(f"Scan already done ({len(scan_results)} results). Skipping.")
+                else:
+                    with metrics.timed("job_stage_seconds", stage="scan"):
+                        weekly_map = eng.get_weekly_rankings(data_map['1d'])
+                        scan_results = eng.finalize_scan({t: scored[t] for t in universe if t in scored}, weekly_map)
                     
-                scan_results = eng.scan(data_map=data_map, progress_callback=scan_progress)
-                
-                # Save Scan Results
-                sheets_db.save_scan_results(scan_results)
-                logger.info(f"Saved {len(scan_results)} scan results.")
+                        # Save Scan Results
+                        sheets_db.save_scan_results(scan_results)
+                    logger.info(f"Saved {len(scan_results)} scan results.")
+                    cp.mark_step("scan")
                 
                 # B. Run Portfolio Analysis
                 logger.info("Analyzing Portfolio...")
                 portfolio = sheets_db.fetch_portfolio()
                 
-                if portfolio is not None and len(portfolio) > 0:
+                if "portfolio" in cp.steps:
+                    logger.info("Portfolio analysis already done. Skipping.")
+                elif portfolio is not None and len(portfolio) > 0:
                     pf_df = pd.DataFrame(portfolio)
-                    analysis = eng.check_exits(pf_df, data_map=data_map)
+                    with metrics.timed("job_stage_seconds", stage="portfolio"):
+                        analysis = eng.check_exits(pf_df, data_map=data_map)
                     
                     # Save Portfolio Analysis to JSON (New File for UI to load instantly)
                     # We can use sheets_db or just a local json
@@ -330,16 +670,22 @@ def main():
                              analysis = analysis.to_dict(orient='records')
                         json.dump(analysis, f)
                     logger.info(f"Saved {len(analysis)} portfolio signals.")
+                    cp.mark_step("portfolio")
             else:
-                logger.warning("Snapshot load failed. Skipping analysis.")
+                logger.warning("No daily data. Skipping analysis.")
 
         except Exception as e:
             logger.error(f"Analysis Phase Failed: {e}")
+            PROGRESS.error()
             # Non-fatal? Or fatal? Let's treat as non-fatal for now to allow 'COMPLETED' for data
             pass
         
-        # 6. Complete
+        # 6. Complete (new snapshot: ui_*.parquet, scans, portfolio analysis)
+        SNAPSHOT_VERSION = datetime.now().strftime("%Y%m%d-%H%M%S")
+        Checkpoint.clear()
+        CHECKPOINT = None
         write_status("COMPLETED", "100%", mode)
+        export_metrics("COMPLETED", mode)
         logger.info("Job Completed Successfully.")
         
         # --- DISCORD ALERTS ---
@@ -372,7 +718,9 @@ def main():
             
     except Exception as e:
         logger.error(f"Job Critical Error: {e}")
+        if CHECKPOINT is not None: CHECKPOINT.save() # Flush symbols finished since the last write
         write_status("FAILED", "Error", mode, str(e))
+        export_metrics("FAILED", mode)
         
         try:
             from discord_bot import DiscordBot
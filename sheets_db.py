@@ -1,23 +1,27 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
-import streamlit as st
 import datetime
 import json
 import os
+import data_context
+import local_store
+import trade_log
+import metrics
 
 # --- CONFIG ---
 SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
 SHEET_NAME = "Swing_Trades_DB"
 CREDENTIALS_FILE = "service_account.json"
-DB_FILE = "db.json"
+DB_FILE = "db.json" # Legacy store (migrated into local_store.STORE_FILE)
 
 # --- CORE CONNECTION ---
 def connect_db():
     """Connects to Google Sheets (Cloud)."""
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
     creds = None
-    if "gcp_service_account" in st.secrets:
-            creds_dict = st.secrets["gcp_service_account"]
+    secrets = data_context.get_context().secrets
+    if "gcp_service_account" in secrets:
+            creds_dict = secrets["gcp_service_account"]
             creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
     elif "GCP_SERVICE_ACCOUNT" in os.environ:
             import json as j
@@ -39,94 +43,163 @@ def connect_db():
         return None
 
 # --- LOCAL DATABASE LAYER ---
-def load_local_db():
-    if os.path.exists(DB_FILE):
-        try:
-            with open(DB_FILE, "r") as f:
-                data = json.load(f)
-                return data if isinstance(data, dict) else {}
-        except: return {}
-    return {}
+# Backed by SQLite (WAL) in local_store. db.json is imported once on first use.
+# Closed trades live in the append-only trade_log (parquet + running stats).
+from local_store import SafeJSONEncoder
 
-import json
-import numpy as np
-import pandas as pd
+_history_log_checked = set() # store paths already checked this process
 
-class SafeJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, pd.Series):
-            try: return float(obj.iloc[-1]) # Try to get scalar
-            except: return str(obj) # Fallback to string repr
-        if isinstance(obj, np.integer):
-            return int(obj)
-        if isinstance(obj, np.floating):
-            return float(obj)
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super().default(obj)
+def _ensure_history_log():
+    """One-shot move of history rows from the SQLite store into trade_log."""
+    path = os.path.abspath(local_store.STORE_FILE)
+    if path in _history_log_checked: return
+    _history_log_checked.add(path)
+    if local_store.get_meta("history_in_trade_log"): return
+    rows = local_store.read_table("history")
+    if rows and trade_log.is_empty():
+        trade_log.replace(rows)
+        print(f"✅ Moved {len(rows)} closed trades into the trade log.")
+    local_store.set_meta("history_in_trade_log", "1")
+
+def load_local_db():
+    """Full snapshot in the legacy db.json shape ({} if nothing stored yet)."""
+    db = local_store.load_all()
+    if db:
+        _ensure_history_log()
+        db["history"] = trade_log.read_all()
+    return db
 
 def save_local_db(data):
-    with open(DB_FILE, "w") as f:
-        json.dump(data, f, indent=4, cls=SafeJSONEncoder)
+    data = dict(data)
+    if "history" in data:
+        _ensure_history_log()
+        trade_log.replace(data.pop("history") or [])
+    local_store.save_all(data)
 
 # --- SYNC STACK ---
-def sync_from_cloud():
-    """Downloads ALL data from Cloud -> Local db.json"""
+# Worksheet -> (local key, rows, cols, required headers)
+SYNC_SHEETS = {
+    "OpenPositions": ("portfolio", 100, 10, ["Symbol", "Entry"]),
+    "trades_closed": ("history", 1000, 10, ["Symbol"]),
+    "LatestScan": ("scan_results", 100, 15, ["Symbol", "TQS"]),
+    "Watchlist": ("watchlist", 100, 10, ["Symbol"]),
+}
+# archive_trade appends rows in this order (trades_closed may have no header row)
+HISTORY_COLUMNS = ["Date", "Symbol", "Entry", "Exit", "PnL", "Reason"]
+# Sheet rows of trades_closed already pulled into local history
+HISTORY_CURSOR_KEY = "history_rows_synced"
+# Rows archive_trade appended (and logged locally) that the cursor could not skip
+HISTORY_PENDING_KEY = "history_rows_pending"
+
+def _ensure_worksheets(wb):
+    """One metadata read; any missing sheets are created in a single batch_update."""
+    existing = {ws.title: ws for ws in wb.worksheets()}
+    missing = [name for name in SYNC_SHEETS if name not in existing]
+    if missing:
+        wb.batch_update({"requests": [
+            {"addSheet": {"properties": {
+                "title": name,
+                "gridProperties": {"rowCount": SYNC_SHEETS[name][1], "columnCount": SYNC_SHEETS[name][2]}
+            }}}
+            for name in missing
+        ]})
+        existing = {ws.title: ws for ws in wb.worksheets()}
+    return existing
+
+def _split_header(name, values):
+    """Returns (header, data_rows). Headerless trades_closed falls back to HISTORY_COLUMNS."""
+    if not values: return [], []
+    if name == "trades_closed" and "Symbol" not in values[0]:
+        return HISTORY_COLUMNS, values
+    return values[0], values[1:]
+
+def _to_records(name, header, rows):
+    """Same shape as get_all_records (numericised, blanks as ''), after a schema check."""
+    if not rows: return []
+    from gspread.utils import numericise_all
+    missing = [c for c in SYNC_SHEETS[name][3] if c not in header]
+    if missing:
+        raise ValueError(f"Schema mismatch in '{name}': missing columns {missing}")
+    records = []
+    for r in rows:
+        r = list(r) + [""] * (len(header) - len(r))
+        records.append(dict(zip(header, numericise_all(r[:len(header)]))))
+    return records
+
+@metrics.timed("sheets_db_seconds")
+def sync_from_cloud(incremental=False):
+    """
+    Downloads ALL data from Cloud -> local store in one batched read and one
+    local transaction. incremental=True only pulls trades_closed rows appended
+    since the last sync (falls back to a full pull if there is no cursor yet).
+    """
     conn = connect_db()
     if not conn: return False, "Connection Failed"
 
     try:
         wb = conn
-        
-        # 1. Portfolio
-        try: ws_p = wb.worksheet("OpenPositions")
-        except: ws_p = wb.add_worksheet("OpenPositions", 100, 10)
-        portfolio = ws_p.get_all_records()
-        
-        # 2. History
-        try: ws_h = wb.worksheet("trades_closed")
-        except: ws_h = wb.add_worksheet("trades_closed", 1000, 10)
-        history = ws_h.get_all_records()
-        
-        # 3. Scans
-        try: ws_s = wb.worksheet("LatestScan")
-        except: ws_s = wb.add_worksheet("LatestScan", 100, 15)
-        scans = ws_s.get_all_records()
-        
-        db = {
-            "portfolio": portfolio,
-            "history": history,
-            "scan_results": scans,
-            "last_synced": str(datetime.datetime.now())
-        }
-        
-        # 4. Watchlist (New Sync)
-        try: ws_w = wb.worksheet("Watchlist")
-        except: ws_w = wb.add_worksheet("Watchlist", 100, 10)
-        watchlist = ws_w.get_all_records()
-
-        db = {
-            "portfolio": portfolio,
-            "history": history,
-            "scan_results": scans,
-            "watchlist": watchlist,
-            "last_synced": str(datetime.datetime.now())
-        }
+        sheets = _ensure_worksheets(wb)
+
+        cursor = local_store.get_meta(HISTORY_CURSOR_KEY) if incremental else None
+        cursor = int(cursor) if cursor is not None else None
+
+        # 1. One values_batch_get for every worksheet
+        ranges = [f"'{name}'" for name in SYNC_SHEETS if name != "trades_closed"]
+        if cursor is None:
+            ranges.append("'trades_closed'")
+        else:
+            ws_h = sheets["trades_closed"]
+            ranges.append("'trades_closed'!1:1") # Header (for column names)
+            if cursor < ws_h.row_count:
+                from gspread.utils import rowcol_to_a1
+                end = rowcol_to_a1(ws_h.row_count, ws_h.col_count)
+                ranges.append(f"'trades_closed'!A{cursor + 1}:{end}")
+
+        res = wb.values_batch_get(ranges)
+        values = [vr.get("values", []) for vr in res.get("valueRanges", [])]
+        values += [[]] * (len(ranges) - len(values))
+
+        # 2. Parse + Validate (nothing is written if any sheet is malformed)
+        db = {}
+        for i, name in enumerate(n for n in SYNC_SHEETS if n != "trades_closed"):
+            header, rows = _split_header(name, values[i])
+            db[SYNC_SHEETS[name][0]] = _to_records(name, header, rows)
+
+        h_values = values[len(SYNC_SHEETS) - 1:]
+        if cursor is None:
+            header, rows = _split_header("trades_closed", h_values[0])
+            db["history"] = _to_records("trades_closed", header, rows)
+            new_cursor = len(h_values[0])
+            pending = [] # The full pull replaces the log, our rows included
+        else:
+            header, _ = _split_header("trades_closed", h_values[0])
+            raw = h_values[1] if len(h_values) > 1 else []
+            # Cursor 0 (sheet was empty): the range starts at row 1, so split off the header like a full pull
+            rows = _split_header("trades_closed", raw)[1] if cursor == 0 else raw
+            db["history"], pending = _drop_pending(_to_records("trades_closed", header, rows))
+            new_cursor = cursor + len(raw)
+
+        db["last_synced"] = str(datetime.datetime.now())
         
         # Cloud is Truth for Watchlist now (Bot pushes to it)
         # If Cloud is empty, we accept empty (until Bot runs)
-        if not db["watchlist"]:
-             # Fallback: check local ONLY if cloud is empty? 
-             # No, confusing. Let's stick to Cloud Truth.
-             pass
-             
-        save_local_db(db)
-
-        save_local_db(db)
+
+        # 3. Local write: trade log first, then one store transaction
+        #    (the cursor only advances once the trades are safely in the log)
+        history = db.pop("history")
+        _ensure_history_log()
+        if cursor is None: trade_log.replace(history)
+        else: trade_log.append(history)
+        local_store.save_all(db, meta={HISTORY_CURSOR_KEY: str(new_cursor),
+                                       HISTORY_PENDING_KEY: json.dumps(pending, cls=SafeJSONEncoder)})
+
+        if cursor is not None:
+            return True, f"Synced Incrementally (+{len(history)} trades)"
         return True, "Synced Successfully"
     except Exception as e:
         return False, str(e)
 
+@metrics.timed("sheets_db_seconds")
 def push_portfolio_to_cloud(portfolio_data):
     """Overwrites OpenPositions in Cloud with Local Data."""
     try:
@@ -144,6 +217,7 @@ def push_portfolio_to_cloud(portfolio_data):
         print(f"Cloud Push Failed: {e}")
         return False
 
+@metrics.timed("sheets_db_seconds")
 def push_watchlist_to_cloud(watchlist_data):
     """Overwrites Watchlist in Cloud with Local Data."""
     try:
@@ -166,49 +240,55 @@ def push_watchlist_to_cloud(watchlist_data):
 
 # --- READ METHODS (INSTANT) ---
 
+@metrics.timed("sheets_db_seconds")
 def fetch_portfolio():
-    db = load_local_db()
-    if db: return db.get("portfolio", [])
+    if local_store.has_data(): return local_store.read_table("portfolio")
     # Fallback to cloud if no local db
     sync_from_cloud()
-    return load_local_db().get("portfolio", [])
+    return local_store.read_table("portfolio")
 
-def fetch_history():
-    db = load_local_db()
-    if db: return db.get("history", [])
-    sync_from_cloud()
-    return load_local_db().get("history", [])
+@metrics.timed("sheets_db_seconds")
+def fetch_history(limit=None):
+    """Closed trades (append order). limit=N returns only the latest N."""
+    if not local_store.has_data(): sync_from_cloud()
+    _ensure_history_log()
+    if limit: return trade_log.read_recent(limit)
+    return trade_log.read_all()
 
+@metrics.timed("sheets_db_seconds")
+def fetch_history_stats():
+    """Precomputed P&L / win rate / per-symbol / per-tag aggregates (O(1))."""
+    if not local_store.has_data(): sync_from_cloud()
+    _ensure_history_log()
+    return trade_log.get_stats()
+
+@metrics.timed("sheets_db_seconds")
 def fetch_scan_results():
-    db = load_local_db()
-    
     # Auto-healing: If no DB, sync first.
-    if not db:
+    if not local_store.has_data():
         sync_from_cloud()
-        db = load_local_db()
         
-    if db:
-        return db.get("scan_results", []), db.get("last_synced", "Now"), None
+    if local_store.has_data():
+        return local_store.read_table("scan_results"), local_store.get_meta("last_synced", "Now"), None
     return [], None, "No Data"
 
 # --- WRITE METHODS (SAFE) ---
 
+@metrics.timed("sheets_db_seconds")
 def add_trade(symbol, entry, qty=1, stop=0, tqs=0):
     # 1. Update Local
-    db = load_local_db()
-    if not db: sync_from_cloud(); db = load_local_db()
+    if not local_store.has_data(): sync_from_cloud()
     
     new_row = {
         "Date": datetime.date.today().strftime("%Y-%m-%d"),
         "Symbol": symbol, "Entry": entry, "Qty": qty, "StopLoss": stop,
         "Status": "OPEN", "LTP": entry, "PnL_Pct": 0.0, "ExitPrice": "", "ExitDate": "", "TQS": tqs
     }
-    db["portfolio"].append(new_row)
-    save_local_db(db)
+    local_store.append_row("portfolio", new_row)
     
     # 2. Push Cloud (Background Sync)
     try:
-         if push_portfolio_to_cloud(db["portfolio"]):
+         if push_portfolio_to_cloud(local_store.read_table("portfolio")):
              print(f"Added {symbol} to Cloud.")
          else:
              print(f"Added {symbol} Local ONLY. Cloud Push Failed.")
@@ -218,78 +298,63 @@ def add_trade(symbol, entry, qty=1, stop=0, tqs=0):
 
 
 # --- WATCHLIST METHODS ---
+@metrics.timed("sheets_db_seconds")
 def fetch_watchlist():
-    db = load_local_db()
-    if db and "watchlist" in db: return db["watchlist"]
+    if local_store.has_data(): return local_store.read_table("watchlist")
     
     # Fallback: Sync if missing
     sync_from_cloud()
-    return load_local_db().get("watchlist", [])
+    return local_store.read_table("watchlist")
 
+@metrics.timed("sheets_db_seconds")
 def save_watchlist(data):
-    db = load_local_db()
-    db["watchlist"] = data
-    save_local_db(db)
+    local_store.replace_table("watchlist", data)
     
     # Push to Cloud
     try:
         push_watchlist_to_cloud(data)
     except: pass
 
+@metrics.timed("sheets_db_seconds")
 def delete_trade(symbol):
-    # 1. Update Local (Precise List Remove)
-    db = load_local_db()
-    if not db: return
+    # 1. Update Local (Indexed delete on clean symbol)
+    if not local_store.has_data(): return
     
     # Normalize: Remove .NS for matching (assuming DB stores clean)
     clean_sym = symbol.replace(".NS", "").upper()
     
-    init_len = len(db["portfolio"])
-    # Filter out by clean symbol
-    db["portfolio"] = [t for t in db["portfolio"] if t["Symbol"].replace(".NS", "").upper() != clean_sym]
-    
-    if len(db["portfolio"]) < init_len:
-        save_local_db(db)
+    if local_store.delete_by_symbol("portfolio", clean_sym) > 0:
         # 2. Push Cloud
         try:
-             success = push_portfolio_to_cloud(db["portfolio"])
+             success = push_portfolio_to_cloud(local_store.read_table("portfolio"))
              if success: print(f"Deleted {clean_sym} local & cloud.")
              else: print(f"Deleted {clean_sym} Local ONLY. Cloud Push Failed.")
         except:
              print(f"Deleted {clean_sym} Local ONLY. Cloud Push Exception.")
 
+@metrics.timed("sheets_db_seconds")
 def close_trade_db(symbol, exit_price):
     # This was missing in replacement - needed for exit
-    db = load_local_db()
-    if not db: return False
+    if not local_store.has_data(): return False
     
-    # Find & Update Local
-    found = False
-    for t in db["portfolio"]:
-        if t['Symbol'] == symbol and t['Status'] == 'OPEN':
-             t['Status'] = 'CLOSED'
-             t['ExitPrice'] = exit_price
-             t['ExitDate'] = datetime.date.today().strftime("%Y-%m-%d")
-             found = True
-             break
-             
-    if found:
-        # We don't save closed trades in Portfolio list permanently?
-        # Actually logic is Archive saves to history. Here we just update?
-        # No, usually we delete from portfolio and add to history.
-        # But for 'close_trade_db' returning True lets UI handle it.
-        # Let's save the logic.
-        save_local_db(db)
+    # Find & Update Local (Indexed on Symbol + Status)
+    for row_id, t in local_store.find_rows("portfolio", symbol=symbol, status="OPEN"):
+        if t['Symbol'] != symbol: continue
+        t['Status'] = 'CLOSED'
+        t['ExitPrice'] = exit_price
+        t['ExitDate'] = datetime.date.today().strftime("%Y-%m-%d")
+        # Archive saves to history; here we just mark the row so the UI can handle it.
+        local_store.update_row("portfolio", row_id, t)
         return True
     return False
 
+@metrics.timed("sheets_db_seconds")
 def archive_trade(trade_data):
     # 1. Update Local
-    db = load_local_db()
-    if not db: sync_from_cloud(); db = load_local_db()
+    if not local_store.has_data(): sync_from_cloud()
     
-    db["history"].append(trade_data)
-    save_local_db(db)
+    _ensure_history_log()
+    trade_log.append(trade_data)
     
     # 2. Append to Cloud (Optimized: Just append row)
     try:
@@ -303,18 +368,47 @@ def archive_trade(trade_data):
             trade_data.get('PnL', 0),
             trade_data.get('Reason', 'Manual')
         ]
-        ws.append_row(row)
+        res = ws.append_row(row)
+
+        # Our own row is already local; keep incremental sync from pulling it back.
+        # Skip it via the cursor only if it landed right after it. Otherwise others
+        # appended meanwhile: the next sync pulls every row and drops ours as pending.
+        cursor = local_store.get_meta(HISTORY_CURSOR_KEY)
+        if cursor is not None:
+            if _appended_row(res) == int(cursor) + 1:
+                local_store.set_meta(HISTORY_CURSOR_KEY, str(int(cursor) + 1))
+            else:
+                pending = json.loads(local_store.get_meta(HISTORY_PENDING_KEY) or "[]") + [row]
+                local_store.set_meta(HISTORY_PENDING_KEY, json.dumps(pending, cls=SafeJSONEncoder))
     except: pass
 
+def _drop_pending(records):
+    """Removes our own pending rows (once each) from pulled records. Returns (records, rows still pending)."""
+    pending = json.loads(local_store.get_meta(HISTORY_PENDING_KEY) or "[]")
+    if not pending: return records, []
+    keys = _to_records("trades_closed", HISTORY_COLUMNS, pending)
+    open_rows = list(range(len(pending)))
+    out = []
+    for rec in records:
+        key = {c: rec.get(c, "") for c in HISTORY_COLUMNS}
+        hit = next((i for i in open_rows if keys[i] == key), None)
+        if hit is None: out.append(rec)
+        else: open_rows.remove(hit)
+    return out, [pending[i] for i in open_rows]
+
+def _appended_row(res):
+    """Row number of an append_row response ("updates": {"updatedRange": "trades_closed!A12:F12"}), or None."""
+    try:
+        import re
+        rng = res["updates"]["updatedRange"].rpartition("!")[2]
+        return int(re.match(r"[A-Z]+(\d+)", rng).group(1))
+    except Exception:
+        return None
+
+@metrics.timed("sheets_db_seconds")
 def save_scan_results(results):
     # 1. Local
-    db = load_local_db()
-    if not db: 
-        db = {"portfolio": [], "history": [], "scan_results": []}
-    
-    db["scan_results"] = results
-    db["last_synced"] = str(datetime.datetime.now())
-    save_local_db(db)
+    local_store.replace_table("scan_results", results, last_synced=datetime.datetime.now())
     
     # 2. Cloud
     try:
@@ -0,0 +1,347 @@
+import os
+import math
+import time
+import zlib
+import random
+import threading
+import collections
+from datetime import datetime, timedelta, timezone
+import pandas as pd
+
+# --- SMARTAPI SIMULATOR ---
+# Offline stand-in for Angel One's SmartAPI, for load-testing angel_data /
+# market_data fetch paths (limiters, retries, re-login) without the broker.
+#
+#   SmartAPISimulator  - the "server": sessions, per-endpoint rate windows,
+#                        error injection, latency, candle/quote data.
+#   SimulatedSmartConnect - SmartConnect-shaped client bound to a simulator.
+#   install()/uninstall()  - route market_data through a simulator for this context.
+#
+# Responses use SmartAPI's envelope: {status, message, errorcode, data}.
+# AB1004 is what angel_data treats as a rate limit / transient error; AG8001 is
+# an invalid or expired session (angel_data re-logs in). SIM_* codes are the
+# simulator's own, for requests the broker would reject in some other way.
+
+IST = timezone(timedelta(hours=5, minutes=30))
+SESSION_OPEN = (9, 15)
+SESSION_CLOSE = (15, 30)
+
+INTERVAL_MINUTES = {"ONE_MINUTE": 1, "THREE_MINUTE": 3, "FIVE_MINUTE": 5, "TEN_MINUTE": 10,
+                    "FIFTEEN_MINUTE": 15, "THIRTY_MINUTE": 30, "ONE_HOUR": 60, "ONE_DAY": None}
+MAX_DAYS = {"ONE_MINUTE": 30, "THREE_MINUTE": 60, "FIVE_MINUTE": 100, "TEN_MINUTE": 100,
+            "FIFTEEN_MINUTE": 200, "THIRTY_MINUTE": 200, "ONE_HOUR": 400, "ONE_DAY": 2000}
+CACHE_INTERVALS = {"ONE_DAY": "1d", "ONE_HOUR": "1h", "FIFTEEN_MINUTE": "15m"} # market_data raw file suffixes
+
+# (per second, per minute) for each endpoint and API key
+RATE_LIMITS = {"getCandleData": (3, 180), "getMarketData": (10, 500), "generateSession": (1, 60)}
+QUOTE_BATCH_MAX = 50
+
+ERRORS = {
+    "AB1004": "Access denied because of exceeding access rate",
+    "AG8001": "Invalid Token",
+    "SIM_RANGE": "Invalid date range for interval",
+    "SIM_TOKEN": "Invalid symbol token",
+}
+
+def _ok(data):
+    return {"status": True, "message": "SUCCESS", "errorcode": "", "data": data}
+
+def _err(code, message=None):
+    return {"status": False, "message": message or ERRORS.get(code, code), "errorcode": code, "data": None}
+
+def _parse_dt(s):
+    return datetime.strptime(s, "%Y-%m-%d %H:%M").replace(tzinfo=IST)
+
+class SmartAPISimulator:
+    """
+    symbols: names ("RELIANCE" / "RELIANCE.NS") to list in the instrument master.
+    rate_limits: {endpoint: (per_s, per_min)}; calls beyond either window get AB1004.
+    error_rates: {"AB1004": p, "AG8001": p} injected per data call (AG8001 also ends the session).
+    latency / jitter: seconds per call, +/- jitter fraction (slept outside the lock).
+    session_ttl: seconds a login stays valid (None = forever).
+    recorded_dir: serve market_data raw cache files ({SYM}_{1d,1h,15m}.parquet) when present.
+    clock / sleep: injectable for tests.
+    """
+    def __init__(self, symbols=None, rate_limits=None, error_rates=None, latency=0.0, jitter=0.0,
+                 session_ttl=None, recorded_dir=None, seed=0, clock=None, sleep=None):
+        names = [s.replace(".NS", "").upper() for s in (symbols or [f"SIM{i}" for i in range(50)])]
+        self.tokens = {name: str(10000 + i) for i, name in enumerate(names)}
+        self.names = {tok: name for name, tok in self.tokens.items()}
+        self.rate_limits = dict(RATE_LIMITS, **(rate_limits or {}))
+        self.error_rates = dict(error_rates or {})
+        self.latency, self.jitter = latency, jitter
+        self.session_ttl = session_ttl
+        self.recorded_dir = recorded_dir
+        self.clock = clock or time.monotonic
+        self.sleep = sleep or time.sleep
+        self._rng = random.Random(seed)
+        self._sessions = {} # jwt -> expiry (clock time) or None
+        self._windows = collections.defaultdict(collections.deque) # (api_key, endpoint) -> accepted call times
+        self._recorded = {}
+        self._lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.errors = collections.Counter()
+        self.peak_rate = collections.Counter() # endpoint -> most accepted calls seen in one second
+
+    # --- Instruments ---
+    def instrument_master(self):
+        """Rows in OpenAPIScripMaster.json format (NSE equities only)."""
+        return [{"token": tok, "symbol": f"{name}-EQ", "name": name, "exch_seg": "NSE",
+                 "instrumenttype": "", "lotsize": "1", "tick_size": "5.000000"}
+                for name, tok in self.tokens.items()]
+
+    # --- Request gate ---
+    def _admit(self, api_key, endpoint, jwt=None, inject=True):
+        """Session, rate-limit and injected-error checks. Returns an error response or None."""
+        with self._lock:
+            now = self.clock()
+            self.calls[endpoint] += 1
+            if jwt is not None:
+                expiry = self._sessions.get(jwt, 0)
+                if expiry == 0 or (expiry is not None and now >= expiry):
+                    self._sessions.pop(jwt, None)
+                    return _err("AG8001")
+
+            window = self._windows[(api_key, endpoint)]
+            while window and now - window[0] >= 60: window.popleft()
+            per_s, per_min = self.rate_limits.get(endpoint, (None, None))
+            last_s = sum(1 for t in window if now - t < 1)
+            if (per_s and last_s >= per_s) or (per_min and len(window) >= per_min):
+                return _err("AB1004")
+            window.append(now)
+            self.peak_rate[endpoint] = max(self.peak_rate[endpoint], last_s + 1)
+
+            if inject:
+                for code, p in self.error_rates.items():
+                    if p and self._rng.random() < p:
+                        if code == "AG8001" and jwt is not None: self._sessions.pop(jwt, None)
+                        return _err(code)
+            return None
+
+    def _reply(self, err, data=None):
+        if err is None: return _ok(data)
+        with self._lock: self.errors[err["errorcode"]] += 1
+        return err
+
+    def _delay(self):
+        if self.latency <= 0: return
+        with self._lock: r = self._rng.uniform(-1, 1)
+        self.sleep(max(0.0, self.latency * (1 + self.jitter * r)))
+
+    # --- Endpoints ---
+    def generate_session(self, api_key, client_code, password, totp):
+        err = self._admit(api_key, "generateSession", inject=False)
+        if err is None and not (client_code and password and totp):
+            err = _err("SIM_LOGIN", "Invalid clientcode or password")
+        self._delay()
+        if err: return self._reply(err)
+        with self._lock:
+            jwt = f"sim-jwt-{len(self._sessions)}-{self._rng.getrandbits(32):08x}"
+            self._sessions[jwt] = None if self.session_ttl is None else self.clock() + self.session_ttl
+        return self._reply(None, {"jwtToken": f"Bearer {jwt}", "refreshToken": f"sim-refresh-{jwt}", "feedToken": f"sim-feed-{jwt}"})
+
+    def candle_data(self, api_key, jwt, params):
+        err, data = self._admit(api_key, "getCandleData", jwt), None
+        if err is None: err, data = self._candles(params)
+        self._delay()
+        return self._reply(err, data)
+
+    def market_data(self, api_key, jwt, mode, exchange_tokens):
+        err = self._admit(api_key, "getMarketData", jwt)
+        tokens = [t for toks in (exchange_tokens or {}).values() for t in toks]
+        if err is None and len(tokens) > QUOTE_BATCH_MAX:
+            err = _err("SIM_BATCH", f"Max {QUOTE_BATCH_MAX} tokens per request")
+        self._delay()
+        if err: return self._reply(err)
+        fetched, unfetched = [], []
+        now = datetime.now(IST)
+        for tok in tokens:
+            if tok not in self.names:
+                unfetched.append({"exchange": "NSE", "symbolToken": tok, "message": "Symbol not found", "errorCode": "SIM_TOKEN"})
+                continue
+            bar = self._bars(tok, "ONE_DAY", now - timedelta(days=7), now)[-1]
+            ltp, prev = bar[4], self._price(tok, now - timedelta(days=1))
+            row = {"exchange": "NSE", "tradingSymbol": f"{self.names[tok]}-EQ", "symbolToken": tok, "ltp": ltp}
+            if mode in ("OHLC", "FULL"):
+                row.update({"open": bar[1], "high": bar[2], "low": bar[3], "close": prev})
+            if mode == "FULL":
+                row.update({"netChange": round(ltp - prev, 2), "percentChange": round((ltp / prev - 1) * 100, 2),
+                            "tradeVolume": bar[5], "exchFeedTime": now.strftime("%d-%b-%Y %H:%M:%S")})
+            fetched.append(row)
+        return self._reply(None, {"fetched": fetched, "unfetched": unfetched})
+
+    # --- Data ---
+    def _candles(self, params):
+        tok, interval = params.get("symboltoken"), params.get("interval")
+        if tok not in self.names: return _err("SIM_TOKEN"), None
+        if interval not in INTERVAL_MINUTES: return _err("SIM_RANGE", f"Invalid interval {interval}"), None
+        try:
+            start, end = _parse_dt(params["fromdate"]), _parse_dt(params["todate"])
+        except Exception:
+            return _err("SIM_RANGE", "Invalid date format"), None
+        if end < start or (end - start).days > MAX_DAYS[interval]:
+            return _err("SIM_RANGE"), None
+        return None, self._bars(tok, interval, start, end)
+
+    def _bars(self, tok, interval, start, end):
+        recorded = self._recorded_bars(tok, interval, start, end)
+        if recorded is not None: return recorded
+        step = INTERVAL_MINUTES[interval]
+        days = pd.bdate_range(start.date(), end.date())
+        if step is None:
+            stamps = [datetime(d.year, d.month, d.day, tzinfo=IST) for d in days]
+        else:
+            per_day = ((SESSION_CLOSE[0] - SESSION_OPEN[0]) * 60 + SESSION_CLOSE[1] - SESSION_OPEN[1]) // step
+            stamps = [datetime(d.year, d.month, d.day, *SESSION_OPEN, tzinfo=IST) + timedelta(minutes=step * i)
+                      for d in days for i in range(per_day)]
+        bars = []
+        for ts in stamps:
+            if step is not None and not (start <= ts <= end): continue
+            c = self._price(tok, ts)
+            o = round(c * (1 + 0.004 * math.sin(ts.timestamp() / 977.0)), 2)
+            h, l = round(max(o, c) * 1.004, 2), round(min(o, c) * 0.996, 2)
+            vol = int(10_000 + (zlib.crc32(f"{tok}{ts.timestamp()}".encode()) % 990_000))
+            bars.append([ts.isoformat(), o, h, l, c, vol])
+        return bars
+
+    def _price(self, tok, ts):
+        # Smooth, deterministic in (token, time): overlapping requests agree on every bar.
+        seed = zlib.crc32(tok.encode())
+        base = 50 + seed % 2000
+        d = ts.timestamp() / 86400.0
+        phase = (seed % 360) * math.pi / 180
+        return round(base * (1 + 0.15 * math.sin(2 * math.pi * d / 97 + phase)
+                             + 0.05 * math.sin(2 * math.pi * d / 13 + 2 * phase)
+                             + 0.005 * math.sin(d * 12.9898 * 96)), 2)
+
+    def _recorded_bars(self, tok, interval, start, end):
+        tf = CACHE_INTERVALS.get(interval)
+        if not self.recorded_dir or tf is None: return None
+        key = (tok, tf)
+        if key not in self._recorded:
+            path = os.path.join(self.recorded_dir, f"{self.names[tok]}_{tf}.parquet")
+            df = None
+            if os.path.exists(path):
+                try:
+                    df = pd.read_parquet(path)
+                    df.index = df.index.tz_localize(IST) if df.index.tz is None else df.index.tz_convert(IST)
+                except Exception:
+                    df = None
+            self._recorded[key] = df
+        df = self._recorded[key]
+        if df is None: return None
+        df = df[(df.index >= pd.Timestamp(start).floor("D")) & (df.index <= pd.Timestamp(end))]
+        return [[ts.isoformat(), float(r.Open), float(r.High), float(r.Low), float(r.Close), int(r.Volume)]
+                for ts, r in zip(df.index, df.itertuples())]
+
+    def stats(self):
+        with self._lock:
+            return {"calls": dict(self.calls), "errors": {k: v for k, v in self.errors.items() if v},
+                    "peak_rate": dict(self.peak_rate)}
+
+    # --- Client factory (AngelOneManager(connect_cls=sim.connect)) ---
+    def connect(self, api_key=None, **kwargs):
+        return SimulatedSmartConnect(self, api_key)
+
+class SimulatedSmartConnect:
+    """The subset of SmartApi.SmartConnect used by angel_connect / angel_data."""
+    def __init__(self, server, api_key=None):
+        self.server = server
+        self.api_key = api_key or "sim-key"
+        self.access_token = None
+        self.refresh_token = None
+
+    def _jwt(self):
+        return (self.access_token or "").replace("Bearer ", "")
+
+    def generateSession(self, clientCode, password, totp):
+        res = self.server.generate_session(self.api_key, clientCode, password, totp)
+        if res["status"]:
+            self.access_token = res["data"]["jwtToken"]
+            self.refresh_token = res["data"]["refreshToken"]
+        return res
+
+    def getProfile(self, refreshToken=None):
+        err = self.server._admit(self.api_key, "getProfile", self._jwt(), inject=False)
+        return self.server._reply(err, {"clientcode": "SIM", "name": "Simulator", "exchanges": ["NSE"]})
+
+    def getCandleData(self, historicDataParams):
+        return self.server.candle_data(self.api_key, self._jwt(), historicDataParams)
+
+    def getMarketData(self, mode, exchangeTokens):
+        return self.server.market_data(self.api_key, self._jwt(), mode, exchangeTokens)
+
+    def terminateSession(self, clientCode=None):
+        with self.server._lock: self.server._sessions.pop(self._jwt(), None)
+        self.access_token = None
+        return _ok(True)
+
+# --- WIRING ---
+def install(sim=None, ctx=None, **kwargs):
+    """
+    Points market_data at a simulator for this context (default: the process context).
+    Returns the simulator; kwargs build a new one when sim is None.
+    """
+    import data_context
+    from angel_connect import AngelOneManager
+    from angel_data import AngelDataManager
+    sim = sim or SmartAPISimulator(**kwargs)
+    ctx = ctx or data_context.get_context()
+
+    client = AngelOneManager(connect_cls=sim.connect)
+    client.api_key, client.client_id, client.password = "sim-key", "SIM", "0000"
+    client.totp_key = "JBSWY3DPEHPK3PXP" # Any base32 secret; the simulator accepts every TOTP
+    client.login()
+    ctx.set("angel_client", client)
+    ctx.set("angel_mgr", AngelDataManager(manager=client, instruments=sim.instrument_master()))
+    return sim
+
+def uninstall(ctx=None):
+    import data_context
+    ctx = ctx or data_context.get_context()
+    ctx.reset("angel_mgr")
+    ctx.reset("angel_client")
+
+# --- LOAD TEST ---
+def run_load_test(n_symbols=100, interval="1d", period="1y", workers=1, **sim_kwargs):
+    """incremental_fetch over a simulated universe in a throwaway cache dir."""
+    import os
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    import market_data
+    symbols = [f"SIM{i}.NS" for i in range(n_symbols)]
+    sim = install(symbols=symbols, **sim_kwargs)
+    tmp, prev_dir = tempfile.mkdtemp(prefix="smartapi_sim_"), market_data.CACHE_DIR
+    market_data.CACHE_DIR = tmp
+    market_data.clear_cache()
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            frames = list(pool.map(lambda s: market_data.incremental_fetch(s, interval, period), symbols))
+        elapsed = time.perf_counter() - start
+    finally:
+        market_data.CACHE_DIR = prev_dir
+        market_data.clear_cache()
+        uninstall()
+        shutil.rmtree(tmp, ignore_errors=True)
+    stats = sim.stats()
+    return {"symbols": n_symbols, "workers": workers, "elapsed_s": round(elapsed, 2),
+            "symbols_per_s": round(n_symbols / elapsed, 2) if elapsed else None,
+            "empty": sum(1 for df in frames if df is None or df.empty), **stats}
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    parser = argparse.ArgumentParser(description="Load-test market_data against the SmartAPI simulator")
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--interval", default="1d", choices=["1d", "1h", "15m"])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--ab1004", type=float, default=0.0, help="Injected AB1004 rate per call")
+    parser.add_argument("--ag8001", type=float, default=0.0, help="Injected AG8001 rate per call")
+    args = parser.parse_args()
+    period = {"1d": "1y", "1h": "1mo", "15m": "5d"}[args.interval]
+    result = run_load_test(args.symbols, args.interval, period, args.workers, latency=args.latency, jitter=0.5,
+                           error_rates={"AB1004": args.ab1004, "AG8001": args.ag8001})
+    print(json.dumps(result, indent=2))
@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from engine import SwingEngine
+from engine_v2 import SwingEngine
 import traceback
 
 def create_poison_data():
@@ -66,7 +66,7 @@ def run_stress_test():
             processed = engine.calculate_indicators(df)
             
             # Compute TQS
-            score = engine.calculate_tqs(processed)
+            score = engine.calculate_tqs_daily_only(processed)
             
             print("✅ PASSED (Handled Gracefully)")
             
@@ -4,7 +4,7 @@ import pandas as pd
 import time
 import pytz
 from datetime import datetime, timedelta
-from engine_v2 import SwingEngine
+from engine_v2 import SwingEngine, RULES
 import bulk_deals
 import sheets_db
 import logging
@@ -17,6 +17,7 @@ socket.setdefaulttimeout(15.0)
 MAX_TRADES = 3
 # 09:10 (Pre-Market), 16:30 (Post-Market) added
 SCHEDULE_TIMES = ["09:10", "09:30", "11:30", "13:00", "15:10", "16:30"]
+PROFILE = os.getenv("SWING_BOT_PROFILE") == "1" # Or --profile: cProfile + tracemalloc each cycle (cache/profiles/)
 
 # Setup Logging
 try:
@@ -70,6 +71,13 @@ def get_run_type(run_time):
 # --- BOT LOGIC ---
 
 def run_cycle(scheduled_time):
+    if PROFILE:
+        import profiling
+        with profiling.Profile(f"swing_bot_{get_run_type(scheduled_time).lower()}"):
+            return _run_cycle(scheduled_time)
+    return _run_cycle(scheduled_time)
+
+def _run_cycle(scheduled_time):
     t_str = scheduled_time.strftime('%H:%M')
     run_type = get_run_type(scheduled_time)
     
@@ -169,7 +177,7 @@ def run_cycle(scheduled_time):
             except Exception as e:
                 logger.error(f"Watchlist Update Failed: {e}")
 
-            high_qual = [x for x in results if x['TQS'] >= 8]
+            high_qual = [x for x in results if x['TQS'] >= RULES['entry_tqs']]
             high_qual.sort(key=lambda x: (-x['TQS'], x['Price']))
             
             # Recs Notification
@@ -241,6 +249,12 @@ def run_cycle(scheduled_time):
 
 
 def main():
+    global PROFILE
+    import argparse
+    parser = argparse.ArgumentParser(description="Swing decision bot")
+    parser.add_argument("--profile", action="store_true", help="Profile each cycle (artifacts in cache/profiles/)")
+    PROFILE = parser.parse_args().profile or PROFILE
+
     # Check if running in Cloud/CI (GitHub Actions)
     is_ci = os.environ.get('CI') == 'true' or os.environ.get('GITHUB_ACTIONS') == 'true'
     
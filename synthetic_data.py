@@ -0,0 +1,266 @@
+import os
+import numpy as np
+import pandas as pd
+
+# --- SYNTHETIC MARKET DATA ---
+# Deterministic multi-timeframe OHLCV for N symbols, in the shapes the rest of
+# the repo reads: raw cache files (market_data, {SYM}_{tf}.parquet) and the
+# aggregated snapshot (ui_{tf}.parquet, as run_engine_job.aggregate_and_swap
+# writes it). No network; the same (seed, symbol index) always gives the same
+# bars, and adding symbols does not change the existing ones.
+#
+#   15m  NSE session bars (09:15-15:15 starts) for the last `intraday_days` sessions
+#   1h   15m bars grouped into hourly buckets anchored at 09:15 (last bucket 15:15-15:30)
+#   1d   `days` sessions; sessions covered by 15m are aggregated from it, so the
+#        timeframes agree where they overlap
+#
+# Anomalies (ANOMALIES: per-bar rates for gap / zero_volume, per-symbol for
+# halt / split, per symbol and timeframe for nan_burst) are applied on top and
+# listed in the returned events so tests know what to expect:
+#   gap          single bars missing from one timeframe (feed gaps)
+#   halt         2-10 sessions with no bars in any timeframe; reopens with a jump
+#   split        unadjusted split: prices / ratio and volume * ratio from that session on
+#   zero_volume  bars with no trades (Volume 0, OHLC at the previous close)
+#   nan_burst    3-12 consecutive bars of NaN OHLCV in one timeframe
+# Market holidays (fixed national dates + seeded extras) are left out of the calendar.
+
+TZ = "Asia/Kolkata"
+BARS_15M = 25 # 09:15 ... 15:15
+FIXED_HOLIDAYS = ["01-26", "05-01", "08-15", "10-02", "12-25"] # MM-DD, when on a weekday
+EXTRA_HOLIDAYS_PER_YEAR = 8 # Festival holidays (seeded, market-wide)
+
+ANOMALIES = {"gap": 0.0005, "halt": 0.05, "split": 0.03, "zero_volume": 0.0005, "nan_burst": 0.02}
+
+# --- CALENDAR ---
+def trading_days(days, end="2025-06-30", seed=0):
+    """Last `days` NSE sessions up to `end` (weekdays minus holidays), tz-aware midnight stamps."""
+    end = pd.Timestamp(end).normalize()
+    start = end - pd.Timedelta(days=int(days * 1.6) + 30) # Enough weekdays to cover holidays
+    cal = pd.bdate_range(start, end)
+    return cal[~cal.isin(holidays(cal[0].year, end.year, seed))][-days:].tz_localize(TZ)
+
+def holidays(first_year, last_year, seed=0):
+    out = []
+    for year in range(first_year, last_year + 1):
+        fixed = pd.to_datetime([f"{year}-{d}" for d in FIXED_HOLIDAYS])
+        out.extend(d for d in fixed if d.weekday() < 5)
+        rng = np.random.default_rng([seed, year])
+        weekdays = pd.bdate_range(f"{year}-01-01", f"{year}-12-31")
+        out.extend(weekdays[rng.choice(len(weekdays), EXTRA_HOLIDAYS_PER_YEAR, replace=False)])
+    return pd.DatetimeIndex(sorted(set(out)))
+
+def _intraday_index(sessions):
+    """15m bar starts for each session: (len(sessions) * BARS_15M) stamps."""
+    offsets = pd.to_timedelta(555 + 15 * np.arange(BARS_15M), unit="min") # 09:15 = 555 min
+    return pd.DatetimeIndex((sessions.repeat(BARS_15M) + np.tile(offsets, len(sessions))), name="Date")
+
+# --- ONE SYMBOL ---
+def generate_symbol(ticker, sessions, intraday_days=60, seed=0, index=0, anomalies=None):
+    """({tf: df}, events) for one symbol over `sessions` (see trading_days)."""
+    rng = np.random.default_rng([seed, index])
+    n = len(sessions)
+    n_intra = min(intraday_days, n)
+
+    # Daily path: fat-tailed returns with a slow drift regime
+    vol = rng.uniform(0.010, 0.035)
+    drift = rng.normal(0.0003, 0.0008) + 0.001 * np.sin(np.linspace(0, rng.uniform(1, 6), n) + rng.uniform(0, 6))
+    rets = drift + vol * rng.standard_t(4, n) / np.sqrt(2)
+    close = rng.uniform(30, 4000) * np.exp(np.cumsum(rets))
+    prev = np.concatenate(([close[0] / np.exp(rets[0])], close[:-1]))
+    opn = prev * np.exp(rng.normal(0, 0.3 * vol, n))
+    wick = np.abs(rng.normal(0, 0.5 * vol, (2, n)))
+    high = np.maximum(opn, close) * np.exp(wick[0])
+    low = np.minimum(opn, close) * np.exp(-wick[1])
+    volume = rng.lognormal(np.log(rng.uniform(5e4, 5e6)), 0.4, n) * (1 + 2 * np.abs(rets) / vol)
+
+    # 15m: Brownian bridge from each session's open to its close, U-shaped volume
+    k = n - n_intra
+    steps = rng.normal(0, vol / np.sqrt(BARS_15M) * 0.8, (n_intra, BARS_15M))
+    walk = np.cumsum(steps, axis=1)
+    t = np.arange(1, BARS_15M + 1) / BARS_15M
+    lo, lc = np.log(opn[k:])[:, None], np.log(close[k:])[:, None]
+    c15 = np.exp(lo + walk - t * walk[:, -1:] + t * (lc - lo))
+    o15 = np.concatenate((opn[k:, None], c15[:, :-1]), axis=1)
+    w15 = np.abs(rng.normal(0, 0.25 * vol / np.sqrt(BARS_15M), (2, n_intra, BARS_15M)))
+    h15 = np.maximum(o15, c15) * np.exp(w15[0])
+    l15 = np.minimum(o15, c15) * np.exp(-w15[1])
+    shape = 1 + 1.5 * ((np.arange(BARS_15M) - 12) / 12) ** 2
+    share = shape * rng.lognormal(0, 0.3, (n_intra, BARS_15M))
+    v15 = (volume[k:, None] * share / share.sum(axis=1, keepdims=True)).round()
+
+    # Intraday sessions: daily bar is the aggregate of its 15m bars
+    high[k:], low[k:], volume[k:] = h15.max(axis=1), l15.min(axis=1), v15.sum(axis=1)
+
+    d1 = pd.DataFrame({"Open": opn, "High": high, "Low": low, "Close": close, "Volume": volume.round()},
+                      index=pd.DatetimeIndex(sessions, name="Date"))
+    m15 = pd.DataFrame({"Open": o15.ravel(), "High": h15.ravel(), "Low": l15.ravel(), "Close": c15.ravel(),
+                        "Volume": v15.ravel()}, index=_intraday_index(sessions[k:]))
+    frames, events = {"1d": d1, "15m": m15}, []
+    rates = ANOMALIES if anomalies is None else anomalies
+    _apply_corporate_events(ticker, frames, sessions, vol, rng, rates, events)
+    frames["1h"] = to_hourly(frames["15m"])
+    frames = {tf: frames[tf] for tf in ("1d", "1h", "15m")}
+    _apply_bar_faults(ticker, frames, rng, rates, events)
+    return frames, events
+
+def to_hourly(m15):
+    """15m bars -> NSE hourly bars (09:15, 10:15, ... 15:15), skipping all-NaN buckets."""
+    if m15.empty: return m15.copy()
+    minutes = (m15.index - m15.index.normalize()).total_seconds() // 60
+    start = m15.index.normalize() + pd.to_timedelta(555 + (minutes - 555) // 60 * 60, unit="min")
+    g = m15.groupby(pd.DatetimeIndex(start, name="Date"))
+    h1 = pd.DataFrame({"Open": g["Open"].first(), "High": g["High"].max(), "Low": g["Low"].min(),
+                       "Close": g["Close"].last(), "Volume": g["Volume"].sum(min_count=1)})
+    return h1.dropna(how="all")
+
+# --- ANOMALIES ---
+def _apply_corporate_events(ticker, frames, sessions, vol, rng, rates, events):
+    """Splits and halts: whole sessions, consistent across timeframes (1h is derived afterwards)."""
+    n = len(sessions)
+    day_of = {tf: df.index.normalize() for tf, df in frames.items()}
+
+    if rng.random() < rates.get("split", 0) and n > 40:
+        at = sessions[rng.integers(20, n - 5)]
+        ratio = int(rng.choice([2, 5, 10]))
+        for tf, df in frames.items():
+            after = day_of[tf] >= at
+            df.loc[after, ["Open", "High", "Low", "Close"]] /= ratio
+            df.loc[after, "Volume"] *= ratio
+        events.append({"symbol": ticker, "kind": "split", "tf": "all", "start": at, "ratio": ratio})
+
+    if rng.random() < rates.get("halt", 0) and n > 40:
+        i = int(rng.integers(10, n - 15))
+        halted = sessions[i:i + int(rng.integers(2, 11))]
+        jump = float(np.exp(rng.normal(0, 3 * vol)))
+        for tf, df in list(frames.items()):
+            after = day_of[tf] > halted[-1]
+            df.loc[after, ["Open", "High", "Low", "Close"]] *= jump
+            keep = ~day_of[tf].isin(halted)
+            frames[tf], day_of[tf] = df[keep], day_of[tf][keep]
+        events.append({"symbol": ticker, "kind": "halt", "tf": "all", "start": halted[0], "end": halted[-1],
+                       "jump": round(jump, 4)})
+
+def _apply_bar_faults(ticker, frames, rng, rates, events):
+    """Gaps, zero-volume bars and NaN bursts, independently per timeframe."""
+    for tf in list(frames):
+        df = frames[tf]
+        p = rates.get("gap", 0)
+        if p:
+            drop = rng.random(len(df)) < p
+            drop[0] = drop[-1] = False # Keep the span stable
+            for ts in df.index[drop]: events.append({"symbol": ticker, "kind": "gap", "tf": tf, "start": ts})
+            df = df[~drop]
+
+        p = rates.get("zero_volume", 0)
+        if p and len(df) > 1:
+            rows = np.flatnonzero(rng.random(len(df)) < p)
+            rows = rows[rows > 0]
+            if len(rows):
+                df = df.copy()
+                prev_close = df["Close"].to_numpy()[rows - 1]
+                for c in ("Open", "High", "Low", "Close"): df.iloc[rows, df.columns.get_loc(c)] = prev_close
+                df.iloc[rows, df.columns.get_loc("Volume")] = 0
+                for ts in df.index[rows]: events.append({"symbol": ticker, "kind": "zero_volume", "tf": tf, "start": ts})
+
+        if rng.random() < rates.get("nan_burst", 0) and len(df) > 30:
+            start = int(rng.integers(1, len(df) - 15))
+            length = int(rng.integers(3, 13))
+            df = df.copy()
+            df.iloc[start:start + length] = np.nan
+            events.append({"symbol": ticker, "kind": "nan_burst", "tf": tf, "start": df.index[start],
+                           "end": df.index[start + length - 1]})
+        frames[tf] = df
+
+# --- UNIVERSE ---
+def iter_universe(n_symbols=250, days=500, intraday_days=60, end="2025-06-30", seed=0, anomalies=None, symbols=None):
+    """Yields (ticker, {tf: df}, events) one symbol at a time (bounded memory for big universes)."""
+    tickers = symbols or [f"SYN{i}.NS" for i in range(n_symbols)]
+    sessions = trading_days(days, end, seed)
+    for i, ticker in enumerate(tickers):
+        frames, events = generate_symbol(ticker, sessions, intraday_days, seed, i, anomalies)
+        yield ticker, frames, events
+
+def generate(n_symbols=250, days=500, intraday_days=60, end="2025-06-30", seed=0, anomalies=None, symbols=None):
+    """({tf: {ticker: df}}, events) for the whole universe."""
+    panel, events = {"1d": {}, "1h": {}, "15m": {}}, []
+    for ticker, frames, ev in iter_universe(n_symbols, days, intraday_days, end, seed, anomalies, symbols):
+        for tf, df in frames.items(): panel[tf][ticker] = df
+        events.extend(ev)
+    return panel, events
+
+def _items(panel_or_iter):
+    if isinstance(panel_or_iter, dict):
+        tickers = list(panel_or_iter.get("1d", {}))
+        return ((t, {tf: panel_or_iter[tf][t] for tf in panel_or_iter if t in panel_or_iter[tf]}, [])
+                for t in tickers)
+    return panel_or_iter
+
+# --- WRITERS ---
+def write_raw_cache(data, raw_dir=None, batch=500):
+    """
+    Raw cache files in market_data's storage schema (to_storage + checksum sidecars).
+    data: generate()'s panel or iter_universe(). Returns the number of files written.
+    """
+    import market_data
+    raw_dir = raw_dir or market_data.CACHE_DIR
+    os.makedirs(raw_dir, exist_ok=True)
+    prev_dir, market_data.CACHE_DIR = market_data.CACHE_DIR, raw_dir # get_cache_path resolves against it
+    try:
+        written, pending = 0, {}
+        for ticker, frames, _ in _items(data):
+            for tf, df in frames.items():
+                path = market_data.get_cache_path(ticker, tf)
+                pending[path] = market_data.to_storage(df, tf)
+            if len(pending) >= batch:
+                written += market_data.write_cache_files(pending)
+                pending = {}
+        return written + market_data.write_cache_files(pending)
+    finally:
+        market_data.CACHE_DIR = prev_dir
+
+def write_snapshot(data, cache_dir="cache"):
+    """
+    ui_{tf}.parquet as aggregate_and_swap writes them (Symbol category + Date MultiIndex, zstd),
+    plus the multi-TF alignment index (ui_align.parquet).
+    """
+    import market_data
+    import mtf_align
+    os.makedirs(cache_dir, exist_ok=True)
+    parts = {"1d": [], "1h": [], "15m": []}
+    bar_index = {tf: {} for tf in parts}
+    for ticker, frames, _ in _items(data):
+        for tf, df in frames.items():
+            df = market_data.to_storage(df, tf)
+            if df is None or df.empty: continue
+            bar_index[tf][ticker] = df.index
+            df = df.reset_index()
+            df.insert(0, "Symbol", ticker)
+            parts[tf].append(df)
+    paths = []
+    for tf, dfs in parts.items():
+        if not dfs: continue
+        full = pd.concat(dfs, ignore_index=True)
+        full["Symbol"] = full["Symbol"].astype("category")
+        full = full.set_index(["Symbol", "Date"])
+        path = os.path.join(cache_dir, f"ui_{tf}.parquet")
+        full.to_parquet(path, **market_data.PARQUET_OPTIONS)
+        paths.append(path)
+    paths.append(mtf_align.write(mtf_align.build(bar_index), os.path.join(cache_dir, mtf_align.ALIGN_FILE)))
+    return paths
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Write a synthetic universe in cache/snapshot formats")
+    parser.add_argument("--symbols", type=int, default=250)
+    parser.add_argument("--days", type=int, default=500)
+    parser.add_argument("--intraday-days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic_cache", help="Directory that gets raw/ and ui_*.parquet")
+    parser.add_argument("--clean", action="store_true", help="No anomalies")
+    args = parser.parse_args()
+    kw = dict(days=args.days, intraday_days=args.intraday_days, seed=args.seed, anomalies={} if args.clean else None)
+    panel, events = generate(args.symbols, **kw)
+    n = write_raw_cache(panel, os.path.join(args.out, "raw"))
+    write_snapshot(panel, args.out)
+    kinds = pd.Series([e["kind"] for e in events]).value_counts().to_dict() if events else {}
+    print(f"Wrote {n} raw files + snapshot to {args.out} ({args.symbols} symbols). Anomalies: {kinds}")
@@ -0,0 +1,47 @@
+import json
+import pytest
+import api_ledger
+
+@pytest.fixture(autouse=True)
+def clean():
+    api_ledger.clear()
+    yield
+    api_ledger.clear()
+
+def test_summary_rates_and_ring(tmp_path, monkeypatch):
+    # 10 candle calls in 2 s (peak 6 within one second), 2 of them rate-limited
+    for i in range(10):
+        code = "AB1004" if i in (3, 4) else ""
+        api_ledger.record("getCandleData", 0.1, not code, code, symbol="A", retries=int(i == 4),
+                          nbytes=100, ts=120.0 + (i * 0.15 if i < 6 else 1.5 + i * 0.05))
+    s = api_ledger.summarize(api_ledger.entries())
+    candles = s["endpoints"]["getCandleData"]
+    assert s["calls"] == 10 and s["ab1004"] == 2 and s["ab1004_pct"] == 20.0 and s["errors"] == {"AB1004": 2}
+    assert candles["peak_rps"] == 6 and candles["peak_pct_of_ceiling"] == 200 and candles["bytes"] == 1000
+    assert s["per_minute"][0]["requests"] == 10 and s["per_minute"][0]["ab1004"] == 2
+    assert api_ledger.summarize([]) is None
+
+    monkeypatch.setattr(api_ledger, "_ring", api_ledger.deque(api_ledger.entries(), maxlen=4))
+    api_ledger.record("getMarketData", 0.2, True)
+    saved = json.load(open(api_ledger.save(str(tmp_path / "ledger.json"), mode="full")))
+    assert len(saved["entries"]) == 4 and saved["dropped"] == 7 and saved["mode"] == "full"
+
+def test_retries_recorded_through_angel_data(tmp_path, monkeypatch):
+    import angel_data
+    import data_context
+    import smartapi_sim
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(angel_data.time, "sleep", lambda s: None)
+    clock = lambda: 1000.0 # Frozen: the 1/s window never resets
+    ctx = data_context.InProcessContext()
+    smartapi_sim.install(symbols=["INFY.NS", "TCS.NS"], ctx=ctx, clock=clock,
+                         rate_limits={"getCandleData": (1, None), "generateSession": (None, None)})
+    mgr = ctx.get("angel_mgr")
+    assert not mgr.fetch_hist_data("INFY.NS", days=30).empty
+    assert mgr.fetch_hist_data("TCS.NS", days=30).empty # AB1004 on every attempt
+
+    rows = [r for r in api_ledger.entries() if r["endpoint"] == "getCandleData"]
+    assert [(r["symbol"], r["code"], r["retries"]) for r in rows] == [
+        ("INFY.NS", "", 0), ("TCS.NS", "AB1004", 0), ("TCS.NS", "AB1004", 1), ("TCS.NS", "AB1004", 2)]
+    assert rows[0]["bytes"] > rows[1]["bytes"] > 0 and rows[0]["interval"] == "ONE_DAY"
+    assert [r["endpoint"] for r in api_ledger.entries()][0] == "generateSession"
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+import pytest
+import backtester
+import engine_v2
+
+@pytest.fixture(scope="module")
+def daily():
+    import market_data
+    import synthetic_data
+    panel, _ = synthetic_data.generate(n_symbols=40, days=300, intraday_days=5, seed=11)
+    return {sym: market_data.to_storage(df, "1d") for sym, df in panel["1d"].items()}
+
+def test_panel_matches_engine_indicators(daily):
+    eng = backtester._engine()
+    panel = backtester.load_panel("1d", {"1d": daily})
+    assert panel.shape[1] == len(daily)
+    for col, sym in enumerate(panel.symbols[:10]):
+        ind = eng.calculate_indicators(daily[sym])
+        rows = panel.index.get_indexer(backtester._naive(ind.index))
+        for f in backtester.FIELDS:
+            assert np.array_equal(panel[f][rows, col], ind[f].to_numpy(float), equal_nan=True), (sym, f)
+
+def test_signals_match_engine_rules(daily):
+    eng = backtester._engine()
+    panel = backtester.load_panel("1d", {"1d": daily})
+    sig = backtester.signals(panel)
+    rng = np.random.default_rng(0)
+    for _ in range(60):
+        col = int(rng.integers(len(panel.symbols)))
+        sym = panel.symbols[col]
+        ind = eng.calculate_indicators(daily[sym].iloc[:int(rng.integers(backtester.MIN_BARS, len(daily[sym]))) + 1])
+        t = panel.index.get_loc(backtester._naive(ind.index)[-1])
+        tqs = eng.calculate_tqs_daily_only(ind)
+        exits = eng.check_exits(pd.DataFrame([{"Symbol": sym}]), data_map={"1h": {sym: ind}})
+        assert sig["tqs"][t, col] == tqs
+        assert engine_v2.EXIT_SIGNALS[sig["exit"][t, col]] == (exits[0]["Signal"] if exits else "HOLD")
+        assert engine_v2.CLASSIFY_TAGS[sig["tag"][t, col]] == eng.classify_trade(ind.iloc[-1], tqs)[0]
+
+def test_no_lookahead(daily):
+    base = backtester.run({"1d": daily})
+    cutoff = base["equity"].index[200]
+    rng = np.random.default_rng(1)
+    future = {}
+    for sym, df in daily.items():
+        df = df.copy()
+        later = backtester._naive(df.index) > cutoff
+        df.loc[later, ["Open", "High", "Low", "Close"]] *= rng.uniform(0.5, 1.5, (later.sum(), 1)).astype("float32")
+        future[sym] = df
+    changed = backtester.run({"1d": future})
+
+    done = lambda res: res["trades"][res["trades"]["exit_time"].notna() & (res["trades"]["exit_time"] <= cutoff)]
+    assert len(done(base)) > 5
+    pd.testing.assert_frame_equal(done(base).reset_index(drop=True), done(changed).reset_index(drop=True))
+    assert base["equity"][:cutoff].equals(changed["equity"][:cutoff])
+
+def test_slots_and_fills(daily):
+    panel = backtester.load_panel("1d", {"1d": daily})
+    res = backtester.run(panel=panel, max_trades=2)
+    trades = res["trades"]
+    assert res["stats"]["trades"] > 0 and res["stats"]["open"] <= 2
+    for when in panel.index:
+        held = (trades["entry_time"] <= when) & (trades["exit_time"].isna() | (trades["exit_time"] > when))
+        assert held.sum() <= 2
+    for tr in trades.itertuples():
+        row, col = panel.index.get_loc(tr.entry_time), panel.symbols.index(tr.symbol)
+        assert tr.entry_price == panel["Open"][row, col] and tr.tqs >= engine_v2.RULES["entry_tqs"]
+
+def test_rule_overrides_match_engine(daily, monkeypatch):
+    rules = {"light_rsi_low": 45, "light_rsi_high": 65, "exit_rsi": 70, "exit_rev_tqs": 5, "entry_tqs": 7}
+    eng = backtester._engine()
+    panel = backtester.load_panel("1d", {"1d": daily})
+    sig = backtester.signals(panel, rules)
+    assert not np.array_equal(sig["exit"], backtester.signals(panel)["exit"])
+    monkeypatch.setattr(engine_v2, "RULES", engine_v2.rules_with(rules))
+    for col, sym in enumerate(panel.symbols[:10]):
+        ind = eng.calculate_indicators(daily[sym].iloc[:150])
+        t = panel.index.get_loc(backtester._naive(ind.index)[-1])
+        tqs = eng.calculate_tqs_daily_only(ind)
+        exits = eng.check_exits(pd.DataFrame([{"Symbol": sym}]), data_map={"1h": {sym: ind}})
+        assert sig["tqs"][t, col] == tqs
+        assert engine_v2.EXIT_SIGNALS[sig["exit"][t, col]] == (exits[0]["Signal"] if exits else "HOLD")
+        assert engine_v2.CLASSIFY_TAGS[sig["tag"][t, col]] == eng.classify_trade(ind.iloc[-1], tqs)[0]
+
+def test_result_cache_reuses_untouched_layers(daily, tmp_path):
+    cache = str(tmp_path / "bt")
+    first = backtester.run({"1d": daily}, cache_dir=cache)
+    assert first["timings"]["cache"]["result"] == "miss" and first["timings"]["cache"]["signals_reused"] == 0
+    again = backtester.run({"1d": daily}, cache_dir=cache)
+    assert again["timings"]["cache"] == {"panel": first["timings"]["cache"]["panel"], "result": "hit"}
+    pd.testing.assert_frame_equal(again["trades"], first["trades"])
+    pd.testing.assert_series_equal(again["equity"], first["equity"])
+    assert again["stats"] == first["stats"] and again["shape"] == first["shape"]
+
+    exits = backtester.run({"1d": daily}, cache_dir=cache, rules={"exit_rev_tqs": 6})["timings"]["cache"]
+    assert exits["signals_computed"] == 1 and exits["signals_reused"] == 3 # valid, tqs and tags reused
+    plain = backtester.run({"1d": daily}, rules={"exit_rev_tqs": 6})
+    cached = backtester.run({"1d": daily}, cache_dir=cache, rules={"exit_rev_tqs": 6})
+    pd.testing.assert_frame_equal(cached["trades"], plain["trades"])
+
+    changed = dict(daily, **{sym: df.iloc[:-1] for sym, df in list(daily.items())[:1]})
+    assert backtester.panel_key("1d", {"1d": changed}) != first["timings"]["cache"]["panel"]
+    assert backtester.panel_key("1d", {"1d": daily}, symbols=list(daily)[:5]) != first["timings"]["cache"]["panel"]
+
+def test_scoring_code_change_misses_result_cache(daily, tmp_path, monkeypatch):
+    cache = str(tmp_path / "bt")
+    assert backtester.run({"1d": daily}, cache_dir=cache)["stats"]["trades"] > 0
+    never = lambda b, rules=None: np.zeros(np.shape(b["Close"]), dtype=int) # Never reaches the entry score
+    monkeypatch.setattr(engine_v2, "tqs_daily_only_bars", never)
+    res = backtester.run({"1d": daily}, cache_dir=cache)
+    assert res["timings"]["cache"]["result"] == "miss" and res["stats"]["trades"] == 0
+
+def test_multi_tf_signals_match_engine_on_completed_bars(tmp_path, monkeypatch):
+    import market_data
+    import mtf_align
+    import synthetic_data
+    data, _ = synthetic_data.generate(n_symbols=12, days=120, intraday_days=8, seed=4)
+    frames = {tf: {s: market_data.to_storage(df, tf) for s, df in data[tf].items()} for tf in data}
+    eng = backtester._engine()
+    panel = backtester.load_mtf_panel(frames)
+    sig = backtester.signals(panel, {"light_tqs": 3})
+    monkeypatch.setattr(engine_v2, "RULES", engine_v2.rules_with({"light_tqs": 3}))
+    rng = np.random.default_rng(2)
+    deep = 0
+    for t, col in zip(rng.integers(len(panel.index), size=80), rng.integers(len(panel.symbols), size=80)):
+        sym = panel.symbols[col]
+        if panel["Bar"][t, col] < 0: continue
+        end = mtf_align.bar_ends(panel.index[t:t + 1], "15m")[0]
+        cut = lambda tf: frames[tf][sym][np.asarray(mtf_align.bar_ends(frames[tf][sym].index, tf) <= end)]
+        m15, h1, d1 = (eng.calculate_indicators(cut(tf)) for tf in ("15m", "1h", "1d"))
+        light = eng.calculate_tqs_daily_only(d1)
+        has_1h = h1 is not None and not h1.empty
+        tqs = eng.calculate_tqs_multi_tf(m15, h1, d1) if has_1h and light >= 3 else light
+        deep += has_1h and light >= 3
+        exits = eng.check_exits(pd.DataFrame([{"Symbol": sym}]), data_map={"1h": {sym: h1}}) if has_1h else []
+        assert sig["tqs"][t, col] == tqs, (sym, panel.index[t])
+        assert engine_v2.EXIT_SIGNALS[sig["exit"][t, col]] == (exits[0]["Signal"] if exits else "HOLD")
+        assert engine_v2.CLASSIFY_TAGS[sig["tag"][t, col]] == eng.classify_trade(d1.iloc[-1], tqs)[0]
+    assert deep > 10
+
+    # Snapshot on disk: same panel through the stored alignment index (no searching)
+    synthetic_data.write_snapshot(data, str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    stored = backtester.load_mtf_panel()
+    assert stored.symbols == panel.symbols and stored.mode == "multi_tf"
+    for name in ("h1_Close", "d1_RSI", "d1_ok", "h1_ok"):
+        np.testing.assert_array_equal(stored[name], panel[name])
+    res = backtester.run(mode="multi_tf", cache_dir=str(tmp_path / "bt"))
+    assert res["shape"] == panel.shape and res["equity"].index.equals(panel.index)
@@ -0,0 +1,21 @@
+import bench_pipeline
+
+def run_of(ms, mb, symbols=250):
+    return {"symbols": symbols, "stages": {"scan": {"ms": ms, "peak_mb": mb}}}
+
+def test_compare_flags_regressions_only():
+    base = {"mem_source": "rss", "runs": [run_of(1000.0, 40.0)]}
+    ok = {"mem_source": "rss", "runs": [run_of(1200.0, 44.0), run_of(9999.0, 99.0, symbols=1000)]}
+    assert bench_pipeline.compare(ok, base) == [] # Within tolerance; 1000 has no baseline
+
+    slow = {"mem_source": "rss", "runs": [run_of(1400.0, 80.0)]}
+    assert len(bench_pipeline.compare(slow, base)) == 2
+    # Memory measured differently is not comparable
+    assert len(bench_pipeline.compare(dict(slow, mem_source="tracemalloc"), base)) == 1
+
+def test_run_size_covers_every_stage(tmp_path):
+    run = bench_pipeline.run_size(12, repeats=1, workdir=str(tmp_path))
+    assert list(run["stages"]) == ["aggregate_and_swap", "load_snapshot", "calculate_indicators",
+                                   "get_weekly_rankings", "scan", "check_exits", "update_watchlist"]
+    assert all(s["ms"] > 0 for s in run["stages"].values())
+    assert (tmp_path / "cache" / "ui_1d.parquet").exists() and (tmp_path / "db.sqlite").exists()
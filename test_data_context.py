@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+import data_context
+import market_data
+
+class FakeAngel:
+    def __init__(self):
+        self.calls = 0
+
+    def fetch_hist_data(self, symbol, interval, days):
+        self.calls += 1
+        idx = pd.date_range("2025-01-01", periods=3, freq="D")
+        return pd.DataFrame({"Open": 1.0, "High": 2.0, "Low": 0.5, "Close": 1.5, "Volume": 10}, index=idx)
+
+@pytest.fixture
+def ctx(tmp_path, monkeypatch):
+    ctx = data_context.InProcessContext(secrets_file=str(tmp_path / "secrets.toml"))
+    prev = data_context.set_context(ctx)
+    monkeypatch.setattr(market_data, "CACHE_DIR", str(tmp_path))
+    market_data.clear_cache()
+    yield ctx
+    data_context.set_context(prev)
+
+def test_headless_fetch_uses_in_process_state(ctx):
+    angel = FakeAngel()
+    ctx.set("angel_mgr", angel)
+
+    df = market_data.incremental_fetch("TCS.NS", "1d")
+    assert len(df) == 3
+    assert market_data.incremental_fetch("TCS.NS", "1d") is df # memory cache hit
+    assert angel.calls == 1
+
+    market_data.clear_cache()
+    market_data.incremental_fetch("TCS.NS", "1d")
+    assert angel.calls == 2
+
+def test_secrets_read_without_streamlit(ctx, tmp_path):
+    (tmp_path / "secrets.toml").write_text('discord_webhook = "http://hook"\n[passwords]\nadmin = "x"\n')
+    assert data_context.get_secret("discord_webhook") == "http://hook"
+    assert data_context.get_secret("passwords")["admin"] == "x"
+    assert data_context.get_secret("missing") is None
+
+def test_get_or_create_builds_once(ctx):
+    made = []
+    for _ in range(3):
+        ctx.get_or_create("k", lambda: made.append(1) or "v")
+    assert made == [1] and ctx.get("k") == "v"
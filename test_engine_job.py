@@ -0,0 +1,148 @@
+import sys
+import json
+import pytest
+
+class FakeEngine:
+    def calculate_tqs_daily_only(self, df): return 6
+    def score_symbol(self, ticker, d1, h1, m15): return {"tqs": 9}
+    def get_weekly_rankings(self, d1): return {}
+    def finalize_scan(self, scored, weekly): return [{"Symbol": t, "TQS": s["tqs"]} for t, s in scored.items()]
+    def check_exits(self, df, data_map=None): return []
+
+class Killed(BaseException):
+    """Stands in for the process being killed (not caught by the job's except Exception)."""
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # Importing the job creates cache/ and its log file in cwd
+    import pandas as pd
+    import engine_v2
+    import market_data
+    import sheets_db
+    import run_engine_job as job
+
+    monkeypatch.setattr(job, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(job, "STATUS_FILE", str(tmp_path / "status.json"))
+    monkeypatch.setattr(job, "CHECKPOINT_FILE", str(tmp_path / "checkpoint.json"))
+    monkeypatch.setattr(job, "CHECKPOINT_EVERY", 1)
+    monkeypatch.setattr(job, "CHECKPOINT", None)
+    monkeypatch.setattr(job.time, "sleep", lambda s: None)
+    monkeypatch.setattr(job, "get_universe", lambda mode="full": ["A.NS", "B.NS", "C.NS"] if mode == "full" else [])
+    monkeypatch.setattr(engine_v2, "SwingEngine", FakeEngine)
+    monkeypatch.setattr(sheets_db, "save_scan_results", lambda r: None)
+    monkeypatch.setattr(sheets_db, "fetch_scan_results", lambda: ([], None, None))
+    monkeypatch.setattr(sheets_db, "fetch_portfolio", lambda: [])
+
+    job.calls = []
+    job.kill_on = None
+    def fetch(ticker, interval, period):
+        if (ticker, interval) == job.kill_on: raise Killed()
+        job.calls.append((ticker, interval))
+        return pd.DataFrame({"Close": range(60)})
+    monkeypatch.setattr(market_data, "incremental_fetch", fetch)
+    monkeypatch.setattr(job, "aggregate_and_swap", lambda u, m: job.calls.append(("aggregate", None)))
+    return job
+
+def run(job, monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["run_engine_job.py", "--mode", "full", *args])
+    job.main()
+
+def test_resume_skips_completed_symbols(job, monkeypatch, tmp_path):
+    job.kill_on = ("C.NS", "1d")
+    with pytest.raises(Killed):
+        run(job, monkeypatch)
+    cp = json.loads((tmp_path / "checkpoint.json").read_text())
+    assert cp["done"]["daily"] == ["A.NS", "B.NS"] and cp["candidates"] == ["A.NS", "B.NS"]
+
+    job.kill_on, job.calls = None, []
+    run(job, monkeypatch, "--resume")
+    assert [c for c in job.calls if c[1] == "1d"] == [("C.NS", "1d")]
+    assert ("aggregate", None) in job.calls
+    assert not (tmp_path / "checkpoint.json").exists()
+    status = json.loads((tmp_path / "status.json").read_text())
+    assert status["state"] == "COMPLETED" and not status["resumable"]
+
+def test_fresh_run_ignores_old_checkpoint(job, monkeypatch):
+    job.kill_on = ("B.NS", "1h")
+    with pytest.raises(Killed):
+        run(job, monkeypatch)
+    job.kill_on, job.calls = None, []
+    run(job, monkeypatch) # no --resume
+    assert len([c for c in job.calls if c[1] == "1d"]) == 3
+
+def test_pipeline_overlaps_stages(job, monkeypatch):
+    import market_data
+    events = []
+    def fetch(ticker, interval, period):
+        events.append((ticker, interval))
+        import pandas as pd
+        return pd.DataFrame({"Close": range(60)})
+    monkeypatch.setattr(market_data, "incremental_fetch", fetch)
+    monkeypatch.setattr(job, "API_RATE", 1000.0)
+    universe = [f"S{i}.NS" for i in range(20)]
+    cp = job.Checkpoint("full", universe)
+
+    frames, scored = job.run_pipeline(universe, set(), cp, FakeEngine(), "full")
+    assert sorted(scored) == sorted(universe)
+    assert len(frames["1h"]) == 20 and cp.candidates == set(universe)
+    # Intraday fetches start while daily fetches are still running
+    first_deep = events.index(("S0.NS", "1h"))
+    assert first_deep < events.index(("S19.NS", "1d"))
+
+def test_rate_limiter_paces_calls(job, monkeypatch):
+    waits = []
+    monkeypatch.setattr(job.time, "sleep", waits.append)
+    limiter = job.RateLimiter(rate=50)
+    for _ in range(6): limiter.wait()
+    # First call is free; the rest queue up 1/rate apart (sleep is stubbed, so delays accumulate)
+    assert len(waits) == 5 and waits[-1] == pytest.approx(5 / 50, abs=0.01)
+
+def test_progress_throttles_status_writes(job, monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(job.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(job, "PROGRESS", job.Progress("full", interval=2.0))
+    p = job.PROGRESS
+    p.start("Scanning", 100)
+    for i in range(50):
+        clock[0] += 0.1 # 20 symbols/s
+        p.request()
+        p.advance()
+    p.error()
+    # One write on start, then at most one per interval over 5s
+    assert p.writes <= 1 + 3
+
+    p.flush()
+    status = json.loads(open(job.STATUS_FILE).read())
+    stats = status["stats"]
+    assert status["progress"] == "Scanning 50/100 (50%)"
+    assert (stats["phase"], stats["done"], stats["total"], stats["errors"]) == ("Scanning", 50, 100, 1)
+    assert stats["eta_s"] == 5 and stats["req_per_s"] == 10.0
+
+def test_concurrent_status_writes_stay_whole(job, monkeypatch):
+    import threading
+    failures = []
+    monkeypatch.setattr(job.logger, "error", failures.append)
+    monkeypatch.setattr(job, "PROGRESS", job.Progress("full", interval=0))
+    p = job.PROGRESS
+    p.start("Scanning", 400)
+    def work():
+        for _ in range(50):
+            p.advance()
+            p.error()
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    p.flush()
+    assert not failures
+    assert json.loads(open(job.STATUS_FILE).read())["stats"]["done"] == 200
+
+def test_profile_flag_writes_artifacts(job, monkeypatch, tmp_path):
+    import pstats
+    import profiling
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path / "profiles"))
+    run(job, monkeypatch, "--profile")
+    [summary] = profiling.list_profiles()
+    assert summary["name"] == "engine_job_full" and summary["threads"] == 3 and summary["top_alloc"]
+    assert not summary["failed"] and profiling.ACTIVE is None
+    funcs = {name for _, _, name in pstats.Stats(summary["path"]).stats}
+    assert "score_symbol" in funcs # Scored on the worker thread, merged into the run's profile
@@ -0,0 +1,34 @@
+import os
+import sys
+import subprocess
+import pytest
+
+# CLI entry points must start without the Streamlit / Google Sheets stack.
+# Budget covers pandas (the bulk of it); override on slow machines.
+IMPORT_BUDGET_S = float(os.getenv("IMPORT_BUDGET_S", "1.0"))
+HEADLESS_MODULES = ["run_engine_job", "swing_bot", "sheets_db", "engine_v2", "angel_data", "market_data"]
+DEFERRED = ["streamlit", "gspread", "oauth2client", "angel_connect", "discord_bot", "nifty_utils"]
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def import_profile(module, cwd):
+    """{top-level module: cumulative import seconds} from `python -X importtime`."""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    res = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         cwd=cwd, env=env, capture_output=True, text=True, timeout=60)
+    assert res.returncode == 0, res.stderr[-2000:]
+    profile = {}
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line: continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            name = name.strip()
+            profile[name] = max(profile.get(name, 0), int(cumulative) / 1e6)
+    return profile
+
+@pytest.mark.parametrize("module", HEADLESS_MODULES)
+def test_headless_import_defers_heavy_deps(module, tmp_path):
+    profile = import_profile(module, tmp_path) # tmp cwd: imports create cache/ and log files
+    loaded = sorted(m for m in DEFERRED if m in profile and m != module)
+    assert not loaded, f"{module} imports {loaded} at load time"
+    assert profile[module] < IMPORT_BUDGET_S, f"{module} took {profile[module]:.2f}s to import"
@@ -0,0 +1,60 @@
+import os
+import json
+import pytest
+import local_store
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    local_store.close()
+    monkeypatch.setattr(local_store, "STORE_FILE", str(tmp_path / "db.sqlite"))
+    monkeypatch.setattr(local_store, "LEGACY_JSON_FILE", str(tmp_path / "db.json"))
+    yield local_store
+    local_store.close()
+
+def test_empty_store(store):
+    assert not store.has_data()
+    assert store.load_all() == {}
+
+def test_roundtrip_and_indexed_lookup(store):
+    store.save_all({
+        "portfolio": [
+            {"Symbol": "TCS", "Status": "OPEN", "Entry": 10},
+            {"Symbol": "INFY.NS", "Status": "CLOSED", "Entry": 20},
+        ],
+        "history": [],
+        "last_synced": "now"
+    })
+    assert store.has_data()
+    assert [r["Symbol"] for r in store.read_table("portfolio")] == ["TCS", "INFY.NS"]
+    assert store.get_meta("last_synced") == "now"
+
+    rows = store.find_rows("portfolio", symbol="infy", status="CLOSED")
+    assert len(rows) == 1 and rows[0][1]["Entry"] == 20
+
+    assert store.delete_by_symbol("portfolio", "TCS.NS") == 1
+    assert [r["Symbol"] for r in store.read_table("portfolio")] == ["INFY.NS"]
+
+def test_partial_save_keeps_other_tables(store):
+    store.replace_table("watchlist", [{"Symbol": "A", "status": "ACTIVE"}])
+    store.save_all({"portfolio": [{"Symbol": "B", "Status": "OPEN"}]})
+    assert len(store.read_table("watchlist")) == 1
+
+def test_one_shot_json_migration(store):
+    legacy = {"portfolio": [{"Symbol": "X", "Status": "OPEN"}], "history": [{"Symbol": "Y"}]}
+    with open(store.LEGACY_JSON_FILE, "w") as f: json.dump(legacy, f)
+
+    assert store.read_table("portfolio") == legacy["portfolio"] # auto-migrated on connect
+    assert store.migrate_from_json() == 0 # already done
+    assert store.migrate_from_json(force=True) == 2
+
+def test_read_cache_copy_and_invalidation(store):
+    store.replace_table("watchlist", [{"Symbol": "A", "status": "ACTIVE"}])
+    first = store.read_table("watchlist")
+    first[0]["status"] = "MUTATED"
+    first.append({"Symbol": "junk"})
+    assert store.read_table("watchlist") == [{"Symbol": "A", "status": "ACTIVE"}]
+
+    v = store.store_version()
+    store.append_row("watchlist", {"Symbol": "B", "status": "ACTIVE"})
+    assert store.store_version() == v + 1
+    assert [r["Symbol"] for r in store.read_table("watchlist")] == ["A", "B"]
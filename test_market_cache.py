@@ -0,0 +1,90 @@
+import time
+import threading
+import pandas as pd
+import market_data
+from market_data import FrameCache
+
+def frame(rows):
+    return pd.DataFrame({"Close": [1.0] * rows, "Volume": [1] * rows})
+
+def test_lru_evicts_to_byte_budget():
+    size = FrameCache._nbytes(frame(100))
+    cache = FrameCache(max_bytes=size * 2)
+    cache.put("a", frame(100), ttl=60)
+    cache.put("b", frame(100), ttl=60)
+    assert cache.get("a") is not None # 'a' is now most recent
+    cache.put("c", frame(100), ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    s = cache.stats()
+    assert s["evictions"] == 1 and s["bytes"] <= s["max_bytes"] and s["entries"] == 2
+
+def test_oversized_entry_is_not_cached():
+    cache = FrameCache(max_bytes=10)
+    cache.put("big", frame(100), ttl=60)
+    assert cache.stats()["entries"] == 0
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(market_data.time, "monotonic", lambda: now[0])
+    cache = FrameCache()
+    cache.put("k", frame(5), ttl=market_data.MEM_CACHE_TTL["15m"])
+    assert cache.get("k") is not None
+    now[0] += 901
+    assert cache.get("k") is None
+    s = cache.stats()
+    assert (s["hits"], s["misses"], s["expirations"], s["bytes"]) == (1, 1, 1, 0)
+
+def test_concurrent_access_keeps_accounting_consistent():
+    size = FrameCache._nbytes(frame(10))
+    cache = FrameCache(max_bytes=size * 8)
+
+    def worker(n):
+        for i in range(200):
+            key = f"{n}-{i % 16}"
+            if cache.get(key) is None: cache.put(key, frame(10), ttl=60)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    s = cache.stats()
+    assert s["bytes"] == s["entries"] * size <= s["max_bytes"]
+    assert s["hits"] + s["misses"] == 800
+
+class SlowAngel:
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def fetch_hist_data(self, symbol, interval, days):
+        self.calls += 1
+        self.release.wait(5)
+        idx = pd.date_range("2025-01-01", periods=3, freq="D")
+        return pd.DataFrame({"Close": [1.0, 2.0, 3.0], "Volume": [1, 2, 3]}, index=idx)
+
+def test_concurrent_fetches_are_coalesced(tmp_path, monkeypatch):
+    import data_context
+    ctx = data_context.InProcessContext(secrets_file=str(tmp_path / "none.toml"))
+    prev = data_context.set_context(ctx)
+    monkeypatch.setattr(market_data, "CACHE_DIR", str(tmp_path))
+    market_data.clear_cache()
+    angel = SlowAngel()
+    ctx.set("angel_mgr", angel)
+    try:
+        before = market_data.get_cache_stats()["coalesced"]
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(market_data.incremental_fetch("TCS.NS", "1d")))
+                   for _ in range(6)]
+        for t in threads: t.start()
+        for _ in range(500): # until all five followers are waiting on the leader
+            if market_data.get_cache_stats()["coalesced"] - before >= 5: break
+            time.sleep(0.01)
+        angel.release.set()
+        for t in threads: t.join()
+
+        assert angel.calls == 1
+        assert len(results) == 6 and all(r is results[0] for r in results)
+        assert (tmp_path / "TCS_1d.parquet").exists()
+    finally:
+        data_context.set_context(prev)
@@ -0,0 +1,70 @@
+import json
+import pytest
+import metrics
+
+@pytest.fixture(autouse=True)
+def clean():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+def find(snap, kind, name, **labels):
+    labels = {k: str(v) for k, v in labels.items()}
+    return next(m for m in snap[kind] if m["name"] == name and m["labels"] == labels)
+
+def test_timed_decorator_and_block():
+    @metrics.timed("work_seconds")
+    def work(fail=False):
+        if fail: raise ValueError("boom")
+        return 1
+
+    assert work() == 1
+    with pytest.raises(ValueError): work(fail=True)
+    with metrics.timed("work_seconds", fn="block") as t: pass
+    metrics.inc("hits_total", 2, layer="memory")
+
+    snap = metrics.snapshot(mode="test")
+    h = find(snap, "histograms", "work_seconds", fn="work")
+    assert h["count"] == 2 and h["p95"] <= h["max"] and sum(h["buckets"].values()) == 2
+    assert find(snap, "histograms", "work_seconds", fn="block")["count"] == 1 and t.elapsed >= 0
+    assert find(snap, "counters", "work_seconds_errors_total", fn="work")["value"] == 1
+    assert find(snap, "counters", "hits_total", layer="memory")["value"] == 2 and snap["mode"] == "test"
+    assert metrics.timing_rows(snap)[0]["metric"] == "work_seconds"
+
+def test_prometheus_export(tmp_path):
+    for v in (0.002, 0.02, 500):
+        metrics.observe("api_seconds", v, endpoint='get"Candle')
+    metrics.gauge("cache_bytes", 10)
+    path = metrics.export(str(tmp_path), state="COMPLETED")
+    assert json.load(open(path))["state"] == "COMPLETED"
+
+    text = open(tmp_path / "engine_metrics.prom").read()
+    assert "# TYPE api_seconds histogram" in text and "# TYPE cache_bytes gauge" in text
+    assert 'api_seconds_bucket{endpoint="get\\"Candle",le="0.005"} 1' in text
+    assert 'api_seconds_bucket{endpoint="get\\"Candle",le="+Inf"} 3' in text
+    assert 'api_seconds_count{endpoint="get\\"Candle"} 3' in text
+
+def test_incremental_fetch_instrumented(tmp_path, monkeypatch):
+    import angel_data
+    import data_context
+    import market_data
+    import smartapi_sim
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(angel_data.time, "sleep", lambda s: None)
+    monkeypatch.setattr(market_data, "CACHE_DIR", str(tmp_path))
+    market_data.clear_cache()
+    prev = data_context.set_context(data_context.InProcessContext())
+    try:
+        smartapi_sim.install(symbols=["INFY.NS"], ctx=data_context.get_context())
+        market_data.incremental_fetch("INFY.NS", "1d", "1y")
+        market_data.incremental_fetch("INFY.NS", "1d", "1y")
+    finally:
+        data_context.set_context(prev)
+        market_data.clear_cache()
+
+    snap = metrics.snapshot()
+    assert find(snap, "counters", "market_data_cache_total", layer="memory", result="miss", interval="1d")["value"] == 1
+    assert find(snap, "counters", "market_data_cache_total", layer="memory", result="hit", interval="1d")["value"] == 1
+    assert find(snap, "counters", "market_data_cache_total", layer="disk", result="miss", interval="1d")["value"] == 1
+    assert find(snap, "histograms", "angel_api_seconds", endpoint="getCandleData")["count"] == 1
+    assert find(snap, "histograms", "market_data_api_seconds", interval="1d")["count"] == 1
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import mtf_align
+
+def test_offsets_point_at_latest_completed_bar():
+    m15 = pd.DatetimeIndex(["2025-06-23 15:15", "2025-06-24 09:15", "2025-06-24 10:00", "2025-06-24 15:15"])
+    h1 = pd.DatetimeIndex(["2025-06-23 14:15", "2025-06-23 15:15", "2025-06-24 09:15", "2025-06-24 15:15"])
+    d1 = pd.DatetimeIndex(["2025-06-20", "2025-06-23", "2025-06-24"]).tz_localize("Asia/Kolkata")
+    # 15:15 bars end at the 15:30 close together with the day's last 1h bar and the daily bar
+    assert mtf_align.offsets(m15, "15m", h1, "1h").tolist() == [1, 1, 2, 3]
+    assert mtf_align.offsets(m15, "15m", d1, "1d").tolist() == [1, 1, 1, 2]
+    assert mtf_align.offsets(m15[:1], "15m", h1[2:], "1h").tolist() == [-1]
+
+def test_snapshot_index_roundtrip(tmp_path):
+    import market_data
+    import synthetic_data
+    data, _ = synthetic_data.generate(n_symbols=5, days=60, intraday_days=5, seed=2)
+    synthetic_data.write_snapshot(data, str(tmp_path))
+    stored = mtf_align.load(str(tmp_path))
+    frames = {tf: {s: market_data.to_storage(df, tf) for s, df in data[tf].items()} for tf in data}
+    built = mtf_align.build(frames)
+    assert sorted(stored) == sorted(data["15m"]) and len(built) == sum(len(df) for df in data["15m"].values())
+    for sym, part in stored.items():
+        np.testing.assert_array_equal(part.to_numpy(), built.loc[sym].to_numpy())
+        ends = mtf_align.bar_ends(part.index, "15m")
+        h1 = mtf_align.bar_ends(frames["1h"][sym].index, "1h")
+        last = part["1h"].to_numpy()
+        assert (h1[last[last >= 0]] <= ends[last >= 0]).all() # Never a bar still in progress
+        nxt = np.minimum(last + 1, len(h1) - 1)
+        assert ((h1[nxt] > ends) | (last == len(h1) - 1)).all() # ... and the latest one that is complete
+    assert mtf_align.load(str(tmp_path / "missing")) is None
+
+def test_aggregation_drops_index_when_a_timeframe_fails(tmp_path, monkeypatch):
+    import synthetic_data
+    monkeypatch.chdir(tmp_path) # Importing the job creates cache/ and its log file in cwd
+    import run_engine_job as job
+    data, _ = synthetic_data.generate(n_symbols=3, days=60, intraday_days=5, seed=4)
+    raw = tmp_path / "raw"
+    synthetic_data.write_raw_cache(data, str(raw))
+    monkeypatch.setattr(job, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(job, "RAW_DIR", str(raw))
+    tickers = list(data["1d"])
+
+    job.aggregate_and_swap(tickers, "full")
+    assert len(mtf_align.load(str(tmp_path))) == 3
+
+    def broken(bar_index): raise RuntimeError("build failed")
+    with monkeypatch.context() as m:
+        m.setattr(mtf_align, "build", broken)
+        job.aggregate_and_swap(tickers, "full")
+    assert mtf_align.load(str(tmp_path)) is None # Old index would point into the new files
+    job.aggregate_and_swap(tickers, "full")
+    assert len(mtf_align.load(str(tmp_path))) == 3
+
+    for f in raw.glob("*_1h.parquet"): f.unlink() # 1h not swapped: its UI file is stale
+    job.aggregate_and_swap(tickers, "full")
+    assert mtf_align.load(str(tmp_path)) is None
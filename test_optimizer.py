@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+import backtester
+import engine_v2
+import optimizer
+
+@pytest.fixture(scope="module")
+def panel():
+    import market_data
+    import synthetic_data
+    data, _ = synthetic_data.generate(n_symbols=30, days=400, intraday_days=5, seed=5)
+    return backtester.build_panel({s: market_data.to_storage(df, "1d") for s, df in data["1d"].items()})
+
+def test_sweep_matches_single_runs_in_pool(panel, tmp_path):
+    grid = optimizer.parse_grid(["exit_rev_tqs=6,8", "light_rsi_low=45,50", "max_trades=2,3"])
+    pooled = optimizer.sweep(panel, grid, workers=2)
+    local = optimizer.sweep(panel, grid, workers=1)
+    assert len(pooled) == 8
+    pd.testing.assert_frame_equal(pooled, local)
+    for row in pooled.sample(3, random_state=0).itertuples():
+        rules = {"exit_rev_tqs": row.exit_rev_tqs, "light_rsi_low": row.light_rsi_low}
+        stats = backtester.run(panel=panel, rules=rules, max_trades=row.max_trades)["stats"]
+        assert stats["return_pct"] == row.return_pct and stats["trades"] == row.trades
+
+    opened = backtester.open_panel(backtester.save_panel(panel, str(tmp_path / "p")))
+    assert isinstance(opened["Close"], np.memmap) and opened.index.equals(panel.index)
+    assert optimizer.surface(pooled, "exit_rev_tqs", "light_rsi_low").shape == (2, 2)
+    assert optimizer.inert_params(optimizer.parse_grid(["chop_max=45,50", "entry_tqs=8"])) == ["chop_max"]
+
+def test_signal_stages_cached_per_rule_subset(panel, monkeypatch):
+    calls = {"tqs": 0, "exit": 0}
+    tqs_fn, exit_fn = engine_v2.tqs_daily_only_bars, engine_v2.exit_signal_bars
+    monkeypatch.setattr(engine_v2, "tqs_daily_only_bars", lambda *a: calls.__setitem__("tqs", calls["tqs"] + 1) or tqs_fn(*a))
+    monkeypatch.setattr(engine_v2, "exit_signal_bars", lambda *a: calls.__setitem__("exit", calls["exit"] + 1) or exit_fn(*a))
+    optimizer.sweep(panel, optimizer.parse_grid(["light_rsi_low=45,50", "exit_rsi=70,75,80", "entry_tqs=7,8"]), workers=1)
+    assert calls == {"tqs": 2, "exit": 3} # 12 combos: one score per entry / exit setting
+
+def test_walk_forward_picks_on_train_only(panel):
+    grid = optimizer.parse_grid(["entry_tqs=7,8,9"])
+    res = optimizer.walk_forward(panel, grid, train=150, test=50, workers=1)
+    table = res["folds"]
+    assert len(table) == len(optimizer.folds(panel.index, 150, 50)) == 5
+    assert (table["test_start"] > table["train_start"]).all()
+    for fold in table.itertuples():
+        train = res["results"][res["results"]["window"] == 2 * fold.fold]
+        assert fold.train_return_pct == train["return_pct"].max()
+    assert res["oos"]["folds"] == 5 and res["oos"]["trades"] == table["test_trades"].sum()
@@ -0,0 +1,85 @@
+import os
+import json
+import pandas as pd
+import pytest
+import market_data
+
+@pytest.fixture
+def raw_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(market_data, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+def frame():
+    idx = pd.date_range("2025-01-01", periods=5, freq="D")
+    return pd.DataFrame({"Close": [1.0, 2, 3, 4, 5], "Volume": [10, 20, 30, 40, 50]}, index=idx)
+
+
+def test_atomic_write_records_checksum(raw_dir):
+    path = str(raw_dir / "TCS_1d.parquet")
+    market_data.write_cache_file(path, frame())
+    entry = market_data.read_checksum(path)
+    assert entry["rows"] == 5 and entry["size"] == os.path.getsize(path)
+    assert not list(raw_dir.glob("*.tmp"))
+    pd.testing.assert_frame_equal(market_data.read_cache_file(path), frame(), check_freq=False)
+
+def test_writers_lock_per_file(raw_dir):
+    import time
+    (raw_dir / "TCS_1d.parquet.lock").write_text("") # Another process is writing TCS
+    t0 = time.monotonic()
+    market_data.write_cache_file(str(raw_dir / "INFY_1d.parquet"), frame())
+    assert time.monotonic() - t0 < 1 and len(market_data.load_cached("INFY", "1d")) == 5
+    assert not (raw_dir / "INFY_1d.parquet.lock").exists()
+
+def test_killed_writer_leaves_previous_file(raw_dir, monkeypatch):
+    path = str(raw_dir / "TCS_1d.parquet")
+    market_data.write_cache_file(path, frame())
+
+    def crash(src, dst): raise KeyboardInterrupt("killed before rename")
+    monkeypatch.setattr(market_data.os, "replace", crash)
+    with pytest.raises(KeyboardInterrupt):
+        market_data.write_cache_file(path, frame().iloc[:2])
+    monkeypatch.undo()
+    monkeypatch.setattr(market_data, "CACHE_DIR", str(raw_dir))
+
+    assert len(market_data.read_cache_file(path)) == 5 # old version intact
+    assert market_data.clean_stale_tmp(max_age=-1) == 1
+
+def test_unreadable_file_raises(raw_dir):
+    path = raw_dir / "BAD_1d.parquet"
+    path.write_bytes(b"PAR1 truncated")
+    with pytest.raises(Exception):
+        market_data.read_cache_file(str(path))
+
+def test_checksum_mismatch_is_corruption(raw_dir):
+    path = str(raw_dir / "TCS_1d.parquet")
+    frame().to_parquet(path) # Pre-checksum file: recorded on first read
+    assert len(market_data.read_cache_file(path)) == 5
+    assert market_data.read_checksum(path)["rows"] == 5
+
+    frame().iloc[:3].to_parquet(path) # Still parses, but not what was recorded
+    with pytest.raises(ValueError):
+        market_data.read_cache_file(path)
+    assert market_data.load_cached("TCS", "1d").empty
+
+def test_storage_schema_types_and_retention():
+    idx = pd.date_range("2025-01-01 09:15", periods=60 * 26, freq="15min")
+    df = pd.DataFrame({"Open": 1.0, "High": 2.0, "Low": 0.5, "Close": 1.5, "Volume": 10.0}, index=idx)
+    df.iloc[-1, df.columns.get_loc("Volume")] = float("nan")
+
+    out = market_data.to_storage(df, "15m")
+    assert out["Close"].dtype == "float32" and out["Volume"].dtype == "int64"
+    assert out["Volume"].iloc[-1] == 0
+    assert out.index.min() >= idx.max() - pd.Timedelta(days=market_data.RETENTION_DAYS["15m"])
+    assert len(market_data.to_storage(df, "1d")) == len(df) # within the daily window
+
+def test_exit_signals_from_stored_frames_serialize():
+    import numpy as np
+    from engine_v2 import SwingEngine
+    idx = pd.date_range("2025-01-01 09:15", periods=120, freq="h")
+    close = 2.2 + np.arange(120) * 0.01 # Steady climb: RSI well above the exit level
+    df = pd.DataFrame({"Open": close - 0.005, "High": close + 0.01, "Low": close - 0.01, "Close": close, "Volume": 1000.0}, index=idx)
+    stored = market_data.to_storage(df, "1h")
+
+    exits = SwingEngine().check_exits(pd.DataFrame({"Symbol": ["TCS"]}), data_map={"1h": {"TCS.NS": stored}})
+    assert exits and json.loads(json.dumps(exits))[0]["Price"] == round(close[-1], 2)
+    assert market_data.from_storage(stored)["Close"].dtype == "float64"
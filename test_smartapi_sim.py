@@ -0,0 +1,71 @@
+import pytest
+import smartapi_sim
+
+PARAMS = {"exchange": "NSE", "symboltoken": "10000", "interval": "ONE_DAY",
+          "fromdate": "2025-06-02 09:15", "todate": "2025-06-27 15:30"}
+
+class Clock:
+    def __init__(self): self.t = 1000.0
+    def __call__(self): return self.t
+
+@pytest.fixture
+def ctx(tmp_path, monkeypatch):
+    import data_context
+    import angel_data
+    import market_data
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(angel_data.time, "sleep", lambda s: None) # Client-side throttle / backoff
+    monkeypatch.setattr(market_data, "CACHE_DIR", str(tmp_path))
+    market_data.clear_cache()
+    ctx = data_context.InProcessContext()
+    prev = data_context.set_context(ctx)
+    yield ctx
+    data_context.set_context(prev)
+    market_data.clear_cache()
+
+def test_rate_limit_window():
+    clock = Clock()
+    sim = smartapi_sim.SmartAPISimulator(symbols=["A"], clock=clock)
+    client = sim.connect()
+    assert client.generateSession("SIM", "0000", "123456")["status"]
+
+    codes = [client.getCandleData(PARAMS)["errorcode"] for _ in range(4)]
+    assert codes == ["", "", "", "AB1004"]
+    clock.t += 1.0
+    assert client.getCandleData(PARAMS)["status"]
+    assert sim.stats()["errors"] == {"AB1004": 1} and sim.stats()["peak_rate"]["getCandleData"] == 3
+
+def test_candles_are_deterministic_and_range_capped():
+    sim = smartapi_sim.SmartAPISimulator(symbols=["A"], rate_limits={"getCandleData": (None, None)})
+    client = sim.connect()
+    client.generateSession("SIM", "0000", "123456")
+    full = client.getCandleData(PARAMS)["data"]
+    part = client.getCandleData(dict(PARAMS, fromdate="2025-06-16 09:15"))["data"]
+    assert len(full) == 20 and part == full[-len(part):] # Weekdays only; overlapping requests agree
+
+    hourly = client.getCandleData(dict(PARAMS, interval="ONE_HOUR", fromdate="2025-06-27 09:15"))["data"]
+    assert hourly[0][0] == "2025-06-27T09:15:00+05:30" and len(hourly) == 6
+    too_long = client.getCandleData(dict(PARAMS, interval="FIFTEEN_MINUTE", fromdate="2024-06-02 09:15"))
+    assert too_long["errorcode"] == "SIM_RANGE"
+
+def test_expired_session_relogin(ctx):
+    clock = Clock()
+    sim = smartapi_sim.install(symbols=["RELIANCE.NS"], session_ttl=60, clock=clock, ctx=ctx)
+    mgr = ctx.get("angel_mgr")
+    assert not mgr.fetch_hist_data("RELIANCE.NS", days=30).empty
+
+    clock.t += 120 # Session expired; angel_data re-authenticates and retries
+    df = mgr.fetch_hist_data("RELIANCE.NS", days=30)
+    assert not df.empty and list(df.columns) == ["Open", "High", "Low", "Close", "Volume"]
+    assert sim.stats()["calls"]["generateSession"] == 2 and sim.stats()["errors"] == {"AG8001": 1}
+
+def test_market_data_through_simulator(ctx):
+    import market_data
+    sim = smartapi_sim.install(symbols=["INFY.NS", "TCS.NS"], ctx=ctx)
+    df = market_data.incremental_fetch("INFY.NS", "1d", "1y")
+    assert len(df) > 200 and df["Close"].dtype == "float64"
+    assert market_data.load_cached("INFY.NS", "1d")["Close"].dtype == "float32" # Compact on disk
+
+    snap = market_data.get_bulk_snapshot(["INFY.NS", "TCS.NS", "NOPE.NS"])
+    assert sorted(snap.index) == ["INFY.NS", "TCS.NS"] and (snap["LTP"] > 0).all()
+    assert sim.stats()["calls"] == {"generateSession": 1, "getCandleData": 1, "getMarketData": 1}
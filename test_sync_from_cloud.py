@@ -0,0 +1,126 @@
+import re
+import pytest
+import local_store
+import trade_log
+import sheets_db
+
+class FakeWorksheet:
+    def __init__(self, title, rows):
+        self.title = title
+        self.rows = rows
+        self.row_count = 1000
+        self.col_count = 10
+
+    def append_row(self, row):
+        self.rows.append(row)
+        return {"updates": {"updatedRange": f"{self.title}!A{len(self.rows)}:F{len(self.rows)}"}}
+
+class FakeWorkbook:
+    """Mimics the three Spreadsheet calls sync_from_cloud makes."""
+    def __init__(self, sheets):
+        self.sheets = {name: FakeWorksheet(name, rows) for name, rows in sheets.items()}
+        self.calls = []
+
+    def worksheet(self, title):
+        return self.sheets[title]
+
+    def worksheets(self):
+        self.calls.append("worksheets")
+        return list(self.sheets.values())
+
+    def batch_update(self, body):
+        self.calls.append("batch_update")
+        for req in body["requests"]:
+            title = req["addSheet"]["properties"]["title"]
+            self.sheets[title] = FakeWorksheet(title, [])
+
+    def values_batch_get(self, ranges):
+        self.calls.append("values_batch_get")
+        out = []
+        for rng in ranges:
+            name, _, a1 = rng.partition("!")
+            rows = self.sheets[name.strip("'")].rows
+            if a1 == "1:1": rows = rows[:1]
+            elif a1: rows = rows[int(re.match(r"A(\d+)", a1).group(1)) - 1:]
+            out.append({"range": rng, "values": rows} if rows else {"range": rng})
+        return {"valueRanges": out}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    local_store.close()
+    monkeypatch.setattr(local_store, "STORE_FILE", str(tmp_path / "db.sqlite"))
+    monkeypatch.setattr(local_store, "LEGACY_JSON_FILE", str(tmp_path / "db.json"))
+    monkeypatch.setattr(trade_log, "HISTORY_DIR", str(tmp_path / "history"))
+    yield local_store
+    local_store.close()
+
+def make_wb():
+    return FakeWorkbook({
+        "OpenPositions": [["Symbol", "Entry", "Status"], ["TCS", "100", "OPEN"]],
+        "trades_closed": [["2025-01-01", "INFY", "10", "12", "2", "TEST"]], # headerless, as archive_trade writes
+        "Watchlist": [["Symbol", "status"], ["A", "ACTIVE"]],
+    })
+
+def test_full_sync_is_batched_and_creates_missing_sheets(store, monkeypatch):
+    wb = make_wb()
+    monkeypatch.setattr(sheets_db, "connect_db", lambda: wb)
+
+    ok, msg = sheets_db.sync_from_cloud()
+    assert ok, msg
+    assert wb.calls.count("values_batch_get") == 1
+    assert "LatestScan" in wb.sheets # created in one batch_update
+    assert store.read_table("portfolio") == [{"Symbol": "TCS", "Entry": 100, "Status": "OPEN"}]
+    assert sheets_db.fetch_history()[0]["Symbol"] == "INFY"
+    assert store.get_meta(sheets_db.HISTORY_CURSOR_KEY) == "1"
+
+def test_incremental_sync_only_appends_new_history(store, monkeypatch):
+    wb = make_wb()
+    wb.sheets["trades_closed"].rows = [sheets_db.HISTORY_COLUMNS, ["d", "INFY", 1, 2, 1, "x"]]
+    monkeypatch.setattr(sheets_db, "connect_db", lambda: wb)
+    assert sheets_db.sync_from_cloud()[0]
+
+    wb.sheets["trades_closed"].rows.append(["d", "TCS", 1, 3, 2, "y"])
+    ok, msg = sheets_db.sync_from_cloud(incremental=True)
+    assert ok, msg
+    assert [h["Symbol"] for h in sheets_db.fetch_history()] == ["INFY", "TCS"]
+    assert sheets_db.fetch_history_stats()["count"] == 2
+
+def test_schema_mismatch_leaves_local_untouched(store, monkeypatch):
+    store.replace_table("portfolio", [{"Symbol": "KEEP", "Status": "OPEN"}])
+    wb = make_wb()
+    wb.sheets["OpenPositions"].rows = [["Ticker", "Price"], ["TCS", "1"]]
+    monkeypatch.setattr(sheets_db, "connect_db", lambda: wb)
+
+    ok, msg = sheets_db.sync_from_cloud()
+    assert not ok and "OpenPositions" in msg
+    assert store.read_table("portfolio")[0]["Symbol"] == "KEEP"
+
+def test_incremental_sync_after_empty_sheet_skips_header(store, monkeypatch):
+    wb = make_wb()
+    wb.sheets["trades_closed"].rows = []
+    monkeypatch.setattr(sheets_db, "connect_db", lambda: wb)
+    assert sheets_db.sync_from_cloud()[0]
+
+    wb.sheets["trades_closed"].rows += [sheets_db.HISTORY_COLUMNS, ["d", "TCS", 1, 3, 2, "y"]]
+    ok, msg = sheets_db.sync_from_cloud(incremental=True)
+    assert ok, msg
+    assert [h["Symbol"] for h in sheets_db.fetch_history()] == ["TCS"]
+    assert store.get_meta(sheets_db.HISTORY_CURSOR_KEY) == "2"
+
+def test_archive_cursor_follows_append_position(store, monkeypatch):
+    wb = make_wb()
+    monkeypatch.setattr(sheets_db, "connect_db", lambda: wb)
+    assert sheets_db.sync_from_cloud()[0]
+
+    sheets_db.archive_trade({"Date": "d", "Symbol": "TCS", "Entry": 1, "Exit": 3, "PnL": 2, "Reason": "y"})
+    assert store.get_meta(sheets_db.HISTORY_CURSOR_KEY) == "2" # Landed right after the cursor
+
+    wb.sheets["trades_closed"].rows.append(["d", "SBIN", 5, 4, -1, "bot"]) # Another writer got in first
+    sheets_db.archive_trade({"Date": "d", "Symbol": "HDFC", "Entry": 2, "Exit": 4, "PnL": 2, "Reason": "z"})
+    assert store.get_meta(sheets_db.HISTORY_CURSOR_KEY) == "2"
+
+    ok, msg = sheets_db.sync_from_cloud(incremental=True)
+    assert ok, msg
+    assert [h["Symbol"] for h in sheets_db.fetch_history()] == ["INFY", "TCS", "HDFC", "SBIN"]
+    assert store.get_meta(sheets_db.HISTORY_CURSOR_KEY) == "4"
+    assert store.get_meta(sheets_db.HISTORY_PENDING_KEY) == "[]"
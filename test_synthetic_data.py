@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import synthetic_data as sd
+
+def test_deterministic_and_stable_per_symbol():
+    a, ev_a = sd.generate(5, days=120, intraday_days=20, seed=3)
+    b, ev_b = sd.generate(5, days=120, intraday_days=20, seed=3)
+    c, _ = sd.generate(8, days=120, intraday_days=20, seed=3) # More symbols: existing ones unchanged
+    for tf in ("1d", "1h", "15m"):
+        pd.testing.assert_frame_equal(a[tf]["SYN4.NS"], b[tf]["SYN4.NS"])
+        pd.testing.assert_frame_equal(a[tf]["SYN4.NS"], c[tf]["SYN4.NS"])
+    assert ev_a == ev_b
+    assert not a["1d"]["SYN0.NS"].equals(sd.generate(1, days=120, intraday_days=20, seed=4)[0]["1d"]["SYN0.NS"])
+
+def test_clean_timeframes_agree():
+    panel, events = sd.generate(3, days=80, intraday_days=10, anomalies={})
+    assert events == []
+    d, h, m = (panel[tf]["SYN1.NS"] for tf in ("1d", "1h", "15m"))
+    sessions = sd.trading_days(80)
+    assert d.index.equals(sessions) and d.index.dayofweek.max() < 5
+    assert not d.index.normalize().tz_localize(None).isin(sd.holidays(2024, 2025)).any()
+    assert len(m) == 10 * 25 and len(h) == 10 * 7
+    assert m.index[0].strftime("%H:%M") == "09:15" and h.index[-1].strftime("%H:%M") == "15:15"
+
+    day = m.groupby(m.index.normalize()).agg({"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"})
+    np.testing.assert_allclose(d.loc[day.index].to_numpy(), day.to_numpy(), rtol=1e-12)
+    first_hour = m.iloc[:4]
+    assert h["High"].iloc[0] == first_hour["High"].max() and h["Close"].iloc[0] == first_hour["Close"].iloc[-1]
+
+def test_anomalies_are_reported_and_present():
+    rates = {"gap": 0.01, "halt": 1.0, "split": 1.0, "zero_volume": 0.01, "nan_burst": 1.0}
+    panel, events = sd.generate(1, days=200, intraday_days=30, seed=5, anomalies=rates)
+    kinds = {e["kind"] for e in events}
+    assert kinds == {"gap", "halt", "split", "zero_volume", "nan_burst"}
+    d = panel["1d"]["SYN0.NS"]
+
+    halt = next(e for e in events if e["kind"] == "halt")
+    assert not ((d.index >= halt["start"]) & (d.index <= halt["end"])).any()
+    split = next(e for e in events if e["kind"] == "split")
+    closes = d["Close"].dropna()
+    jump = closes[closes.index >= split["start"]].iloc[0] / closes[closes.index < split["start"]].iloc[-1]
+    assert jump < 1.5 / split["ratio"] # Unadjusted: price drops by ~ratio on the split session
+    for e in events:
+        df = panel[e["tf"] if e["tf"] != "all" else "1d"]["SYN0.NS"]
+        if e["kind"] == "nan_burst": assert df.loc[e["start"]:e["end"]].isna().all().all()
+        if e["kind"] == "zero_volume" and e["start"] in df.index: assert df.loc[e["start"], "Volume"] == 0
+        if e["kind"] == "gap": assert e["start"] not in df.index
+
+def test_writers_match_repo_formats(tmp_path, monkeypatch):
+    import market_data
+    import engine_v2
+    panel, _ = sd.generate(4, days=60, intraday_days=5, seed=1)
+    raw = tmp_path / "cache" / "raw"
+    assert sd.write_raw_cache(panel, str(raw)) == 12
+    monkeypatch.setattr(market_data, "CACHE_DIR", str(raw))
+    df = market_data.load_cached("SYN2.NS", "1h")
+    assert len(df) == len(panel["1h"]["SYN2.NS"]) and df["Close"].dtype == "float32"
+    assert len(list(raw.glob("*" + market_data.CHECKSUM_SUFFIX))) == 12
+
+    sd.write_snapshot(panel, str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    eng = engine_v2.SwingEngine.__new__(engine_v2.SwingEngine)
+    data_map = eng.load_snapshot()
+    assert sorted(data_map["1d"]) == sorted(panel["1d"])
+    assert len(data_map["15m"]["SYN0.NS"]) == len(panel["15m"]["SYN0.NS"])
@@ -0,0 +1,69 @@
+import pytest
+import trade_log
+
+@pytest.fixture
+def log(tmp_path, monkeypatch):
+    monkeypatch.setattr(trade_log, "HISTORY_DIR", str(tmp_path / "history"))
+    return trade_log
+
+def trade(sym, pnl, date="2025-01-15", reason="TQS Exit"):
+    return {"Date": date, "Symbol": sym, "Entry": 100, "Exit": 100 + pnl, "PnL": pnl, "Reason": reason}
+
+def test_append_updates_running_stats(log):
+    assert log.is_empty()
+    log.append(trade("TCS", 5))
+    log.append([trade("TCS.NS", -2, date="2025-02-03"), trade("INFY", 1, reason="Manual")])
+
+    stats = log.get_stats()
+    assert stats["count"] == 3 and stats["wins"] == 2
+    assert stats["total_pnl"] == pytest.approx(4)
+    assert stats["win_rate"] == pytest.approx(200 / 3)
+    assert stats["by_symbol"]["TCS"]["count"] == 2
+    assert stats["by_tag"]["Manual"]["pnl"] == pytest.approx(1)
+
+def test_reads_preserve_order_and_records(log):
+    rows = [trade(f"S{i}", i, date=f"2025-{i // 3 + 1:02d}-01") for i in range(9)]
+    for r in rows: log.append(r)
+    assert log.read_all() == rows
+    assert log.read_recent(2) == rows[-2:]
+
+    log.compact()
+    assert log.read_all() == rows
+    assert list(log.load_frame()["Symbol"]) == [r["Symbol"] for r in rows]
+
+def test_replace_and_rebuild(log):
+    log.append(trade("OLD", 1))
+    log.replace([trade("A", -1), trade("B", 3)])
+    assert [r["Symbol"] for r in log.read_all()] == ["A", "B"]
+
+    expected = log.get_stats()
+    assert {k: expected[k] for k in ("count", "wins", "total_pnl")} == \
+        {k: log.rebuild_stats()[k] for k in ("count", "wins", "total_pnl")}
+
+def test_replace_swaps_generations_without_gap(log):
+    log.append(trade("OLD", 1)) # Pre-generation layout
+    log.replace([trade("A", -1)])
+    first = log._data_dir()
+    assert [r["Symbol"] for r in log.read_all()] == ["A"]
+    assert len(log._part_files(log.HISTORY_DIR)) == 1 # Previous (legacy) log kept for readers still on it
+
+    log.replace([trade("B", 3)])
+    assert [r["Symbol"] for r in log.read_all()] == ["B"]
+    assert log._part_files(first) and not log._part_files(log.HISTORY_DIR) # Legacy gone, one generation back kept
+    log.replace([trade("C", 2)])
+    assert not log._part_files(first)
+    log.append(trade("D", 1))
+    assert [r["Symbol"] for r in log.read_all()] == ["C", "D"] and log.get_stats()["count"] == 2
+
+def test_writers_wait_for_lock_file(log, tmp_path):
+    import threading
+    import time
+    lock = tmp_path / "history.lock"
+    lock.write_text("") # Held by another process
+    t = threading.Thread(target=log.append, args=(trade("TCS", 1),))
+    t.start()
+    time.sleep(0.2)
+    assert t.is_alive() and log.is_empty()
+    lock.unlink()
+    t.join(5)
+    assert log.get_stats()["count"] == 1 and not lock.exists()
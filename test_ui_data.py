@@ -0,0 +1,47 @@
+import sys
+import pytest
+import ui_data
+
+ENGINE_SRC = "import fake_dep\nclass SwingEngine:\n    tag = fake_dep.TAG\n"
+
+@pytest.fixture
+def fake_engine(tmp_path, monkeypatch):
+    (tmp_path / "fake_dep.py").write_text("TAG = 'v1'\n")
+    (tmp_path / "fake_engine.py").write_text(ENGINE_SRC)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(ui_data, "ENGINE_MODULES", ["fake_dep", "fake_engine"])
+    monkeypatch.setattr(ui_data, "_module_path", lambda name: str(tmp_path / f"{name}.py"))
+    ui_data._load_engine.clear()
+    yield tmp_path
+    ui_data._load_engine.clear()
+    for name in ("fake_dep", "fake_engine"):
+        sys.modules.pop(name, None)
+        ui_data._module_hashes.pop(name, None)
+
+def test_code_version_tracks_content(fake_engine):
+    v1 = ui_data.code_version()
+    assert ui_data.code_version() == v1
+    (fake_engine / "fake_dep.py").write_text("TAG = 'v2'  # changed\n")
+    assert ui_data.code_version() != v1
+
+def test_engine_reused_until_code_changes(fake_engine):
+    first = ui_data.load_engine()
+    assert ui_data.load_engine() is first and first.tag == "v1"
+
+    (fake_engine / "fake_dep.py").write_text("TAG = 'v2'  # changed\n")
+    second = ui_data.load_engine()
+    assert second is not first and second.tag == "v2"
+
+def test_format_progress():
+    stats = {"phase": "Scanning", "done": 120, "total": 300, "eta_s": 185, "req_per_s": 2.44,
+             "errors": 2, "deep": 10, "candidates": 40}
+    assert ui_data.format_progress(stats) == "Scanning: 120/300 · deep 10/40 · ETA 3m 05s · 2.4 req/s · 2 errors"
+    assert ui_data.format_progress({"phase": "Aggregating", "total": 0}) == "Aggregating"
+    assert ui_data.format_progress(None) == ""
+
+def test_snapshot_symbols_match_check_exits_lookup():
+    import pandas as pd
+    bars = pd.DataFrame({"Close": [1.0]})
+    snap_map = {"1h": {"TCS.NS": bars, "INFY": bars, "SBIN.NS": bars.iloc[:0]}}
+    assert ui_data.snapshot_symbols(snap_map, ["TCS", "INFY", "SBIN", "HDFC", None]) == {"TCS", "INFY"}
+    assert ui_data.snapshot_symbols(None, ["TCS"]) == set()
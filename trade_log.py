@@ -0,0 +1,274 @@
+import os
+import glob
+import json
+import time
+import shutil
+import threading
+import pandas as pd
+import pyarrow.parquet as pq
+from local_store import SafeJSONEncoder
+
+# --- CONFIG ---
+# Closed trades: append-only parquet parts, partitioned by exit month.
+#   cache/history/_current  (name of the live generation; replace() swaps it atomically)
+#   cache/history/gen-<ns>/month=2025-01/part-<ns>-<pid>.parquet
+#   cache/history/gen-<ns>/_stats.json  (running aggregates, updated on every append)
+# Logs written before generations keep month=* / _stats.json directly under
+# cache/history until the first replace(). Writers (the bot and the app are
+# separate processes) hold cache/history.lock.
+HISTORY_DIR = os.path.join("cache", "history")
+STATS_FILE = "_stats.json"
+CURRENT_FILE = "_current"
+LOCK_TIMEOUT = 10 # Seconds before a lock file left by a killed writer is taken over
+TAG_FIELD = "Reason" # Grouping key for per-tag stats
+NUMERIC_COLS = ["Entry", "Exit", "PnL"]
+
+_lock = threading.RLock()
+_stats_cache = {} # path -> ((mtime_ns, size), stats)
+
+class _LogLock:
+    """Thread lock + cross-process lock file (O_EXCL, as market_data's cache file locks). Re-entrant per thread."""
+    depth = 0
+
+    def __enter__(self):
+        _lock.acquire()
+        if _LogLock.depth == 0:
+            try: self._acquire_file()
+            except BaseException:
+                _lock.release()
+                raise
+        _LogLock.depth += 1
+        return self
+
+    def _acquire_file(self):
+        path = HISTORY_DIR + ".lock"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    # Holder died (killed process): take the lock over.
+                    try: os.remove(path)
+                    except OSError: pass
+                    deadline = time.monotonic() + LOCK_TIMEOUT
+                time.sleep(0.01)
+
+    def __exit__(self, *exc):
+        _LogLock.depth -= 1
+        if _LogLock.depth == 0:
+            try: os.remove(HISTORY_DIR + ".lock")
+            except OSError: pass
+        _lock.release()
+
+def _data_dir():
+    """Directory of the live generation (HISTORY_DIR itself for a pre-generation log)."""
+    try:
+        with open(os.path.join(HISTORY_DIR, CURRENT_FILE), "r") as f: gen = f.read().strip()
+    except OSError:
+        return HISTORY_DIR
+    return os.path.join(HISTORY_DIR, gen) if gen else HISTORY_DIR
+
+def _empty_stats():
+    return {"count": 0, "wins": 0, "total_pnl": 0.0, "next_seq": 0, "by_symbol": {}, "by_tag": {}}
+
+def _num(v):
+    try: return float(v)
+    except: return float("nan")
+
+def _month_of(rec):
+    for key in ("ExitDate", "Date"):
+        try: return pd.to_datetime(str(rec.get(key))).strftime("%Y-%m")
+        except: continue
+    return "unknown"
+
+def _to_frame(records, start_seq):
+    """Typed analytics columns + the original record (JSON) for lossless reads."""
+    rows = []
+    for i, r in enumerate(records):
+        row = {
+            "seq": start_seq + i,
+            "month": _month_of(r),
+            "Date": str(r.get("Date", "")),
+            "Symbol": str(r.get("Symbol", "")).replace(".NS", ""),
+            "Tag": str(r.get(TAG_FIELD, "") or ""),
+            "record": json.dumps(r, cls=SafeJSONEncoder),
+        }
+        for c in NUMERIC_COLS: row[c] = _num(r.get(c))
+        rows.append(row)
+    return pd.DataFrame(rows, columns=["seq", "month", "Date", "Symbol", "Tag"] + NUMERIC_COLS + ["record"])
+
+def _write_atomic(path, write_fn):
+    tmp = path + ".tmp"
+    write_fn(tmp)
+    os.replace(tmp, path)
+
+def _write_parts(base_dir, df):
+    for month, part in df.groupby("month"):
+        part_dir = os.path.join(base_dir, f"month={month}")
+        os.makedirs(part_dir, exist_ok=True)
+        path = os.path.join(part_dir, f"part-{time.time_ns()}-{os.getpid()}.parquet")
+        part = part.drop(columns=["month"]).reset_index(drop=True)
+        _write_atomic(path, lambda p: part.to_parquet(p, index=False))
+
+def _fold(stats, df):
+    """Adds a batch of trades into the running aggregates (O(batch))."""
+    for sym, tag, pnl in zip(df["Symbol"], df["Tag"], df["PnL"]):
+        pnl = 0.0 if pd.isna(pnl) else float(pnl)
+        win = 1 if pnl > 0 else 0
+        stats["count"] += 1
+        stats["wins"] += win
+        stats["total_pnl"] += pnl
+        for bucket, key in (("by_symbol", sym), ("by_tag", tag)):
+            b = stats[bucket].setdefault(key, {"count": 0, "wins": 0, "pnl": 0.0})
+            b["count"] += 1
+            b["wins"] += win
+            b["pnl"] += pnl
+    stats["next_seq"] += len(df)
+    return stats
+
+def _stats_path(base_dir=None):
+    return os.path.join(base_dir or _data_dir(), STATS_FILE)
+
+def _read_stats(base_dir=None):
+    path = _stats_path(base_dir)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return _empty_stats()
+    key = (st.st_mtime_ns, st.st_size)
+    hit = _stats_cache.get(path)
+    if hit and hit[0] == key:
+        return json.loads(json.dumps(hit[1])) # Copy (callers may mutate)
+    try:
+        with open(path, "r") as f: stats = json.load(f)
+    except Exception as e:
+        print(f"Trade Log Stats Unreadable ({e}). Rebuilding...")
+        return rebuild_stats()
+    _stats_cache[path] = (key, stats)
+    return json.loads(json.dumps(stats))
+
+def _write_stats(stats, base_dir=None):
+    path = _stats_path(base_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    def dump(p):
+        with open(p, "w") as f: json.dump(stats, f)
+    _write_atomic(path, dump)
+
+def _part_files(base_dir=None, months=None):
+    base_dir = base_dir or _data_dir()
+    if months is None:
+        return sorted(glob.glob(os.path.join(base_dir, "month=*", "*.parquet")))
+    files = []
+    for m in months:
+        files.extend(sorted(glob.glob(os.path.join(base_dir, f"month={m}", "*.parquet"))))
+    return files
+
+def _read_parts(files, columns=None):
+    if not files: return pd.DataFrame()
+    cols = None if columns is None else list(dict.fromkeys(["seq"] + list(columns)))
+    df = pd.concat([pd.read_parquet(f, columns=cols) for f in files], ignore_index=True)
+    return df.sort_values("seq").reset_index(drop=True)
+
+# --- WRITES ---
+def append(records):
+    """Appends closed trades (list of dicts) and folds them into the aggregates."""
+    if isinstance(records, dict): records = [records]
+    if not records: return 0
+    with _LogLock():
+        base_dir = _data_dir()
+        stats = _read_stats(base_dir)
+        df = _to_frame(records, stats["next_seq"])
+        _write_parts(base_dir, df)
+        _write_stats(_fold(stats, df), base_dir)
+    return len(records)
+
+def replace(records):
+    """
+    Rewrites the whole log (full cloud sync). Built as a new generation, then
+    swapped in by rewriting the _current pointer, so readers always see a
+    complete log. The previous generation is kept for readers still on it and
+    removed by the next replace().
+    """
+    with _LogLock():
+        prev = os.path.basename(_data_dir()) if os.path.exists(os.path.join(HISTORY_DIR, CURRENT_FILE)) else None
+        gen = f"gen-{time.time_ns()}"
+        new_dir = os.path.join(HISTORY_DIR, gen)
+        os.makedirs(new_dir)
+
+        df = _to_frame(records or [], 0)
+        if not df.empty: _write_parts(new_dir, df)
+        _write_stats(_fold(_empty_stats(), df), new_dir)
+
+        def point(p):
+            with open(p, "w") as f: f.write(gen)
+        _write_atomic(os.path.join(HISTORY_DIR, CURRENT_FILE), point)
+
+        # Older generations (and the pre-generation layout once it is not the previous one)
+        for d in glob.glob(os.path.join(HISTORY_DIR, "gen-*")):
+            if os.path.basename(d) not in (gen, prev): shutil.rmtree(d, ignore_errors=True)
+        if prev is not None:
+            for d in glob.glob(os.path.join(HISTORY_DIR, "month=*")): shutil.rmtree(d, ignore_errors=True)
+            try: os.remove(os.path.join(HISTORY_DIR, STATS_FILE))
+            except OSError: pass
+    return len(records or [])
+
+def compact():
+    """Merges each month's small append parts into one file."""
+    with _LogLock():
+        for part_dir in glob.glob(os.path.join(_data_dir(), "month=*")):
+            files = sorted(glob.glob(os.path.join(part_dir, "*.parquet")))
+            if len(files) < 2: continue
+            df = _read_parts(files)
+            path = os.path.join(part_dir, f"part-{time.time_ns()}-{os.getpid()}.parquet")
+            _write_atomic(path, lambda p: df.to_parquet(p, index=False))
+            for f in files: os.remove(f)
+
+def rebuild_stats():
+    """Recomputes aggregates from the parts (recovery path)."""
+    with _LogLock():
+        base_dir = _data_dir()
+        df = _read_parts(_part_files(base_dir), columns=["Symbol", "Tag", "PnL"])
+        stats = _empty_stats()
+        if not df.empty:
+            _fold(stats, df)
+            stats["next_seq"] = int(df["seq"].max()) + 1
+        _write_stats(stats, base_dir)
+    return stats
+
+# --- READS ---
+def get_stats():
+    """Precomputed aggregates: P&L, win rate, per-symbol and per-tag. O(1)."""
+    stats = _read_stats()
+    n = stats["count"]
+    stats["win_rate"] = (stats["wins"] / n * 100) if n else 0.0
+    return stats
+
+def is_empty():
+    return get_stats()["count"] == 0 and not _part_files()
+
+def read_all():
+    """All closed trades in append order, as the original dicts."""
+    df = _read_parts(_part_files(), columns=["record"])
+    return [json.loads(r) for r in df["record"]] if not df.empty else []
+
+def read_recent(n=200):
+    """Latest n trades (by exit month, then append order), reading only the newest partitions needed."""
+    base_dir = _data_dir()
+    months = sorted(d.split("month=", 1)[1] for d in glob.glob(os.path.join(base_dir, "month=*")))
+    months.sort(key=lambda m: (m != "unknown", m)) # 'unknown' counts as oldest
+    picked, rows = [], 0
+    for m in reversed(months):
+        files = _part_files(base_dir, months=[m])
+        picked = files + picked
+        rows += sum(pq.ParquetFile(f).metadata.num_rows for f in files)
+        if rows >= n: break
+    df = _read_parts(picked, columns=["record"])
+    return [json.loads(r) for r in df["record"].tail(n)] if not df.empty else []
+
+def load_frame(columns=None):
+    """Columnar analytics frame (Date, Symbol, Tag, Entry, Exit, PnL by default)."""
+    columns = columns or ["Date", "Symbol", "Tag"] + NUMERIC_COLS
+    return _read_parts(_part_files(), columns=columns)
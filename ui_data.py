@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import hashlib
+import importlib
+import streamlit as st
+
+# --- UI DATA LAYER ---
+# Every artifact the background job produces is cached with st.cache_data and
+# keyed on the job's snapshot_version (stored in engine_status.json). An
+# autorefresh therefore costs one stat() of the status file; the artifacts are
+# only re-read when a new snapshot has landed.
+
+CACHE_DIR = "cache"
+STATUS_FILE = os.path.join(CACHE_DIR, "engine_status.json")
+PF_ANALYSIS_FILE = os.path.join(CACHE_DIR, "ui_portfolio_analysis.json")
+CHECKPOINT_FILE = os.path.join(CACHE_DIR, "engine_checkpoint.json") # Written by run_engine_job
+METRICS_FILE = os.path.join(CACHE_DIR, "engine_metrics.json") # Last run's timings (metrics.export)
+API_LEDGER_FILE = os.path.join(CACHE_DIR, "api_ledger.json") # Last run's broker calls (api_ledger.save)
+DEFAULT_STATUS = {"state": "UNKNOWN", "last_updated": "Never"}
+
+def _stat_key(path):
+    try:
+        s = os.stat(path)
+        return (s.st_mtime_ns, s.st_size)
+    except OSError:
+        return None
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _read_json(path, key):
+    # `key` (mtime/size) only drives the cache; a None key means missing file.
+    if key is None: return None
+    try:
+        with open(path, "r") as f: return json.load(f)
+    except: return None
+
+def load_status():
+    """engine_status.json, re-parsed only when the file changed."""
+    status = _read_json(STATUS_FILE, _stat_key(STATUS_FILE))
+    return status if isinstance(status, dict) else dict(DEFAULT_STATUS)
+
+def load_metrics():
+    """Timings / counters exported by the last job run (None if no run wrote them yet)."""
+    snap = _read_json(METRICS_FILE, _stat_key(METRICS_FILE))
+    return snap if isinstance(snap, dict) else None
+
+def load_api_ledger():
+    """Broker call ledger saved by the last job run (None if none yet)."""
+    ledger = _read_json(API_LEDGER_FILE, _stat_key(API_LEDGER_FILE))
+    return ledger if isinstance(ledger, dict) else None
+
+def snapshot_version(status=None):
+    return (status if status is not None else load_status()).get("snapshot_version")
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_portfolio_analysis(version):
+    try:
+        with open(PF_ANALYSIS_FILE, "r") as f: return json.load(f)
+    except: return []
+
+def load_portfolio_analysis(version=None):
+    """Exit signals precomputed by run_engine_job ([] if not written yet)."""
+    if not os.path.exists(PF_ANALYSIS_FILE): return []
+    return _load_portfolio_analysis(version if version is not None else snapshot_version())
+
+@st.cache_data(max_entries=2, show_spinner=False)
+def _load_scan_results(version, store_version):
+    import sheets_db
+    return sheets_db.fetch_scan_results()
+
+def load_scan_results(version=None):
+    """(results, last_synced, error) as saved by the last completed job (or a sync / scan since)."""
+    import local_store # Its version is bumped on every write (cloud sync, manual scan)
+    return _load_scan_results(version if version is not None else snapshot_version(), local_store.store_version())
+
+@st.cache_resource(max_entries=1, show_spinner="Loading market snapshot...")
+def _load_snapshot_map(_engine, version):
+    return _engine.load_snapshot()
+
+def load_snapshot_map(engine, version=None):
+    """ui_*.parquet snapshot as a data_map, shared across sessions (read-only)."""
+    return _load_snapshot_map(engine, version if version is not None else snapshot_version())
+
+def snapshot_symbols(snap_map, symbols):
+    """Symbols that have 1h bars in the snapshot (looked up as check_exits does)."""
+    d_1h = (snap_map or {}).get('1h') or {}
+    found = set()
+    for sym in symbols:
+        if not isinstance(sym, str) or not sym: continue
+        tick = sym if ".NS" in sym else sym + ".NS"
+        df = d_1h.get(tick)
+        if df is None or df.empty: df = d_1h.get(tick.replace(".NS", ""))
+        if df is not None and not df.empty: found.add(sym)
+    return found
+
+def format_progress(stats):
+    """One-line summary of the job's structured progress ("stats" in the status file)."""
+    if not stats: return ""
+    parts = []
+    if stats.get("total"): parts.append(f"{stats.get('done', 0)}/{stats['total']}")
+    if stats.get("candidates"): parts.append(f"deep {stats.get('deep', 0)}/{stats['candidates']}")
+    eta = stats.get("eta_s")
+    if eta is not None: parts.append(f"ETA {eta // 60}m {eta % 60:02d}s")
+    if stats.get("req_per_s"): parts.append(f"{stats['req_per_s']:.1f} req/s")
+    if stats.get("errors"): parts.append(f"{stats['errors']} error{'s' if stats['errors'] != 1 else ''}")
+    text = " · ".join(parts)
+    return f"{stats['phase']}: {text}" if stats.get("phase") and text else (stats.get("phase") or text)
+
+def reset_status():
+    """
+    'Force Unstick': mark the job idle but keep pointing at the last snapshot.
+    If the stuck run left a checkpoint, the status says so and the next scan resumes it.
+    """
+    current = load_status()
+    status = {"state": "IDLE", "last_updated": "Forced Reset", "snapshot_version": current.get("snapshot_version"),
+              "mode": current.get("mode", "full"), "resumable": os.path.exists(CHECKPOINT_FILE),
+              "checkpoint": current.get("checkpoint")}
+    tmp_file = STATUS_FILE + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp_file, STATUS_FILE)
+
+# --- CODE VERSION ---
+# Cached engine objects are keyed on a content hash of the engine modules, so a
+# deploy that changes them gets a fresh engine on the next rerun, and nothing
+# is re-imported or rerun when the code is unchanged.
+ENGINE_MODULES = ["market_data", "engine_v2"] # Dependencies first (reload order); last one holds SwingEngine
+
+_hash_cache = {} # path -> ((mtime_ns, size), sha1)
+_module_hashes = {} # module -> sha1 of the source the live module was loaded from
+
+def _module_path(name):
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), f"{name}.py")
+
+def _file_hash(path):
+    key = _stat_key(path)
+    hit = _hash_cache.get(path)
+    if hit and hit[0] == key: return hit[1]
+    try:
+        with open(path, "rb") as f: digest = hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        digest = None
+    _hash_cache[path] = (key, digest)
+    return digest
+
+def code_version():
+    """Short content hash of ENGINE_MODULES (one stat() per module when unchanged)."""
+    h = hashlib.sha1()
+    for name in ENGINE_MODULES:
+        h.update(f"{name}:{_file_hash(_module_path(name))};".encode())
+    return h.hexdigest()[:12]
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _load_engine(version):
+    stale = False
+    for name in ENGINE_MODULES:
+        digest = _file_hash(_module_path(name))
+        mod = importlib.import_module(name)
+        # Reload a module whose source changed, and everything listed after it.
+        if stale or _module_hashes.get(name, digest) != digest:
+            print(f"🔄 Reloading {name}...")
+            importlib.reload(mod)
+            stale = True
+        _module_hashes[name] = digest
+    return sys.modules[ENGINE_MODULES[-1]].SwingEngine()
+
+def load_engine(version=None):
+    """SwingEngine shared across sessions, rebuilt only when the engine code changes."""
+    return _load_engine(version if version is not None else code_version())